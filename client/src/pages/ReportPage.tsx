@@ -4,6 +4,10 @@ import "react-datepicker/dist/react-datepicker.css";
 import { FaFilePdf, FaSpinner } from "react-icons/fa";
 import { ml } from "../services/api";
 
+const REPORT_POLL_INTERVAL_MS = 1000;
+// Give up after 15 minutes, the server's default job timeout
+const REPORT_POLL_MAX_ATTEMPTS = 900;
+
 const ReportGenerator: React.FC = () => {
   const [startDate, setStartDate] = useState<Date | null>(null);
   const [endDate, setEndDate] = useState<Date | null>(null);
@@ -24,7 +28,7 @@ const ReportGenerator: React.FC = () => {
     }
 
     try {
-      const response = await ml.post<{ download_link: string }>(
+      const response = await ml.post<{ download_link?: string; status_link?: string }>(
         "/generate_report",
         {
           start_date: startDate.toLocaleDateString("en-GB"),
@@ -32,7 +36,26 @@ const ReportGenerator: React.FC = () => {
         }
       );
 
-      setDownloadLink(response.data.download_link);
+      // Reports are built in the background; poll the job until it finishes
+      let { download_link } = response.data;
+      const { status_link } = response.data;
+      for (let attempt = 0; !download_link && status_link; attempt++) {
+        if (attempt >= REPORT_POLL_MAX_ATTEMPTS) {
+          throw new Error("Timed out waiting for the report");
+        }
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_INTERVAL_MS));
+        const job = await ml.get<{ status: string; download_link?: string; error?: string }>(status_link);
+        if (job.data.status === "FAILED") {
+          throw new Error(job.data.error || "Report generation failed");
+        }
+        // A finished job whose report was since deleted has no link to wait for
+        if (job.data.status === "DONE" && !job.data.download_link) {
+          throw new Error("Report is no longer available");
+        }
+        download_link = job.data.download_link;
+      }
+
+      setDownloadLink(download_link || "");
     } catch (error) {
       console.error("Error generating report:", error);
       setError("Failed to generate report. Please try again.");
@@ -0,0 +1,58 @@
+# bench_chart_rendering.py
+# Times the report charts rendered serially, in a process pool and from the
+# render cache, at the PDF and web output targets ('web' never uses the pool,
+# so its pool column shows in-process rendering again).
+# Run: python ml/benchmarks/bench_chart_rendering.py
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import pandas as pd
+
+import generate_admin_report
+from generate_admin_report import analyze_consumption_data, create_visualizations
+
+MOST_EXPANDED_REPORT_FILE = os.path.join(SCRIPTS_DIR, '..', 'csv_reports', 'most_expanded_weekly_report.csv')
+
+
+def best_of(func, repeats, clear_cache=True):
+    timings = []
+    for _ in range(repeats):
+        if clear_cache:
+            generate_admin_report._chart_cache.clear()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    repeats = int(os.getenv('BENCH_REPEATS', 3))
+    workers = os.getenv('CHART_RENDER_WORKERS') or str(min(2, os.cpu_count() or 1))
+
+    most_expanded_df = pd.read_csv(MOST_EXPANDED_REPORT_FILE)
+    analysis_data = analyze_consumption_data(most_expanded_df, datetime(2023, 8, 1), datetime(2024, 6, 1))
+
+    print(f"{'target':>7} {'serial (s)':>11} {'pool (s)':>10} {'cached (s)':>11}")
+    for target in ('pdf', 'web'):
+        os.environ['CHART_RENDER_WORKERS'] = '1'
+        serial_time = best_of(lambda: create_visualizations(analysis_data, target), repeats)
+
+        os.environ['CHART_RENDER_WORKERS'] = workers
+        # Warm the pool once so process start-up is not counted
+        create_visualizations(analysis_data, target)
+        pool_time = best_of(lambda: create_visualizations(analysis_data, target), repeats)
+
+        cached_time = best_of(lambda: create_visualizations(analysis_data, target), repeats, clear_cache=False)
+
+        print(f"{target:>7} {serial_time:>11.4f} {pool_time:>10.4f} {cached_time:>11.4f}")
+
+
+if __name__ == "__main__":
+    main()
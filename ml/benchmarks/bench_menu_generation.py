@@ -0,0 +1,117 @@
+# bench_menu_generation.py
+# Compares menu generation with the precomputed selection table (and the
+# columnar engine) against the old per-day dish re-selection.
+# Run: python ml/benchmarks/bench_menu_generation.py
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from menu_suggest import (
+    generate_menu_for_date_range,
+    generate_menu_frame,
+    menu_frame_to_json,
+    prepare_meal_dataframe,
+    select_dishes_for_meal,
+    load_holiday_data,
+    MEAL_TYPES
+)
+from holiday_calendar import HolidayCalendar
+
+HOLIDAY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'original_holidays.csv')
+
+SAMPLE_MEAL_DATA = {
+    'Breakfast': [
+        {'dish_name': 'Idli', 'category': 'South Indian', 'total_consumed': 100},
+        {'dish_name': 'Aloo Paratha', 'category': 'North Indian', 'total_consumed': 90},
+        {'dish_name': 'Poha', 'category': 'Light', 'total_consumed': 70},
+        {'dish_name': 'Dosa', 'category': 'South Indian', 'total_consumed': 80},
+        {'dish_name': 'Upma', 'category': 'Light', 'total_consumed': 60},
+    ],
+    'Lunch': [
+        {'dish_name': 'Rice', 'category': 'Staple', 'total_consumed': 200},
+        {'dish_name': 'Roti', 'category': 'Indian Bread', 'total_consumed': 180},
+        {'dish_name': 'Dal Tadka', 'category': 'Lentils', 'total_consumed': 150},
+        {'dish_name': 'Rajma', 'category': 'Curry', 'total_consumed': 120},
+        {'dish_name': 'Jeera Rice', 'category': 'Rice Dish', 'total_consumed': 110},
+    ],
+    'Dinner': [
+        {'dish_name': 'Roti', 'category': 'Indian Bread', 'total_consumed': 190},
+        {'dish_name': 'Paneer Butter Masala', 'category': 'Vegetarian', 'total_consumed': 140},
+        {'dish_name': 'Dal Makhani', 'category': 'Lentils', 'total_consumed': 130},
+        {'dish_name': 'Veg Pulao', 'category': 'Rice Dish', 'total_consumed': 100},
+        {'dish_name': 'Fruit Salad', 'category': 'Dessert', 'total_consumed': 50},
+    ],
+}
+
+
+def legacy_generate_menu(start_date, end_date, meal_data, holiday_data, n_dishes=3):
+    """
+    Previous behaviour: dishes re-selected and base quantities re-filtered every day
+    """
+    meal_df = prepare_meal_dataframe(meal_data)
+    calendar = HolidayCalendar.coerce(holiday_data)
+    start = datetime.strptime(start_date, '%d/%m/%Y')
+    end = datetime.strptime(end_date, '%d/%m/%Y')
+
+    complete_menu = []
+    current_date = start
+    while current_date <= end:
+        is_holiday_period = calendar.contains(current_date)
+        adjustment_factor = 0.7 if is_holiday_period else 1.0
+        for meal_type in MEAL_TYPES:
+            for dish in select_dishes_for_meal(meal_df, meal_type, n_dishes):
+                base_quantity = meal_df[(meal_df['Meal'] == meal_type) & (meal_df['Dish Name'] == dish)]['Quantity (kg)'].mean()
+                quantity = base_quantity * adjustment_factor
+                complete_menu.append({
+                    'date': current_date.strftime('%d/%m/%Y'),
+                    'meal_type': meal_type,
+                    'dish_name': dish,
+                    'planned_quantity': round(max(0.5, quantity), 2),
+                    'is_holiday': is_holiday_period
+                })
+        current_date += timedelta(days=1)
+    return complete_menu
+
+
+def best_of(func, repeats, *args):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def columnar_menu_json(*args):
+    return menu_frame_to_json(generate_menu_frame(*args))
+
+
+def main():
+    holiday_data = HolidayCalendar(load_holiday_data(HOLIDAY_FILE))
+    start = datetime(2024, 1, 1)
+    repeats = int(os.getenv('BENCH_REPEATS', 3))
+
+    print(f"{'days':>6} {'legacy (s)':>12} {'table (s)':>12} {'columnar (s)':>13} {'speedup':>9}")
+    for days in (30, 365):
+        start_date = start.strftime('%d/%m/%Y')
+        end_date = (start + timedelta(days=days - 1)).strftime('%d/%m/%Y')
+        args = (start_date, end_date, SAMPLE_MEAL_DATA, holiday_data)
+
+        legacy_time, legacy_menu = best_of(legacy_generate_menu, repeats, *args)
+        table_time, table_menu = best_of(lambda *a: json.dumps(generate_menu_for_date_range(*a)), repeats, *args)
+        columnar_time, columnar_menu = best_of(columnar_menu_json, repeats, *args)
+
+        if not (json.dumps(legacy_menu) == table_menu == columnar_menu):
+            raise AssertionError(f"Menus differ for a {days}-day range")
+
+        print(f"{days:>6} {legacy_time:>12.4f} {table_time:>12.4f} {columnar_time:>13.4f} "
+              f"{legacy_time / min(table_time, columnar_time):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+# bench_pipeline.py
+# End-to-end benchmark of the ML pipeline stages on synthetic datasets of
+# 1, 5 and 20 years and report ranges of 7, 30 and 365 days. Every case runs
+# in a fresh process and records wall time, peak RSS growth and the peak of
+# traced Python allocations. Results are saved as JSON; --compare flags cases
+# slower or larger than a baseline file by more than --threshold.
+# Run: python ml/benchmarks/bench_pipeline.py [--quick] [--compare OLD.json]
+import io
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import warnings
+import contextlib
+import multiprocessing
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCH_DIR, '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+try:
+    import resource
+except ImportError:  # not on Windows; peak RSS is reported as None there
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+YEARS = (1, 5, 20)
+RANGE_DAYS = (7, 30, 365)
+DATA_START = '2005-01-01'
+DATA_SEED = 0
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_MEGABYTES = 2.0
+
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, 'data_cache')
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+# ---------------------------------------------------------------- datasets
+
+def dataset_paths(data_dir, years):
+    prefix = os.path.join(data_dir, f'{years}y')
+    return {
+        'daily': f'{prefix}_daily.csv',
+        'holidays': f'{prefix}_holidays.csv',
+    }
+
+
+def synthetic_holidays(years):
+    """
+    Six holidays a year over the dataset, in the original_holidays.csv format
+    """
+    starts = []
+    for year in range(pd.Timestamp(DATA_START).year, pd.Timestamp(DATA_START).year + years):
+        for month, day, length, name in ((1, 1, 7, "New Year's Day"), (3, 10, 7, 'Holi'), (8, 15, 1, 'Independence Day'),
+                                         (10, 2, 1, 'Gandhi Jayanti'), (10, 26, 9, 'Diwali'), (12, 22, 10, 'Christmas')):
+            start = datetime(year, month, day)
+            starts.append((start, start + timedelta(days=length - 1), name))
+    return pd.DataFrame({
+        'Start Date': [start.strftime('%d/%m/%Y') for start, _, _ in starts],
+        'End Date': [end.strftime('%d/%m/%Y') for _, end, _ in starts],
+        'Holiday': [name for _, _, name in starts],
+    })
+
+
+def ensure_datasets(data_dir, years_list):
+    """
+    Generate the synthetic daily CSV and holiday file of each size once
+    """
+    from synthetic_consumption import write_synthetic_data
+    from holiday_calendar import HolidayCalendar
+    from menu_suggest import load_holiday_data
+
+    os.makedirs(data_dir, exist_ok=True)
+    for years in years_list:
+        paths = dataset_paths(data_dir, years)
+        if not os.path.exists(paths['holidays']):
+            synthetic_holidays(years).to_csv(paths['holidays'], index=False)
+        if not os.path.exists(paths['daily']):
+            calendar = HolidayCalendar(load_holiday_data(paths['holidays']))
+            write_synthetic_data(paths['daily'], start_date=DATA_START, years=years,
+                                 seed=DATA_SEED, holiday_data=calendar)
+
+
+def weekly_expanded(daily_df):
+    """
+    Most/least consumed expanded weekly frames, as the server loads them, from daily rows
+    """
+    from generate_expanded_reports import expand_daily_meals
+    from report_dataset import add_parsed_dates
+
+    expanded = expand_daily_meals(daily_df)
+    dates = pd.to_datetime(expanded['Date'], format='%d/%m/%Y')
+    expanded['week_start'] = dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+    weekly = expanded.groupby(['week_start', 'Meal', 'Dish Name'], observed=True, sort=True)['Quantity (kg)'].sum()
+    weekly = weekly.reset_index()
+
+    week_start = weekly['week_start']
+    week_end = week_start + pd.Timedelta(days=6)
+    weekly = pd.DataFrame({
+        'Week': week_start.dt.strftime('%b%Y_') + 'week' + ((week_start.dt.day - 1) // 7 + 1).astype(str),
+        'Date Range': week_start.dt.strftime('%d/%m/%Y') + '-' + week_end.dt.strftime('%d/%m/%Y'),
+        'Meal': weekly['Meal'],
+        'Dish Name': weekly['Dish Name'],
+        'Quantity (kg)': weekly['Quantity (kg)'].round(2),
+    })
+    add_parsed_dates(weekly)
+
+    # Least consumed: the dishes under each week's median, like the separate report
+    median = weekly.groupby('Week', sort=False)['Quantity (kg)'].transform('median')
+    least = weekly[weekly['Quantity (kg)'] < median].reset_index(drop=True)
+    return weekly, least
+
+
+def top_meal_data(weekly, per_meal=10):
+    """
+    meal_data dict for generate_menu_for_date_range from the most consumed dishes
+    """
+    totals = weekly.groupby(['Meal', 'Dish Name'], observed=True)['Quantity (kg)'].sum()
+    meal_data = {}
+    for meal in ('Breakfast', 'Lunch', 'Dinner'):
+        top = totals.loc[meal].nlargest(per_meal)
+        meal_data[meal] = [
+            {'food_item_id': None, 'dish_name': str(dish), 'category': 'Main', 'total_consumed': float(total)}
+            for dish, total in top.items()
+        ]
+    return meal_data
+
+
+# ---------------------------------------------------------------- stages
+
+class Case:
+    """
+    Inputs one stage needs, built before measuring
+    """
+
+    def __init__(self, data_dir, years, days):
+        from menu_suggest import load_holiday_calendar
+
+        paths = dataset_paths(data_dir, years)
+        self.holiday_file = paths['holidays']
+        self.daily = pd.read_csv(paths['daily'])
+        self.most, self.least = weekly_expanded(self.daily)
+        self.calendar = load_holiday_calendar(self.holiday_file)
+
+        self.end = self.most['start_date'].max().to_pydatetime()
+        self.start = self.end - timedelta(days=(days or 7) - 1)
+
+
+def stage_load_holiday_data(case):
+    from menu_suggest import load_holiday_data
+    return lambda: load_holiday_data(case.holiday_file)
+
+
+def stage_expand_and_sum_most_consumed_weekly(case):
+    from generate_expanded_reports import expand_and_sum_most_consumed_weekly
+    return lambda: expand_and_sum_most_consumed_weekly(case.daily)
+
+
+def stage_expand_and_sum_least_consumed_weekly(case):
+    from generate_expanded_reports import expand_and_sum_least_consumed_weekly
+    return lambda: expand_and_sum_least_consumed_weekly(case.daily)
+
+
+def stage_generate_menu_for_date_range(case):
+    from menu_suggest import generate_menu_for_date_range
+    meal_data = top_meal_data(case.most)
+    start, end = case.start.strftime('%d/%m/%Y'), case.end.strftime('%d/%m/%Y')
+    return lambda: generate_menu_for_date_range(start, end, meal_data, case.calendar)
+
+
+def stage_generate_weekly_report(case):
+    from generate_aggregated_reports import generate_weekly_report
+    return lambda: generate_weekly_report(case.most, case.least, case.start, case.end)
+
+
+def stage_analyze_consumption_data(case):
+    from generate_admin_report import analyze_consumption_data
+    return lambda: analyze_consumption_data(case.most, case.start, case.end)
+
+
+def stage_create_visualizations(case):
+    import generate_admin_report
+    analysis_data = generate_admin_report.analyze_consumption_data(case.most, case.start, case.end)
+
+    def run():
+        # Measure rendering, not the render cache
+        generate_admin_report._chart_cache.clear()
+        return generate_admin_report.create_visualizations(analysis_data)
+    return run
+
+
+def stage_create_pdf(case):
+    import generate_admin_report
+    from generate_aggregated_reports import generate_weekly_report
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary_df, _, _ = generate_weekly_report(case.most, case.least, case.start, case.end)
+
+    def run():
+        generate_admin_report._chart_cache.clear()
+        return generate_admin_report.create_pdf(summary_df, case.most, case.start, case.end, output=io.BytesIO())
+    return run
+
+
+def stage_train_random_forest_model(case):
+    from random_forest import train_random_forest_model, load_training_holidays
+    holidays = load_training_holidays(case.holiday_file)
+    return lambda: train_random_forest_model(case.most, case.least, holidays, search=False)
+
+
+# Stage name -> (factory, whether it depends on the report range, repeat cap or None)
+STAGES = {
+    'load_holiday_data': (stage_load_holiday_data, False, None),
+    'expand_and_sum_most_consumed_weekly': (stage_expand_and_sum_most_consumed_weekly, False, None),
+    'expand_and_sum_least_consumed_weekly': (stage_expand_and_sum_least_consumed_weekly, False, None),
+    'generate_menu_for_date_range': (stage_generate_menu_for_date_range, True, None),
+    'generate_weekly_report': (stage_generate_weekly_report, True, None),
+    'analyze_consumption_data': (stage_analyze_consumption_data, True, None),
+    'create_visualizations': (stage_create_visualizations, True, None),
+    'create_pdf': (stage_create_pdf, True, None),
+    # Seconds to minutes per fit at 20 years; the cold run already gives a timing
+    'train_random_forest_model': (stage_train_random_forest_model, False, 1),
+}
+
+
+# ---------------------------------------------------------------- measuring
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _reset_peak_rss():
+    """
+    Reset the kernel's RSS high-water mark so the peak belongs to the stage, not the setup
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024 / 1e6
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == 'darwin' else peak * 1024 / 1e6
+
+
+def measure_case(data_dir, work_dir, stage, years, days, repeats):
+    """
+    Run one (stage, years, days) case; meant to run in a fresh process
+
+    The first call is measured separately (cold): it pays imports and
+    caches and sets the peak RSS. Then repeats timed calls, then one call
+    under tracemalloc for the allocation peak.
+    """
+    # expand_and_sum_* write to ../csv_reports relative to the scripts directory
+    os.makedirs(os.path.join(work_dir, 'csv_reports'), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, 'scripts'), exist_ok=True)
+    os.chdir(os.path.join(work_dir, 'scripts'))
+
+    factory, _, max_repeats = STAGES[stage]
+    repeats = min(repeats, max_repeats or repeats)
+    warnings.filterwarnings('ignore')
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = factory(Case(data_dir, years, days))
+        gc.collect()
+        baseline_rss = _current_rss_mb()
+        if not _reset_peak_rss():
+            # Without a resettable high-water mark, growth is only visible above the setup's peak
+            baseline_rss = _peak_rss_mb()
+
+        started = time.perf_counter()
+        run()
+        cold_seconds = time.perf_counter() - started
+        peak_rss = _peak_rss_mb()
+
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'stage': stage,
+        'years': years,
+        'days': days,
+        'cold_seconds': round(cold_seconds, 6),
+        'min_seconds': round(min(timings), 6),
+        'median_seconds': round(statistics.median(timings), 6),
+        'repeats': repeats,
+        'peak_rss_mb': round(peak_rss - baseline_rss, 2) if peak_rss is not None and baseline_rss is not None else None,
+        'alloc_peak_mb': round(alloc_peak / 1e6, 3),
+    }
+
+
+def case_id(result):
+    return f"{result['stage']}[{result['years']}y,{result['days'] or '-'}d]"
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Cases whose median time or peak RSS grew by more than threshold over the baseline
+
+    :return: List of (case id, metric, baseline value, new value)
+    """
+    previous = {case_id(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(case_id(result))
+        if old is None:
+            continue
+        for metric, floor in (('median_seconds', MIN_SECONDS), ('peak_rss_mb', MIN_MEGABYTES)):
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            if after - before > floor and after > before * (1 + threshold):
+                regressions.append((case_id(result), metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ML pipeline stages on synthetic data")
+    parser.add_argument('--stages', nargs='+', choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument('--years', nargs='+', type=int, default=list(YEARS))
+    parser.add_argument('--days', nargs='+', type=int, default=list(RANGE_DAYS))
+    parser.add_argument('--repeats', type=int, default=int(os.getenv('BENCH_REPEATS', 3)))
+    parser.add_argument('--quick', action='store_true', help="1 and 5 years, 7 and 365 days, one repeat")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where synthetic datasets are kept")
+    parser.add_argument('--output', help="results JSON (default results/pipeline-<commit>.json)")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.years, args.days, args.repeats = [1, 5], [7, 365], 1
+
+    ensure_datasets(args.data_dir, args.years)
+
+    cases = []
+    for stage in args.stages:
+        for years in args.years:
+            for days in (args.days if STAGES[stage][1] else [None]):
+                cases.append((stage, years, days))
+
+    work_dir = os.path.join(args.data_dir, 'work')
+    results = []
+    context = multiprocessing.get_context('spawn')
+    print(f"{'case':<52} {'cold (s)':>9} {'median (s)':>11} {'rss (MB)':>9} {'alloc (MB)':>11}")
+    for stage, years, days in cases:
+        # A fresh process per case, so peak RSS and caches belong to this case only
+        with context.Pool(1) as pool:
+            result = pool.apply(measure_case, (args.data_dir, work_dir, stage, years, days, args.repeats))
+        results.append(result)
+        print(f"{case_id(result):<52} {result['cold_seconds']:>9.4f} {result['median_seconds']:>11.4f} "
+              f"{result['peak_rss_mb'] if result['peak_rss_mb'] is not None else '-':>9} "
+              f"{result['alloc_peak_mb']:>11.2f}")
+
+    commit = git_commit()
+    payload = {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__},
+        'repeats': args.repeats,
+        'results': results,
+    }
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"pipeline-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, before, after in regressions:
+            growth = f" (+{(after / before - 1) * 100:.0f}%)" if before > 0 else ''
+            print(f"REGRESSION {name} {metric}: {before} -> {after}{growth}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {baseline.get('commit') or args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench_startup.py
+# Startup-time report for the ML server: import time per module (from
+# python -X importtime) when server.py is imported, the first /healthz
+# response, and what the lazily imported modules cost on first use or in a
+# preload. Every measurement runs in a fresh interpreter.
+# Run: python ml/benchmarks/bench_startup.py [--top 20]
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+# Run inside the fresh interpreter; prints one JSON line of timings
+PROBE = """
+import json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+client = server.app.test_client()
+client.get('/healthz')
+ready = time.perf_counter()
+preloaded = server.preload_modules()
+done = time.perf_counter()
+print(json.dumps({
+    'import_server': imported - started,
+    'first_healthz': ready - imported,
+    'preload_modules': done - ready,
+    'preload_breakdown': preloaded,
+}))
+"""
+
+
+def run_python(args):
+    return subprocess.run([sys.executable] + args, cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+
+
+def import_times(module='server'):
+    """
+    (self seconds, cumulative seconds, depth, module) per module imported by `import module`
+    """
+    stderr = run_python(['-X', 'importtime', '-c', f'import {module}']).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us) / 1e6, int(cumulative_us) / 1e6, depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the ML server's startup and import times")
+    parser.add_argument('--top', type=int, default=20, help="modules listed per table")
+    args = parser.parse_args()
+
+    rows = import_times()
+    total = next(cumulative for _, cumulative, _, name in rows if name == 'server')
+    print(f"import server: {total * 1000:.1f} ms, {len(rows)} modules")
+
+    # What each of server.py's own imports costs, including everything it pulls in
+    print(f"\n{'module (imported by server.py)':<48} {'cumulative (ms)':>16} {'self (ms)':>10}")
+    for self_seconds, cumulative, _, name in sorted((row for row in rows if row[2] == 1), key=lambda row: -row[1])[:args.top]:
+        print(f"{name:<48} {cumulative * 1000:>16.1f} {self_seconds * 1000:>10.1f}")
+
+    print(f"\n{'module (any depth)':<48} {'self (ms)':>16}")
+    for self_seconds, _, _, name in sorted(rows, key=lambda row: -row[0])[:args.top]:
+        print(f"{name:<48} {self_seconds * 1000:>16.1f}")
+
+    timings = json.loads(run_python(['-c', PROBE]).stdout.strip().splitlines()[-1])
+    print(f"\nimport server          {timings['import_server'] * 1000:>9.1f} ms")
+    print(f"first /healthz          {timings['first_healthz'] * 1000:>9.1f} ms")
+    print(f"lazy modules (preload)  {timings['preload_modules'] * 1000:>9.1f} ms")
+    for module, seconds in timings['preload_breakdown'].items():
+        print(f"  {module:<21} {seconds * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
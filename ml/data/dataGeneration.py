@@ -1,52 +1,17 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import date, datetime, timedelta
 
-# Enhanced menu items with more variety
-menu_items = {
-    'breakfast': [
-        # South Indian
-        'Masala Dosa', 'Plain Dosa', 'Rava Dosa', 'Onion Dosa',
-        'Idli', 'Rava Idli', 'Medu Vada', 'Uttapam',
-        # North Indian
-        'Aloo Paratha', 'Gobi Paratha', 'Paneer Paratha', 'Methi Paratha', 'Mixed Paratha',
-        'Puri Bhaji', 'Chole Puri',
-        # Light Options
-        'Poha', 'Upma', 'Vermicelli Upma', 'Semiya Upma',
-        'Sabudana Khichdi', 'Daliya',
-        # Snacks/Others
-        'Chole Bhature', 'Samosa', 'Vada Pav', 'Pav Bhaji',
-        'Bread Pakora', 'Besan Chilla'
-    ],
-    'lunch': [
-        # Rice Varieties
-        'Steamed Rice', 'Jeera Rice', 'Veg Pulao', 'Lemon Rice',
-        'Tomato Rice', 'Curd Rice', 'Coconut Rice', 'Biryani',
-        # Dals
-        'Dal Tadka', 'Dal Fry', 'Dal Makhani', 'Moong Dal',
-        'Masoor Dal', 'Toor Dal', 'Chana Dal', 'Panchmel Dal',
-        # Main Course
-        'Rajma', 'Chole', 'Kadhi Pakora', 'Aloo Matar',
-        'Mix Veg Curry', 'Bhindi Masala', 'Lauki Kofta',
-        # Accompaniments
-        'Palak Paneer', 'Matar Paneer', 'Shahi Paneer',
-        'Aloo Gobi', 'Baingan Bharta', 'Veg Kofta Curry'
-    ],
-    'dinner': [
-        # Breads
-        'Tawa Roti', 'Tandoori Roti', 'Butter Naan', 'Garlic Naan',
-        'Missi Roti', 'Laccha Paratha', 'Rumali Roti',
-        # Main Course
-        'Paneer Tikka Masala', 'Kadai Paneer', 'Paneer Butter Masala',
-        'Malai Kofta', 'Veg Kolhapuri', 'Mushroom Masala',
-        'Bhindi Fry', 'Aloo Jeera', 'Gobi Manchurian',
-        'Dal Makhani', 'Chana Masala', 'Mixed Veg Curry',
-        'Paneer Lababdar', 'Veg Jalfrezi', 'Paneer Do Pyaza',
-        # Dry Items
-        'Jeera Aloo', 'Aloo Methi', 'Bhindi Do Pyaza',
-        'Gobhi Masala', 'Tawa Vegetables'
-    ]
-}
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from holiday_calendar import HolidayCalendar
+from synthetic_consumption import DEFAULT_CATALOG
+
+# Enhanced menu items with more variety (shared with the vectorized generator,
+# scripts/synthetic_consumption.py, which scales to many years and messes)
+menu_items = DEFAULT_CATALOG
 
 # Holiday data remains same
 holidays = pd.DataFrame([
@@ -62,22 +27,15 @@ holidays = pd.DataFrame([
 
 holidays['Start Date'] = pd.to_datetime(holidays['Start Date'])
 holidays['End Date'] = pd.to_datetime(holidays['End Date'])
+holiday_calendar = HolidayCalendar(holidays)
 
 def is_holiday(date):
-    date = pd.to_datetime(date)
-    for _, holiday in holidays.iterrows():
-        if holiday['Start Date'] <= date <= holiday['End Date']:
-            return True
-    return False
+    return holiday_calendar.contains(date)
 
 def get_holiday_name(date):
-    date = pd.to_datetime(date)
-    for _, holiday in holidays.iterrows():
-        if holiday['Start Date'] <= date <= holiday['End Date']:
-            return holiday['Holiday']
-    return None
+    return holiday_calendar.name_of(date)
 
-def generate_quantities(base_amount, is_holiday_date, day_of_week):
+def generate_quantities(base_amount, is_holiday_date, day_of_week, month):
     # Add randomness
     random_factor = np.random.normal(1, 0.08)  # Reduced variance for more stability
     
@@ -88,7 +46,6 @@ def generate_quantities(base_amount, is_holiday_date, day_of_week):
     holiday_factor = 1.3 if is_holiday_date else 1.0
     
     # Weather/Season factor (simplified)
-    month = date.month
     season_factor = 1.1 if month in [12, 1, 2] else 0.9 if month in [5, 6, 7] else 1.0
     
     return base_amount * random_factor * holiday_factor * weekend_factor * season_factor
@@ -126,13 +83,15 @@ def generate_food_data():
     current_date = start_date
     
     data = []
+
+    # Resolve holiday names for the whole year in one lookup
+    holiday_names = holiday_calendar.holiday_names(pd.date_range(start_date, end_date, freq='D'))
     
-    while current_date <= end_date:
+    for holiday_name in holiday_names:
         week_num = (current_date.day - 1) // 7 + 1
         month_year = current_date.strftime('%b%Y')
         
-        holiday_date = is_holiday(current_date)
-        holiday_name = get_holiday_name(current_date) if holiday_date else None
+        holiday_date = holiday_name is not None
         
         # Get menu items (considering special menus for holidays)
         special_breakfast = get_special_menu(holiday_name, 'breakfast')
@@ -151,9 +110,9 @@ def generate_food_data():
         
         # Generate quantities considering day of week
         day_of_week = current_date.weekday()
-        breakfast_kg = [generate_quantities(q, holiday_date, day_of_week) for q in breakfast_base]
-        lunch_kg = [generate_quantities(q, holiday_date, day_of_week) for q in lunch_base]
-        dinner_kg = [generate_quantities(q, holiday_date, day_of_week) for q in dinner_base]
+        breakfast_kg = [generate_quantities(q, holiday_date, day_of_week, current_date.month) for q in breakfast_base]
+        lunch_kg = [generate_quantities(q, holiday_date, day_of_week, current_date.month) for q in lunch_base]
+        dinner_kg = [generate_quantities(q, holiday_date, day_of_week, current_date.month) for q in dinner_base]
         
         row = {
             'month_year': month_year,
@@ -0,0 +1,200 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+DAY = np.timedelta64(1, 'D')
+
+# Range totals are differences of running sums, so "no consumption" can come out as rounding noise
+ZERO_TOLERANCE = 1e-6
+
+
+class ConsumptionCube:
+    """
+    Daily prefix sums of consumption by (day, meal, dish)
+
+    cumulative[i, m, d] holds the quantity of dish d at meal m over every day
+    before first_day + i, so the total over any range of days is one
+    subtraction of two (meal, dish) planes. Days are dense, which makes the
+    date -> row map plain arithmetic: row = (day - first_day) in days.
+
+    Rows are attributed to their start_date, matching the date filtering of
+    generate_weekly_report.
+    """
+
+    def __init__(self, first_day, meals, dishes, cumulative, days):
+        self.first_day = np.datetime64(first_day, 'D')
+        self.meals = list(meals)
+        self.dishes = list(dishes)
+        self._cumulative = cumulative
+        self.days = days
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build the cube from an expanded report with a start_date column
+        """
+        return cls(np.datetime64('1970-01-01'), [], [], np.zeros((1, 0, 0)), 0).append(df)
+
+    @property
+    def last_day(self):
+        """
+        Last day covered by the cube, or None while it is empty
+        """
+        return self.first_day + (self.days - 1) * DAY if self.days else None
+
+    def nbytes(self):
+        return self._cumulative[:self.days + 1].nbytes
+
+    def _codes(self, labels, known):
+        """
+        Integer codes of labels, extending known with labels seen for the first time
+        """
+        labels = labels.astype(str)
+        new_labels = sorted(set(labels.unique()) - set(known))
+        known.extend(new_labels)
+        return pd.Index(known).get_indexer(labels)
+
+    def _reserve(self, days):
+        """
+        Grow the day axis (doubling) and the meal/dish axes so days rows fit
+        """
+        rows, meal_count, dish_count = self._cumulative.shape
+        needed = days + 1
+        if rows >= needed and meal_count == len(self.meals) and dish_count == len(self.dishes):
+            return
+        grown = np.zeros((max(needed, rows * 2), len(self.meals), len(self.dishes)))
+        grown[:self.days + 1, :meal_count, :dish_count] = self._cumulative[:self.days + 1]
+        self._cumulative = grown
+
+    def append(self, df):
+        """
+        Fold in expanded rows for days after the last day already in the cube
+
+        :param df: Expanded report rows with start_date, Meal, Dish Name, Quantity (kg)
+        :raises ValueError: If a row falls on a day the cube already covers
+        """
+        if df.empty:
+            return self
+        days = df['start_date'].to_numpy().astype('datetime64[D]')
+        if self.days and days.min() <= self.last_day:
+            raise ValueError(f"Cube already covers days up to {self.last_day}; only later days can be appended")
+        if self.days == 0:
+            self.first_day = days.min()
+
+        meal_codes = self._codes(df['Meal'], self.meals)
+        dish_codes = self._codes(df['Dish Name'], self.dishes)
+        offsets = ((days - self.first_day) // DAY).astype(np.int64)
+
+        new_days = int(offsets.max()) + 1
+        self._reserve(new_days)
+
+        # Daily totals of the new days, then running sums continued from the last row
+        daily = np.zeros((new_days - self.days, len(self.meals), len(self.dishes)))
+        np.add.at(daily, (offsets - self.days, meal_codes, dish_codes), df['Quantity (kg)'].to_numpy(dtype=float))
+        np.cumsum(daily, axis=0, out=daily)
+        daily += self._cumulative[self.days]
+        self._cumulative[self.days + 1:new_days + 1] = daily
+        self.days = new_days
+        return self
+
+    def _row(self, day, side):
+        """
+        Prefix row for a day: 'left' counts days before it, 'right' days up to and including it
+        """
+        offset = (np.datetime64(pd.Timestamp(day).date(), 'D') - self.first_day) // DAY
+        if side == 'right':
+            offset += 1
+        return int(min(max(offset, 0), self.days))
+
+    def range_totals(self, start_datetime, end_datetime):
+        """
+        (meal, dish) matrix of totals for start_date within [start, end], by whole days
+        """
+        lo = self._row(start_datetime, 'left')
+        hi = max(lo, self._row(end_datetime, 'right'))
+        return self._cumulative[hi] - self._cumulative[lo]
+
+    def total(self, start_datetime, end_datetime):
+        return float(self.range_totals(start_datetime, end_datetime).sum())
+
+    def meal_totals(self, start_datetime, end_datetime):
+        """
+        Totals per meal that has consumption in the range, sorted by meal
+        """
+        totals = pd.Series(self.range_totals(start_datetime, end_datetime).sum(axis=1), index=self.meals)
+        return totals[totals.abs() > ZERO_TOLERANCE].sort_index()
+
+    def dish_totals(self, start_datetime, end_datetime):
+        """
+        Totals per dish that has consumption in the range, sorted by dish
+        """
+        totals = pd.Series(self.range_totals(start_datetime, end_datetime).sum(axis=0), index=self.dishes)
+        return totals[totals.abs() > ZERO_TOLERANCE].sort_index()
+
+    def top_dishes(self, start_datetime, end_datetime, n=10):
+        """
+        n dishes with the largest totals in the range, largest first
+        """
+        totals = self.range_totals(start_datetime, end_datetime).sum(axis=0)
+        # Largest first, ties by dish name like Series.nlargest on name-sorted
+        # totals; dish codes follow first appearance, so append() breaks code order
+        order = np.lexsort((np.array(self.dishes, dtype=object), -totals))
+        order = order[np.abs(totals[order]) > ZERO_TOLERANCE][:n]
+        return pd.Series(totals[order], index=[self.dishes[i] for i in order])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the prefix-sum cube against the pandas aggregation")
+    parser.add_argument('csv_path', nargs='?', default='../csv_reports/most_expanded_weekly_report.csv')
+    parser.add_argument('--ranges', type=int, default=200, help="random date ranges to compare")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from report_dataset import load_expanded_report, slice_date_range
+    from report_aggregates import aggregate_report_statistics
+
+    df = load_expanded_report(args.csv_path, refresh=False)
+    df = df.sort_values('start_date', kind='stable').reset_index(drop=True)
+
+    started = time.perf_counter()
+    # Build from the first half and append the rest, to exercise incremental appends
+    split_day = df['start_date'].iloc[len(df) // 2]
+    cube = ConsumptionCube.from_frame(df[df['start_date'] < split_day])
+    cube.append(df[df['start_date'] >= split_day])
+    build_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(args.seed)
+    first, last = df['start_date'].min(), df['start_date'].max()
+    span = (last - first).days
+    cube_seconds = pandas_seconds = 0.0
+    for _ in range(args.ranges):
+        lo, hi = np.sort(rng.integers(-7, span + 8, size=2))
+        start, end = first + pd.Timedelta(days=int(lo)), first + pd.Timedelta(days=int(hi))
+
+        started = time.perf_counter()
+        expected = aggregate_report_statistics(slice_date_range(df, start, end))
+        pandas_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        total = cube.total(start, end)
+        meal_totals = cube.meal_totals(start, end)
+        top_dishes = cube.top_dishes(start, end)
+        cube_seconds += time.perf_counter() - started
+
+        if not (np.isclose(total, expected.total_kg)
+                and list(meal_totals.index) == list(expected.meal_totals.index.astype(str))
+                and np.allclose(meal_totals.values, expected.meal_totals.values)
+                and np.allclose(top_dishes.values, expected.top_dishes.values)
+                and list(top_dishes.index) == list(expected.top_dishes.index.astype(str))):
+            raise AssertionError(f"Cube and pandas totals differ for {start.date()} - {end.date()}")
+
+    print(f"cube: {cube.days} days x {len(cube.meals)} meals x {len(cube.dishes)} dishes, "
+          f"{cube.nbytes() / 1e6:.2f} MB, built in {build_seconds:.4f}s")
+    print(f"{args.ranges} ranges match; pandas {pandas_seconds / args.ranges * 1e3:.3f} ms/range, "
+          f"cube {cube_seconds / args.ranges * 1e3:.3f} ms/range")
+
+
+if __name__ == "__main__":
+    main()
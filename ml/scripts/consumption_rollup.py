@@ -0,0 +1,174 @@
+import os
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'consumption'
+
+MEAL_TYPES_SQL = "('BREAKFAST', 'LUNCH', 'DINNER')"
+
+# Top-N dishes per meal from the all-time totals; same output shape as the
+# old ranked_dishes CTE over se_consumption_records
+TOP_DISHES_QUERY = f"""
+    WITH ranked_dishes AS (
+        SELECT
+            t.food_item_id,
+            f.name AS dish_name,
+            f.category,
+            t.meal_type,
+            t.total_quantity AS total_consumed,
+            RANK() OVER (
+                PARTITION BY t.meal_type
+                ORDER BY t.total_quantity DESC
+            ) as consumption_rank
+        FROM
+            se_consumption_dish_totals t
+            JOIN se_food_items f ON f.id = t.food_item_id
+        WHERE
+            t.meal_type IN {MEAL_TYPES_SQL}
+    )
+    SELECT
+        food_item_id,
+        dish_name,
+        category,
+        meal_type,
+        total_consumed
+    FROM
+        ranked_dishes
+    WHERE
+        consumption_rank <= %s
+    ORDER BY
+        meal_type, total_consumed DESC
+"""
+
+
+# Claims every record not folded yet and adds it to both rollups in one
+# statement. Records inserted by transactions that have not committed are
+# invisible to the UPDATE and stay unclaimed until a later refresh, whatever
+# their id, so every committed record is folded exactly once.
+FOLD_PENDING_QUERY = """
+    WITH claimed AS (
+        UPDATE se_consumption_records
+        SET rolled_up = TRUE
+        WHERE NOT rolled_up
+        RETURNING id, food_item_id, UPPER(TRIM(meal_type)) AS meal_type, date, quantity
+    ),
+    daily AS (
+        INSERT INTO se_consumption_daily_rollup (food_item_id, meal_type, date, total_quantity)
+        SELECT food_item_id, meal_type, date, SUM(quantity)
+        FROM claimed
+        WHERE food_item_id IS NOT NULL
+        GROUP BY food_item_id, meal_type, date
+        ON CONFLICT (food_item_id, meal_type, date) DO UPDATE
+        SET total_quantity = se_consumption_daily_rollup.total_quantity + EXCLUDED.total_quantity
+    ),
+    totals AS (
+        INSERT INTO se_consumption_dish_totals (food_item_id, meal_type, total_quantity)
+        SELECT food_item_id, meal_type, SUM(quantity)
+        FROM claimed
+        WHERE food_item_id IS NOT NULL
+        GROUP BY food_item_id, meal_type
+        ON CONFLICT (food_item_id, meal_type) DO UPDATE
+        SET total_quantity = se_consumption_dish_totals.total_quantity + EXCLUDED.total_quantity
+    )
+    SELECT COUNT(*), MAX(id) FROM claimed
+"""
+
+
+def refresh_consumption_rollup(conn, rebuild=False, wait=True):
+    """
+    Fold consumption records not yet counted into the rollup tables
+
+    Each record carries a rolled_up flag, set in the same transaction that
+    adds it to the rollups; a partial index on the unset flags keeps a
+    refresh as cheap as the number of new records. Unlike an id watermark,
+    this does not miss records whose transaction commits after one with a
+    higher id was already folded. The watermark row is locked for the
+    duration, which serializes refreshes; its last_record_id only records
+    the highest id folded so far.
+
+    :param conn: psycopg2 connection; the refresh is committed on success
+    :param rebuild: Recompute both rollups from scratch instead of incrementally
+    :param wait: Block on a refresh already running elsewhere; if False, skip instead
+    :return: Number of consumption records folded in, or None if skipped
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT last_record_id
+            FROM se_rollup_watermarks
+            WHERE name = %s
+            FOR UPDATE{'' if wait else ' SKIP LOCKED'}
+        """, (WATERMARK_NAME,))
+        row = cursor.fetchone()
+        if row is None:
+            if not wait:
+                conn.rollback()
+                return None
+            cursor.execute("""
+                INSERT INTO se_rollup_watermarks (name, last_record_id)
+                VALUES (%s, 0)
+                ON CONFLICT (name) DO NOTHING
+            """, (WATERMARK_NAME,))
+            last_record_id = 0
+        else:
+            last_record_id = row[0]
+
+        if rebuild:
+            cursor.execute("TRUNCATE se_consumption_daily_rollup, se_consumption_dish_totals")
+            cursor.execute("UPDATE se_consumption_records SET rolled_up = FALSE WHERE rolled_up")
+            last_record_id = 0
+
+        cursor.execute(FOLD_PENDING_QUERY)
+        new_records, high_record_id = cursor.fetchone()
+
+        cursor.execute("""
+            UPDATE se_rollup_watermarks
+            SET last_record_id = GREATEST(%s, %s), refreshed_at = CURRENT_TIMESTAMP
+            WHERE name = %s
+        """, (last_record_id, high_record_id or 0, WATERMARK_NAME))
+        conn.commit()
+
+        if new_records:
+            logger.info(f"Consumption rollup folded {new_records} records (highest id {high_record_id})")
+        return new_records
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def fetch_top_dishes(cursor, n_dishes=5):
+    """
+    Top-N dishes per meal type by all-time consumption, read from the rollup
+
+    :param cursor: psycopg2 cursor (DictCursor rows are expected by the caller)
+    :param n_dishes: Rank cut-off per meal type
+    :return: List of rows (food_item_id, dish_name, category, meal_type, total_consumed)
+    """
+    cursor.execute(TOP_DISHES_QUERY, (n_dishes,))
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the consumption rollup tables")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the rollups from all records")
+    args = parser.parse_args()
+
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        folded = refresh_consumption_rollup(conn, rebuild=args.rebuild)
+        print(f"Folded {folded} consumption records into the rollup")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
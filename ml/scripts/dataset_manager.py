@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+import threading
+
+from report_dataset import load_expanded_report, slice_date_range
+from consumption_cube import ConsumptionCube
+
+logger = logging.getLogger(__name__)
+
+
+class _LoadedDataset:
+    __slots__ = ('frame', 'signature', 'loaded_at', 'load_seconds', 'cube')
+
+    def __init__(self, frame, signature, loaded_at, load_seconds):
+        self.frame = frame
+        self.signature = signature
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+        self.cube = None
+
+
+class DatasetManager:
+    """
+    Per-process store of expanded consumption reports
+
+    Each report is loaded once (lazily, or up front via preload), sorted by
+    start_date, and kept for the life of the process. Every access compares
+    the CSV's size and mtime with the loaded copy and reloads on change, so
+    regenerated reports are picked up without a restart. Date ranges are
+    served as positional slices that share memory with the loaded frame;
+    callers must treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datasets = {}
+        self.reloads = 0
+
+    @staticmethod
+    def _signature(csv_path):
+        try:
+            stat = os.stat(csv_path)
+            return (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+
+    def _load(self, csv_path):
+        key = os.path.abspath(csv_path)
+        signature = self._signature(key)
+        dataset = self._datasets.get(key)
+        if dataset is not None and dataset.signature == signature:
+            return dataset
+
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None and dataset.signature == signature:
+                return dataset
+
+            started = time.perf_counter()
+            frame = load_expanded_report(key)
+            frame = frame.sort_values('start_date', kind='stable').reset_index(drop=True)
+            load_seconds = time.perf_counter() - started
+
+            if dataset is not None:
+                self.reloads += 1
+            dataset = _LoadedDataset(frame, signature, time.time(), load_seconds)
+            self._datasets[key] = dataset
+            logger.info(
+                f"Loaded {len(frame)} rows ({frame.memory_usage(deep=True).sum() / 1e6:.1f} MB) "
+                f"from {csv_path} in {load_seconds:.3f}s"
+            )
+            return dataset
+
+    def get(self, csv_path):
+        """
+        Whole report sorted by start_date, reloaded if the file changed
+        """
+        return self._load(csv_path).frame
+
+    def versioned(self, csv_path):
+        """
+        Report as get() returns it, with the (size, mtime_ns) of the file it was loaded from
+
+        :return: (frame, version); the version changes whenever the frame is reloaded
+        """
+        dataset = self._load(csv_path)
+        return dataset.frame, dataset.signature
+
+    def view(self, csv_path, start_datetime, end_datetime):
+        """
+        Rows whose start_date falls within [start_datetime, end_datetime], sorted by start_date
+
+        Sliced without copying from the loaded report when this process holds
+        a current copy; otherwise only that range is read (pushed down to the
+        Parquet artifact's month row groups) and nothing is kept.
+        """
+        key = os.path.abspath(csv_path)
+        dataset = self._datasets.get(key)
+        if dataset is not None and dataset.signature == self._signature(key):
+            return slice_date_range(dataset.frame, start_datetime, end_datetime)
+        frame = load_expanded_report(key, start_datetime, end_datetime)
+        return frame.sort_values('start_date', kind='stable').reset_index(drop=True)
+
+    def cube(self, csv_path):
+        """
+        Prefix-sum cube of a report, built on first use and again after each reload
+        """
+        frame = self.get(csv_path)
+        with self._lock:
+            dataset = self._datasets[os.path.abspath(csv_path)]
+            if dataset.frame is not frame:
+                # Reloaded in between; the caller's frame is still consistent
+                return ConsumptionCube.from_frame(frame)
+            if dataset.cube is None:
+                dataset.cube = ConsumptionCube.from_frame(frame)
+            return dataset.cube
+
+    def preload(self, csv_paths):
+        """
+        Load reports ahead of the first request; failures are logged, not raised
+        """
+        for csv_path in csv_paths:
+            try:
+                self.get(csv_path)
+            except Exception as e:
+                logger.warning(f"Could not preload {csv_path}: {e}")
+
+    def stats(self):
+        """
+        Rows, memory footprint and load times of the datasets held by this process
+        """
+        with self._lock:
+            datasets = dict(self._datasets)
+        details = {}
+        for key, dataset in datasets.items():
+            details[key] = {
+                'rows': len(dataset.frame),
+                'memory_bytes': int(dataset.frame.memory_usage(deep=True).sum()),
+                'loaded_at': dataset.loaded_at,
+                'load_seconds': round(dataset.load_seconds, 6),
+                'file_size': dataset.signature[0] if dataset.signature else None,
+                'cube_bytes': dataset.cube.nbytes() if dataset.cube is not None else 0,
+            }
+        return {
+            'pid': os.getpid(),
+            'reloads': self.reloads,
+            'memory_bytes': sum(item['memory_bytes'] + item['cube_bytes'] for item in details.values()),
+            'datasets': details,
+        }
+
+
+report_datasets = DatasetManager()
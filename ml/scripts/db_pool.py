@@ -0,0 +1,328 @@
+import os
+import re
+import time
+import functools
+import logging
+import threading
+import psycopg2
+import psycopg2.extras
+from psycopg2 import pool as pg_pool
+
+from tracing import traced, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no pooled connection frees up within the checkout timeout
+    """
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class DatabasePool:
+    """
+    Per-worker pool of PostgreSQL connections
+
+    The underlying ThreadedConnectionPool is created lazily on first checkout
+    and re-created when the process id changes, so gunicorn workers forked
+    from a preloaded master never share sockets with their parent.
+
+    Borrowing checks the connection locally (closed, not inside a
+    transaction) and only pings the server with SELECT 1 when the
+    connection sat idle longer than health_check_idle seconds, so busy
+    workers pay no extra round trip per request.
+    """
+
+    def __init__(self, dsn=None, min_size=None, max_size=None,
+                 checkout_timeout=None, health_check=None, health_check_idle=None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self.health_check_idle = health_check_idle
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._slots = None
+        self._pid = None
+        self._created_at = None
+        # id(conn) -> monotonic time it was last returned, for idle connections
+        self._returned_at = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._in_use = 0
+        self._idle = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _configure(self):
+        """
+        Resolve settings from the environment (read after load_dotenv ran)
+        """
+        if self.dsn is None:
+            self.dsn = os.getenv('DATABASE_URL')
+        if self.min_size is None:
+            self.min_size = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+        if self.max_size is None:
+            self.max_size = int(os.getenv('DB_POOL_MAX_SIZE', 5))
+        if self.checkout_timeout is None:
+            self.checkout_timeout = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 10))
+        if self.health_check is None:
+            self.health_check = _env_flag('DB_POOL_HEALTH_CHECK', True)
+        if self.health_check_idle is None:
+            self.health_check_idle = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', 30))
+
+    def _ensure_pool(self):
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._pool is not None and self._pid == pid:
+                return
+            self._configure()
+            try:
+                # Every cursor of a pooled connection is instrumented and traced
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.min_size, self.max_size, self.dsn, cursor_factory=InstrumentedCursor
+                )
+            except psycopg2.Error as db_err:
+                logger.error(f"Database connection failed: {db_err}")
+                raise Exception(f"Database connection failed: {db_err}")
+            self._slots = threading.BoundedSemaphore(self.max_size)
+            self._pid = pid
+            self._created_at = time.monotonic()
+            self._returned_at = {}
+            self._reset_stats()
+            # ThreadedConnectionPool opens min_size connections up front
+            self._idle = self.min_size
+            logger.info(f"Database pool created (min={self.min_size}, max={self.max_size}, pid={pid})")
+
+    def _is_healthy(self, conn, idle_seconds):
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                return False
+            if idle_seconds <= self.health_check_idle:
+                return True
+            # Idle long enough for the server or a proxy to have dropped it
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _take(self):
+        """
+        Next connection from the pool and how long it sat idle
+        """
+        conn = self._pool.getconn()
+        with self._lock:
+            # The pool hands out idle connections before opening new ones
+            self._idle = max(0, self._idle - 1)
+            returned_at = self._returned_at.pop(id(conn), self._created_at)
+        return conn, time.monotonic() - returned_at
+
+    @traced('db.checkout')
+    def getconn(self):
+        """
+        Borrow a connection, waiting at most checkout_timeout seconds for a free slot
+        """
+        self._ensure_pool()
+
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(
+                f"No database connection available within {self.checkout_timeout}s"
+            )
+        waited = time.perf_counter() - started
+
+        try:
+            conn, idle_seconds = self._take()
+            if self.health_check and not self._is_healthy(conn, idle_seconds):
+                logger.warning("Discarding broken pooled connection")
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._discarded += 1
+                conn, _ = self._take()
+        except psycopg2.Error as db_err:
+            self._slots.release()
+            logger.error(f"Database connection failed: {db_err}")
+            raise Exception(f"Database connection failed: {db_err}")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        """
+        Return a borrowed connection, rolling back anything left uncommitted
+        """
+        close = conn.closed != 0
+        if not close:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                # ThreadedConnectionPool keeps min_size idle connections and closes the rest
+                if not close and self._idle < self.min_size:
+                    self._idle += 1
+                    self._returned_at[id(conn)] = time.monotonic()
+                else:
+                    self._returned_at.pop(id(conn), None)
+            self._slots.release()
+
+    def stats(self):
+        """
+        Snapshot of pool usage for this worker
+        """
+        with self._lock:
+            if self._pool is None:
+                return {'pid': os.getpid(), 'initialized': False}
+            return {
+                'pid': self._pid,
+                'initialized': True,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': self._idle,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_total_seconds': round(self._wait_total, 6),
+                'wait_avg_seconds': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_max_seconds': round(self._wait_max, 6),
+            }
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._pid = None
+
+
+# First table a statement reads or writes, for span names
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|TRUNCATE)\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def _statement_label(query):
+    words = query.split(None, 1)
+    if not words:
+        return 'sql'
+    verb = words[0].lower()
+    match = _TABLE_PATTERN.search(query)
+    return f'sql.{verb} {match.group(1)}' if match else f'sql.{verb}'
+
+
+def statement_label(query):
+    """
+    Span name of a statement, e.g. 'sql.select se_reports'; queries are mostly
+    string constants, so the set of names stays small
+    """
+    return _statement_label(query) if isinstance(query, str) else 'sql'
+
+
+class InstrumentedCursor(psycopg2.extras.DictCursor):
+    """
+    DictCursor that counts server round trips and the time spent in them
+
+    Every statement also runs in a tracing span named by statement_label, so
+    traced requests show each query. executemany is counted once per
+    parameter set, since psycopg2 sends one statement per row for it;
+    execute_values runs one traced execute per page. This is the default
+    cursor of pooled connections.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+        self.query_seconds = 0.0
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            with tracer.span(statement_label(query)):
+                return super().execute(query, vars)
+        finally:
+            self.round_trips += 1
+            self.query_seconds += time.perf_counter() - started
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        try:
+            with tracer.span(statement_label(query)):
+                return super().executemany(query, vars_list)
+        finally:
+            self.round_trips += len(vars_list)
+            self.query_seconds += time.perf_counter() - started
+
+
+db_pool = DatabasePool()
+
+
+def main():
+    """
+    Exercise the pool against DATABASE_URL from several threads and print stats
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    workers = int(os.getenv('DB_POOL_SMOKE_THREADS', 8))
+    rounds = int(os.getenv('DB_POOL_SMOKE_ROUNDS', 25))
+
+    def borrow():
+        for _ in range(rounds):
+            conn = db_pool.getconn()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            finally:
+                db_pool.putconn(conn)
+
+    threads = [threading.Thread(target=borrow) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{workers * rounds} checkouts in {elapsed:.3f}s")
+    print(db_pool.stats())
+    db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
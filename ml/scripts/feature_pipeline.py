@@ -0,0 +1,252 @@
+import os
+import glob
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from holiday_calendar import HolidayCalendar
+
+logger = logging.getLogger(__name__)
+
+LAG_COLUMNS = ['Lag 1 Week', 'Lag 2 Weeks', 'Lag 4 Week Mean']
+
+FEATURE_COLUMNS = [
+    'Dish Code', 'Meal Code', 'Duration', 'Holiday',
+    'Weekday', 'Month', 'Season', 'Days To Holiday'
+] + LAG_COLUMNS
+
+# Days to holiday beyond this carry no extra signal
+MAX_DAYS_TO_HOLIDAY = 60
+
+
+def fit_encoders(combined_df):
+    """
+    Separate label encoders for dishes and meals
+    """
+    return {
+        'dish': LabelEncoder().fit(combined_df['Dish Name'].astype(str)),
+        'meal': LabelEncoder().fit(combined_df['Meal'].astype(str))
+    }
+
+
+def extend_encoder(encoder, labels):
+    """
+    Append unseen labels to a fitted encoder, keeping the codes of known ones
+    """
+    new_labels = sorted(set(map(str, labels)) - set(encoder.classes_))
+    if new_labels:
+        encoder.classes_ = np.append(encoder.classes_, new_labels)
+    return encoder
+
+
+def encode_labels(encoder, labels):
+    """
+    Codes for labels; unseen labels get the codes extend_encoder would give them,
+    without modifying the fitted encoder
+    """
+    labels = np.asarray(labels, dtype=object)
+    codes = pd.Index(encoder.classes_).get_indexer(labels)
+    missing = codes < 0
+    if missing.any():
+        new_labels = pd.Index(sorted(set(labels[missing])))
+        codes[missing] = len(encoder.classes_) + new_labels.get_indexer(labels[missing])
+    return codes
+
+
+def season_of(months):
+    """
+    0 winter (Dec-Feb), 1 spring, 2 summer, 3 autumn
+    """
+    return (np.asarray(months) % 12) // 3
+
+
+def weekly_dish_lags(combined_df):
+    """
+    Weekly total of every dish with its previous totals, one row per (dish, week)
+
+    A row's lags describe the weeks the dish was served up to and including
+    that week; lookups only match weeks that ended before the queried date,
+    so no feature sees its own week.
+
+    :return: DataFrame with Dish Name, week_end and LAG_COLUMNS, sorted by week_end
+    """
+    weekly = pd.DataFrame({
+        'Dish Name': combined_df['Dish Name'].astype(str),
+        'week_end': combined_df['end_date'].to_numpy().astype('datetime64[ns]'),
+        'quantity': combined_df['Quantity (kg)'].to_numpy(dtype=float)
+    }).groupby(['Dish Name', 'week_end'], sort=True)['quantity'].sum().reset_index()
+
+    by_dish = weekly.groupby('Dish Name', sort=False)['quantity']
+    weekly['Lag 1 Week'] = weekly['quantity']
+    weekly['Lag 2 Weeks'] = by_dish.shift(1)
+    weekly['Lag 4 Week Mean'] = by_dish.rolling(4, min_periods=1).mean().reset_index(level=0, drop=True)
+    weekly = weekly.fillna({'Lag 2 Weeks': 0.0})
+    return weekly.drop(columns='quantity').sort_values('week_end', kind='stable').reset_index(drop=True)
+
+
+def report_duration(combined_df):
+    """
+    Median length in days of the report periods the rows come from (weekly reports give 7)
+    """
+    return float(combined_df['Duration'].median())
+
+
+class FeaturePipeline:
+    """
+    Fitted feature engineering for the quantity model
+
+    Holds what the features need beyond the rows themselves: the dish and
+    meal encoders, the weekly lag table, the holiday calendar and the typical
+    length of a training report period. transform turns (dish, meal, date,
+    duration) arrays into a float32 matrix in FEATURE_COLUMNS order, for
+    training rows and inference batches alike.
+    """
+
+    def __init__(self, holiday_data=None):
+        self.holiday_calendar = HolidayCalendar.coerce(holiday_data)
+        self.encoders = None
+        self.lag_table = None
+        self.report_duration = None
+
+    def fit(self, combined_df):
+        """
+        Fit encoders and the lag table on a frame from build_training_frame
+        """
+        self.encoders = fit_encoders(combined_df)
+        self.lag_table = weekly_dish_lags(combined_df)
+        self.report_duration = report_duration(combined_df)
+        return self
+
+    def extend(self, combined_df):
+        """
+        Add unseen labels and rebuild the lag table, keeping existing codes
+
+        :param combined_df: Every training row, old and new
+        """
+        extend_encoder(self.encoders['dish'], combined_df['Dish Name'])
+        extend_encoder(self.encoders['meal'], combined_df['Meal'])
+        self.lag_table = weekly_dish_lags(combined_df)
+        self.report_duration = report_duration(combined_df)
+        return self
+
+    def _lags(self, dishes, dates):
+        """
+        LAG_COLUMNS of the latest week of each dish that ended before the date, 0 if none
+        """
+        query = pd.DataFrame({
+            'Dish Name': dishes,
+            'date': dates.to_numpy().astype('datetime64[ns]'),
+            'row': np.arange(len(dishes))
+        }).sort_values('date', kind='stable')
+        matched = pd.merge_asof(
+            query, self.lag_table, left_on='date', right_on='week_end',
+            by='Dish Name', allow_exact_matches=False
+        )
+        lags = np.zeros((len(dishes), len(LAG_COLUMNS)), dtype=np.float32)
+        lags[matched['row'].to_numpy()] = matched[LAG_COLUMNS].fillna(0.0).to_numpy(dtype=np.float32)
+        return lags
+
+    def transform(self, dishes, meals, dates, durations=None):
+        """
+        Feature matrix for aligned arrays of dish names, meals, dates and durations
+
+        Rows predicted for single menu days have no report period of their
+        own; durations=None gives them the training report_duration, so
+        Duration stays within the range the model was trained on.
+
+        :return: float32 array of shape (rows, len(FEATURE_COLUMNS))
+        """
+        dishes = np.asarray(dishes, dtype=object).astype(str).astype(object)
+        meals = np.asarray(meals, dtype=object).astype(str).astype(object)
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+
+        X = np.empty((len(dishes), len(FEATURE_COLUMNS)), dtype=np.float32)
+        X[:, 0] = encode_labels(self.encoders['dish'], dishes)
+        X[:, 1] = encode_labels(self.encoders['meal'], meals)
+        X[:, 2] = self.report_duration if durations is None else np.asarray(durations, dtype=np.float32)
+        X[:, 3] = self.holiday_calendar.is_holiday(dates)
+        X[:, 4] = dates.weekday
+        X[:, 5] = dates.month
+        X[:, 6] = season_of(dates.month)
+        X[:, 7] = self.holiday_calendar.days_to_next_holiday(dates, MAX_DAYS_TO_HOLIDAY)
+        X[:, 8:] = self._lags(dishes, dates)
+        return X
+
+    def transform_frame(self, combined_df):
+        """
+        Feature matrix of the rows of a frame from build_training_frame
+        """
+        return self.transform(
+            combined_df['Dish Name'].to_numpy(dtype=object),
+            combined_df['Meal'].to_numpy(dtype=object),
+            combined_df['Start Date'],
+            combined_df['Duration'].to_numpy()
+        )
+
+
+class FeatureMatrixCache:
+    """
+    Training matrices on disk as .npy files keyed by data version
+
+    A matrix is built once per version of the training data and memory-mapped
+    on later loads, so retraining, searching and warm starts on unchanged data
+    skip feature engineering. Only the newest max_entries versions are kept.
+    """
+
+    def __init__(self, directory, max_entries=3):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _paths(self, key):
+        prefix = os.path.join(self.directory, f'features-{key}')
+        return f'{prefix}.X.npy', f'{prefix}.y.npy'
+
+    def load(self, key):
+        """
+        (X, y) for key, memory-mapped read-only, or None
+        """
+        x_path, y_path = self._paths(key)
+        try:
+            return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, X, y):
+        os.makedirs(self.directory, exist_ok=True)
+        for path, array in zip(self._paths(key), (X, y)):
+            tmp_path = f'{path}.{os.getpid()}.tmp.npy'
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        self._prune()
+
+    def _prune(self):
+        matrices = sorted(glob.glob(os.path.join(self.directory, 'features-*.X.npy')), key=os.path.getmtime)
+        for x_path in matrices[:-self.max_entries]:
+            for path in (x_path, x_path[:-len('.X.npy')] + '.y.npy'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def training_matrix(combined_df, features, cache=None, key=None):
+    """
+    float32 feature matrix and Daily Quantity target, from the cache when key matches
+
+    :param cache: FeatureMatrixCache, or None to always build
+    :param key: Data version the matrix is stored under (e.g. the training fingerprint)
+    :return: (X, y)
+    """
+    if cache is not None and key is not None:
+        cached = cache.load(key)
+        if cached is not None and len(cached[1]) == len(combined_df):
+            logger.info(f"Reusing cached feature matrix {key[:12]}")
+            return cached
+
+    X = features.transform_frame(combined_df)
+    y = combined_df['Daily Quantity'].to_numpy(dtype=np.float64)
+    if cache is not None and key is not None:
+        cache.store(key, X, y)
+    return X, y
@@ -1,6 +1,16 @@
 import io
+import os
+import hashlib
+import threading
+import multiprocessing
+import multiprocessing.util
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib
+import matplotlib.style
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 import seaborn as sns
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
@@ -11,9 +21,9 @@ from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
 from datetime import datetime
 import logging
 
-# Set up modern styling for plots
-plt.style.use('bmh')
-sns.set_theme(style="whitegrid")
+from report_dataset import add_parsed_dates, slice_date_range
+from report_aggregates import aggregate_report_statistics
+from tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -21,198 +31,297 @@ def analyze_consumption_data(most_expanded_df, start_datetime, end_datetime):
     """
     Enhanced data analysis with additional metrics
     """
-    most_expanded_df['start_date'] = pd.to_datetime(
-        most_expanded_df['Date Range'].str.split('-').str[0],
-        format='%d/%m/%Y',
-        errors='coerce'
-    )
+    if not pd.api.types.is_datetime64_any_dtype(most_expanded_df.get('start_date')):
+        add_parsed_dates(most_expanded_df)
 
     if most_expanded_df['start_date'].isnull().any():
         logger.error("Invalid date entries detected")
         raise ValueError("Invalid date entries found")
 
-    filtered_df = most_expanded_df[
-        (most_expanded_df['start_date'].dt.date >= start_datetime.date()) &
-        (most_expanded_df['start_date'].dt.date <= end_datetime.date())
-    ]
+    # Whole days: anything starting on end_datetime's date is included
+    filtered_df = slice_date_range(
+        most_expanded_df,
+        pd.Timestamp(start_datetime.date()),
+        pd.Timestamp(end_datetime.date()) + pd.Timedelta(days=1),
+        include_end=False
+    )
 
     if filtered_df.empty:
         logger.warning(f"No data found between {start_datetime.date()} and {end_datetime.date()}")
-        return {
-            'total_consumption': pd.Series(),
-            'top_dishes': pd.Series(),
-            'meal_distribution_percent': pd.Series(),
-            'weekly_trend': pd.Series(),
-            'daily_avg': pd.Series(),
-            'total_kg': 0,
-            'growth_rate': 0
-        }
-
-    # Enhanced analytics
-    total_consumption = filtered_df.groupby('Meal')['Quantity (kg)'].sum()
-    top_dishes = filtered_df.groupby('Dish Name')['Quantity (kg)'].sum().nlargest(10)
-    meal_distribution_percent = (total_consumption / total_consumption.sum()) * 100
-    weekly_trend = filtered_df.groupby('Week')['Quantity (kg)'].sum()
-    daily_avg = filtered_df.groupby(['Meal'])['Quantity (kg)'].mean()
-    growth_rate = ((weekly_trend.iloc[-1] - weekly_trend.iloc[0]) / weekly_trend.iloc[0] * 100) if len(weekly_trend) > 1 else 0
-
-    return {
-        'total_consumption': total_consumption,
-        'top_dishes': top_dishes,
-        'meal_distribution_percent': meal_distribution_percent,
-        'weekly_trend': weekly_trend,
-        'daily_avg': daily_avg,
-        'total_kg': total_consumption.sum(),
-        'growth_rate': growth_rate
-    }
-
-
-def create_visualizations(analysis_data):
+
+    return aggregate_report_statistics(filtered_df).analysis_data()
+
+
+# Bump whenever a chart's look changes, so cached renders are not reused
+CHART_TEMPLATE_VERSION = 1
+
+# Image settings per output target; PDFs embed raster images via reportlab.
+# 'web' charts are served by the ML server, so they render in-process rather
+# than starting a chart pool in every web worker
+CHART_TARGETS = {
+    'pdf': {'format': 'png', 'dpi': int(os.getenv('CHART_PDF_DPI', 300)), 'parallel': True},
+    'web': {'format': 'svg', 'dpi': 100, 'parallel': False},
+}
+
+_chart_rc = None
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+_chart_executor = None
+
+
+def chart_rc():
     """
-    Create enhanced visualizations with proper spacing between charts
+    rcParams of the report style ('bmh' overlaid with seaborn's whitegrid theme),
+    computed once and applied per render instead of mutating global state
     """
-    figures = []
-    
-    # Color palette
-    colors_palette = sns.color_palette("husl", 10)
-    
-    fig1 = plt.figure(figsize=(10, 8))
-    gs1 = fig1.add_gridspec(1, 2, hspace=0.4)
-    
-    # 1. Meal Distribution (Donut Chart)
-    if not analysis_data['meal_distribution_percent'].empty:
-        ax1 = fig1.add_subplot(gs1[0, 0])
-        wedges, texts, autotexts = ax1.pie(
-            analysis_data['meal_distribution_percent'],
-            labels=analysis_data['meal_distribution_percent'].index,
-            autopct='%1.1f%%',
-            startangle=90,
-            pctdistance=0.85,
-            colors=sns.color_palette("Set3")
+    global _chart_rc
+    if _chart_rc is None:
+        with matplotlib.rc_context():
+            matplotlib.style.use('bmh')
+            sns.set_theme(style="whitegrid")
+            _chart_rc = {
+                key: value for key, value in matplotlib.rcParams.items()
+                if key not in ('backend', 'backend_fallback', 'interactive')
+            }
+    return _chart_rc
+
+
+def _save_figure(fig, fmt, dpi):
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, bbox_inches='tight', dpi=dpi, facecolor='white')
+    return buf.getvalue()
+
+
+def render_distribution_chart(analysis_data, fmt='png', dpi=300):
+    """
+    Meal type donut and top dishes bar chart, returned as encoded image bytes
+    """
+    with matplotlib.rc_context(chart_rc()):
+        # Color palette
+        colors_palette = sns.color_palette("husl", 10)
+
+        fig1 = Figure(figsize=(10, 8))
+        gs1 = fig1.add_gridspec(1, 2, hspace=0.4)
+
+        # 1. Meal Distribution (Donut Chart)
+        if not analysis_data['meal_distribution_percent'].empty:
+            ax1 = fig1.add_subplot(gs1[0, 0])
+            wedges, texts, autotexts = ax1.pie(
+                analysis_data['meal_distribution_percent'],
+                labels=analysis_data['meal_distribution_percent'].index,
+                autopct='%1.1f%%',
+                startangle=90,
+                pctdistance=0.85,
+                colors=sns.color_palette("Set3")
+            )
+            centre_circle = Circle((0, 0), 0.70, fc='white')
+            ax1.add_artist(centre_circle)
+            ax1.set_title('Meal Type Distribution', pad=20, fontsize=12, fontweight='bold')
+
+        # 2. Top Dishes (Horizontal Bar Chart)
+        if not analysis_data['top_dishes'].empty:
+            ax2 = fig1.add_subplot(gs1[0, 1])
+            bars = ax2.barh(
+                analysis_data['top_dishes'].index,
+                analysis_data['top_dishes'].values,
+                color=colors_palette
+            )
+            ax2.set_title('Top 10 Most Consumed Dishes', pad=20, fontsize=12, fontweight='bold')
+            ax2.set_xlabel('Quantity (kg)')
+            for bar in bars:
+                width = bar.get_width()
+                ax2.text(width, bar.get_y() + bar.get_height()/2,
+                        f'{width:.1f}kg', ha='left', va='center', fontsize=8)
+
+        fig1.tight_layout()
+        return _save_figure(fig1, fmt, dpi)
+
+
+def render_trend_chart(analysis_data, fmt='png', dpi=300):
+    """
+    Weekly trend and daily average per meal chart, returned as encoded image bytes
+    """
+    with matplotlib.rc_context(chart_rc()):
+        colors_palette = sns.color_palette("husl", 10)
+
+        # Figure 2: Weekly Trend and Daily Average
+        # Increase figure height to accommodate spacing
+        fig2 = Figure(figsize=(10, 10))
+
+        # Adjust gridspec with increased height_ratios and hspace
+        gs2 = fig2.add_gridspec(2, 1, height_ratios=[1.2, 1], hspace=0.8)
+
+        # 3. Weekly Trend with Moving Average
+        if not analysis_data['weekly_trend'].empty:
+            ax3 = fig2.add_subplot(gs2[0])
+
+            weeks = analysis_data['weekly_trend'].index
+
+            if len(weeks) > 8:
+                rotation = 45
+                ha = 'right'
+            else:
+                rotation = 0
+                ha = 'center'
+
+            # Plot actual values
+            line1 = ax3.plot(range(len(weeks)),
+                            analysis_data['weekly_trend'].values,
+                            marker='o', linestyle='-', color=colors_palette[2],
+                            label='Weekly Consumption')[0]
+
+            # Calculate and plot moving average
+            ma = analysis_data['weekly_trend'].rolling(window=2).mean()
+            line2 = ax3.plot(range(len(weeks)), ma.values,
+                            linestyle='--', color=colors_palette[3],
+                            label='Moving Average (2 weeks)')[0]
+
+            ax3.set_xticks(range(len(weeks)))
+            ax3.set_xticklabels(weeks, rotation=rotation, ha=ha)
+
+            ax3.set_title('Weekly Consumption Trend', pad=20, fontsize=12, fontweight='bold')
+            ax3.set_xlabel('Week', labelpad=10)
+            ax3.set_ylabel('Quantity (kg)', labelpad=10)
+
+            # Adjust legend position
+            ax3.legend(
+                [line1, line2],
+                ['Weekly Consumption', 'Moving Average (2 weeks)'],
+                loc='upper center',
+                bbox_to_anchor=(0.5, 1.25),
+                ncol=2,
+                frameon=True,
+                fancybox=True,
+                shadow=True
+            )
+
+            ax3.grid(True, linestyle='--', alpha=0.7)
+            ax3.margins(x=0.05)
+
+        # 4. Daily Average by Meal Type
+        if not analysis_data['daily_avg'].empty:
+            ax4 = fig2.add_subplot(gs2[1])
+            bars = ax4.bar(
+                analysis_data['daily_avg'].index,
+                analysis_data['daily_avg'].values,
+                color=colors_palette
+            )
+            ax4.set_title('Daily Average Consumption by Meal Type',
+                        pad=20, fontsize=12, fontweight='bold')
+            ax4.set_ylabel('Average Quantity (kg)', labelpad=10)
+
+            for bar in bars:
+                height = bar.get_height()
+                ax4.text(bar.get_x() + bar.get_width()/2, height,
+                        f'{height:.1f}kg', ha='center', va='bottom')
+
+        # Adjust layout with proper spacing
+        fig2.tight_layout()
+
+        # Fine-tune the spacing
+        fig2.subplots_adjust(
+            top=0.88,      # Increased top margin for legend
+            bottom=0.1,    # Slight bottom margin
+            hspace=0.45    # Increased space between plots
         )
-        centre_circle = plt.Circle((0, 0), 0.70, fc='white')
-        ax1.add_artist(centre_circle)
-        ax1.set_title('Meal Type Distribution', pad=20, fontsize=12, fontweight='bold')
-        
-    # 2. Top Dishes (Horizontal Bar Chart)
-    if not analysis_data['top_dishes'].empty:
-        ax2 = fig1.add_subplot(gs1[0, 1])
-        bars = ax2.barh(
-            analysis_data['top_dishes'].index,
-            analysis_data['top_dishes'].values,
-            color=colors_palette
+
+        return _save_figure(fig2, fmt, dpi)
+
+
+CHART_RENDERERS = (render_distribution_chart, render_trend_chart)
+CHART_NAMES = ('distribution', 'trend')
+
+
+def chart_cache_key(analysis_data, fmt, dpi):
+    """
+    Hash of every series a chart is drawn from plus the output settings
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{CHART_TEMPLATE_VERSION}|{fmt}|{dpi}'.encode('utf-8'))
+    for name in ('meal_distribution_percent', 'top_dishes', 'weekly_trend', 'daily_avg'):
+        series = analysis_data[name]
+        digest.update(name.encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(series, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def _chart_pool():
+    """
+    Process pool for rendering charts concurrently
+
+    CHART_RENDER_WORKERS defaults to one process per chart, capped by the
+    CPU count; 1 renders serially.
+    """
+    global _chart_executor
+    workers = int(os.getenv('CHART_RENDER_WORKERS') or min(len(CHART_RENDERERS), os.cpu_count() or 1))
+    if workers <= 1:
+        return None
+    if _chart_executor is None:
+        _chart_executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
         )
-        ax2.set_title('Top 10 Most Consumed Dishes', pad=20, fontsize=12, fontweight='bold')
-        ax2.set_xlabel('Quantity (kg)')
-        for bar in bars:
-            width = bar.get_width()
-            ax2.text(width, bar.get_y() + bar.get_height()/2,
-                    f'{width:.1f}kg', ha='left', va='center', fontsize=8)
-    
-    plt.tight_layout()
-    buf1 = io.BytesIO()
-    plt.savefig(buf1, format='png', bbox_inches='tight', dpi=300, facecolor='white')
-    buf1.seek(0)
-    plt.close()
-    figures.append(buf1)
-    
-    # Figure 2: Weekly Trend and Daily Average
-    # Increase figure height to accommodate spacing
-    fig2 = plt.figure(figsize=(10, 10))
+        # Report builders are themselves pool processes, which join their
+        # children on exit before atexit handlers would stop this pool; run
+        # ahead of the queue finalizers (priority 10) so the stop reaches the workers
+        multiprocessing.util.Finalize(None, _chart_executor.shutdown, exitpriority=20)
+    return _chart_executor
+
+
+@traced('chart_render')
+def create_visualizations(analysis_data, target='pdf'):
+    """
+    Create enhanced visualizations with proper spacing between charts
     
-    # Adjust gridspec with increased height_ratios and hspace
-    gs2 = fig2.add_gridspec(2, 1, height_ratios=[1.2, 1], hspace=0.8)
+    Charts are drawn with the object-oriented Figure API, so they can render
+    in parallel worker processes, and finished renders are cached by a hash
+    of the analysed series.
     
-    # 3. Weekly Trend with Moving Average
-    if not analysis_data['weekly_trend'].empty:
-        ax3 = fig2.add_subplot(gs2[0])
-        
-        weeks = analysis_data['weekly_trend'].index
-        
-        if len(weeks) > 8:
-            rotation = 45
-            ha = 'right'
+    :param analysis_data: Result of analyze_consumption_data
+    :param target: Key of CHART_TARGETS selecting image format and dpi
+    :return: List of BytesIO buffers, one per chart
+    """
+    settings = CHART_TARGETS[target]
+    fmt, dpi = settings['format'], settings['dpi']
+
+    key = chart_cache_key(analysis_data, fmt, dpi)
+    with _chart_cache_lock:
+        images = _chart_cache.get(key)
+        if images is not None:
+            _chart_cache.move_to_end(key)
+
+    if images is None:
+        pool = _chart_pool() if settings['parallel'] else None
+        if pool is not None:
+            futures = [pool.submit(render, analysis_data, fmt, dpi) for render in CHART_RENDERERS]
+            images = tuple(future.result() for future in futures)
         else:
-            rotation = 0
-            ha = 'center'
-            
-        # Plot actual values
-        line1 = ax3.plot(range(len(weeks)), 
-                        analysis_data['weekly_trend'].values,
-                        marker='o', linestyle='-', color=colors_palette[2],
-                        label='Weekly Consumption')[0]
-                        
-        # Calculate and plot moving average
-        ma = analysis_data['weekly_trend'].rolling(window=2).mean()
-        line2 = ax3.plot(range(len(weeks)), ma.values,
-                        linestyle='--', color=colors_palette[3],
-                        label='Moving Average (2 weeks)')[0]
-        
-        ax3.set_xticks(range(len(weeks)))
-        ax3.set_xticklabels(weeks, rotation=rotation, ha=ha)
-        
-        ax3.set_title('Weekly Consumption Trend', pad=20, fontsize=12, fontweight='bold')
-        ax3.set_xlabel('Week', labelpad=10)
-        ax3.set_ylabel('Quantity (kg)', labelpad=10)
-        
-        # Adjust legend position
-        ax3.legend(
-            [line1, line2],
-            ['Weekly Consumption', 'Moving Average (2 weeks)'],
-            loc='upper center',
-            bbox_to_anchor=(0.5, 1.25),
-            ncol=2,
-            frameon=True,
-            fancybox=True,
-            shadow=True
-        )
-        
-        ax3.grid(True, linestyle='--', alpha=0.7)
-        ax3.margins(x=0.05)
-        
-    # 4. Daily Average by Meal Type
-    if not analysis_data['daily_avg'].empty:
-        ax4 = fig2.add_subplot(gs2[1])
-        bars = ax4.bar(
-            analysis_data['daily_avg'].index,
-            analysis_data['daily_avg'].values,
-            color=colors_palette
-        )
-        ax4.set_title('Daily Average Consumption by Meal Type',
-                    pad=20, fontsize=12, fontweight='bold')
-        ax4.set_ylabel('Average Quantity (kg)', labelpad=10)
-        
-        for bar in bars:
-            height = bar.get_height()
-            ax4.text(bar.get_x() + bar.get_width()/2, height,
-                    f'{height:.1f}kg', ha='center', va='bottom')
+            images = tuple(render(analysis_data, fmt, dpi) for render in CHART_RENDERERS)
 
-    # Adjust layout with proper spacing
-    plt.tight_layout()
-    
-    # Fine-tune the spacing
-    plt.subplots_adjust(
-        top=0.88,      # Increased top margin for legend
-        bottom=0.1,    # Slight bottom margin
-        hspace=0.45    # Increased space between plots
-    )
-    
-    buf2 = io.BytesIO()
-    plt.savefig(buf2, format='png', bbox_inches='tight', dpi=300, facecolor='white')
-    buf2.seek(0)
-    plt.close()
-    figures.append(buf2)
-    
-    return figures
+        with _chart_cache_lock:
+            _chart_cache[key] = images
+            while len(_chart_cache) > int(os.getenv('CHART_CACHE_MAX_ENTRIES', 16)):
+                _chart_cache.popitem(last=False)
+
+    return [io.BytesIO(image) for image in images]
 
 
-def create_pdf(summary_df, most_expanded_df, start_datetime, end_datetime):
+def create_pdf(summary_df, most_expanded_df, start_datetime, end_datetime, output=None, statistics=None):
     """
     Generate an enhanced PDF report with properly sized images
+    
+    :param output: Optional writable binary buffer; the PDF is built into it
+                   instead of a file in the working directory
+    :param statistics: ReportStatistics already computed for this range; when
+                       given, most_expanded_df is not aggregated again
+    :return: The PDF filename, or output when one was given
     """
     try:
         # Analyze data
-        analysis_data = analyze_consumption_data(most_expanded_df, start_datetime, end_datetime)
+        if statistics is not None:
+            analysis_data = statistics.analysis_data()
+        else:
+            analysis_data = analyze_consumption_data(most_expanded_df, start_datetime, end_datetime)
         
         # Create visualizations
         figure_buffers = create_visualizations(analysis_data)
@@ -220,7 +329,7 @@ def create_pdf(summary_df, most_expanded_df, start_datetime, end_datetime):
         # PDF setup
         pdf_filename = f'consumption_report_{start_datetime.strftime("%d_%m_%Y")}_to_{end_datetime.strftime("%d_%m_%Y")}.pdf'
         doc = SimpleDocTemplate(
-            pdf_filename,
+            pdf_filename if output is None else output,
             pagesize=letter,
             rightMargin=50,
             leftMargin=50,
@@ -353,6 +462,8 @@ def create_pdf(summary_df, most_expanded_df, start_datetime, end_datetime):
 
         # Build the PDF
         doc.build(story)
+        if output is not None:
+            return output
         return pdf_filename
 
     except Exception as e:
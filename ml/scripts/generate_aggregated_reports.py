@@ -2,6 +2,8 @@ import pandas as pd
 import os
 import logging
 
+from report_aggregates import weekly_report_statistics
+
 logger = logging.getLogger(__name__)
 
 def generate_weekly_report(most_expanded_df, least_expanded_df, start_datetime, end_datetime):
@@ -14,49 +16,12 @@ def generate_weekly_report(most_expanded_df, least_expanded_df, start_datetime,
     print("Least Expanded DF Columns:", list(least_expanded_df.columns))
 
 
-    # Ensure the required columns exist
-    required_columns = ['Date Range', 'Meal', 'Dish Name', 'Quantity (kg)']
-    
-    for col in required_columns:
-        if col not in most_expanded_df.columns:
-            raise ValueError(f"Missing required column: {col}")
-
-    # Extract start date from 'Date Range' and convert to datetime
-    most_expanded_df['start_date'] = most_expanded_df['Date Range'].str.split('-').str[0]
-    least_expanded_df['start_date'] = least_expanded_df['Date Range'].str.split('-').str[0]
-
-    most_expanded_df['start_date'] = pd.to_datetime(most_expanded_df['start_date'], format='%d/%m/%Y', errors='coerce')
-    least_expanded_df['start_date'] = pd.to_datetime(least_expanded_df['start_date'], format='%d/%m/%Y', errors='coerce')
-
-    # Check for NaT values after conversion
-    if most_expanded_df['start_date'].isnull().any():
-        logger.error("There are invalid date entries in most_expanded_df.")
-        raise ValueError("Invalid date entries found in most_expanded_df.")
-    
-    if least_expanded_df['start_date'].isnull().any():
-        logger.error("There are invalid date entries in least_expanded_df.")
-        raise ValueError("Invalid date entries found in least_expanded_df.")
-
-    # Filter data within the specified date range
-    filtered_most_expanded = most_expanded_df[
-        (most_expanded_df['start_date'] >= start_datetime) & 
-        (most_expanded_df['start_date'] <= end_datetime)
-    ]
-    filtered_least_expanded = least_expanded_df[
-        (least_expanded_df['start_date'] >= start_datetime) & 
-        (least_expanded_df['start_date'] <= end_datetime)
-    ]
-
-    # Generate summary statistics
-    summary = {
-        'Total Quantity (kg)': filtered_most_expanded['Quantity (kg)'].sum(),
-        'Most Consumed Dishes': filtered_most_expanded.groupby('Dish Name')['Quantity (kg)'].sum().nlargest(10).to_dict(),
-        'Least Consumed Dishes': filtered_least_expanded.groupby('Dish Name')['Quantity (kg)'].sum().nsmallest(10).to_dict(),
-        'Meal Type Distribution': filtered_most_expanded.groupby('Meal')['Quantity (kg)'].sum().to_dict()
-    }
+    statistics, filtered_most_expanded, filtered_least_expanded = weekly_report_statistics(
+        most_expanded_df, least_expanded_df, start_datetime, end_datetime
+    )
 
     # Create a DataFrame for the summary
-    summary_df = pd.DataFrame.from_dict(summary, orient='index').T
+    summary_df = statistics.summary_frame()
 
     # Ensure the directory exists
     # os.makedirs('../csv_reports', exist_ok=True)
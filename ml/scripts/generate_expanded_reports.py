@@ -1,7 +1,11 @@
 # generate_expanded_reports.py
 import pandas as pd
+import numpy as np
 import os
 
+import report_dataset
+from report_dataset import ColumnarArtifactWriter, MOST_EXPANDED_REPORT_FILE, LEAST_EXPANDED_REPORT_FILE
+
 # Function to parse dish name and quantity from a string
 def parse_dish_quantity(dish_string):
     try:
@@ -10,117 +14,131 @@ def parse_dish_quantity(dish_string):
     except ValueError:
         return None, None
 
-# Function to expand and aggregate the most consumed weekly report
-def expand_and_sum_most_consumed_weekly(df):
-    expanded_data = []
-
-    for index, row in df.iterrows():
-        # Process breakfast
-        breakfast_dishes = row['breakfast_items'].split(';')
-        breakfast_quantities = row['breakfast_kg'].split(';')
-        
-        for dish, quantity in zip(breakfast_dishes, breakfast_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Breakfast',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-        # Process lunch
-        lunch_dishes = row['lunch_items'].split(';')
-        lunch_quantities = row['lunch_kg'].split(';')
-        
-        for dish, quantity in zip(lunch_dishes, lunch_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Lunch',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-        # Process dinner
-        dinner_dishes = row['dinner_items'].split(';')
-        dinner_quantities = row['dinner_kg'].split(';')
-        
-        for dish, quantity in zip(dinner_dishes, dinner_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Dinner',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-    expanded_df = pd.DataFrame(expanded_data)
+# Meal label and the packed dish/quantity columns of the daily CSV format
+MEAL_COLUMN_PAIRS = (
+    ('Breakfast', 'breakfast_items', 'breakfast_kg'),
+    ('Lunch', 'lunch_items', 'lunch_kg'),
+    ('Dinner', 'dinner_items', 'dinner_kg'),
+)
+
+EXPANDED_COLUMNS = ['Month-Year', 'Week', 'Date', 'Meal', 'Dish Name', 'Quantity (kg)']
+
+
+def _split_packed(column):
+    """
+    Split a ';'-packed column into a Series indexed by (row, position)
+    """
+    # dropna: expand=True pads shorter lists, and pandas 3's stack keeps the padding
+    return column.astype(str).str.split(';', expand=True).stack().dropna()
+
+
+def expand_daily_meals(df):
+    """
+    Expand the semicolon-packed daily CSV format into one row per dish
     
-    # Ensure the directory exists
-    os.makedirs('../csv_reports', exist_ok=True)
+    All three meals are split at once; dishes and quantities are paired by
+    position (like zip, extra entries on either side are dropped) and
+    quantities are converted in a single pd.to_numeric call.
     
-    weekly_most_path = '../csv_reports/most_expanded_expanded_report.csv'
-    expanded_df.to_csv(weekly_most_path, index=False)
-    return weekly_most_path
-
-# Function to expand and aggregate the least consumed weekly report
-def expand_and_sum_least_consumed_weekly(df):
-    expanded_data = []
-
-    for index, row in df.iterrows():
-        # Process breakfast
-        breakfast_dishes = row['breakfast_items'].split(';')
-        breakfast_quantities = row['breakfast_kg'].split(';')
-        
-        for dish, quantity in zip(breakfast_dishes, breakfast_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Breakfast',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-        # Process lunch
-        lunch_dishes = row['lunch_items'].split(';')
-        lunch_quantities = row['lunch_kg'].split(';')
-        
-        for dish, quantity in zip(lunch_dishes, lunch_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Lunch',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-        # Process dinner
-        dinner_dishes = row['dinner_items'].split(';')
-        dinner_quantities = row['dinner_kg'].split(';')
-        
-        for dish, quantity in zip(dinner_dishes, dinner_quantities):
-            expanded_data.append({
-                'Month-Year': row['month_year'],
-                'Week': row['week'],
-                'Date': row['date'],
-                'Meal': 'Dinner',
-                'Dish Name': dish.strip(),
-                'Quantity (kg)': float(quantity.strip())
-            })
-
-    expanded_df = pd.DataFrame(expanded_data)
+    :param df: DataFrame with month_year, week, date and the <meal>_items / <meal>_kg columns
+    :return: DataFrame with EXPANDED_COLUMNS, Meal and Dish Name as categoricals
+    """
+    df = df.reset_index(drop=True)
+
+    parts = []
+    for meal_code, (meal, items_column, kg_column) in enumerate(MEAL_COLUMN_PAIRS):
+        pairs = pd.concat(
+            {'dish': _split_packed(df[items_column]), 'quantity': _split_packed(df[kg_column])},
+            axis=1,
+            join='inner'
+        )
+        pairs['meal_code'] = meal_code
+        parts.append(pairs)
+    long_df = pd.concat(parts)
+
+    rows = long_df.index.get_level_values(0).to_numpy()
+    positions = long_df.index.get_level_values(1).to_numpy()
+    meal_codes = long_df['meal_code'].to_numpy()
+    # Same order as the old row-by-row loop: day, then meal, then dish position
+    order = np.lexsort((positions, meal_codes, rows))
+    rows = rows[order]
+
+    meal_labels = [meal for meal, _, _ in MEAL_COLUMN_PAIRS]
+    return pd.DataFrame({
+        'Month-Year': df['month_year'].to_numpy()[rows],
+        'Week': df['week'].to_numpy()[rows],
+        'Date': df['date'].to_numpy()[rows],
+        'Meal': pd.Categorical.from_codes(meal_codes[order], categories=meal_labels),
+        # Strip before categorizing: ' Dosa' and 'Dosa' must become one category
+        'Dish Name': pd.Categorical(long_df['dish'].str.strip().to_numpy()[order]),
+        # float64 even when every quantity is a whole number, like float() per dish
+        'Quantity (kg)': pd.to_numeric(long_df['quantity'].str.strip().to_numpy()[order]).astype('float64'),
+    }, columns=EXPANDED_COLUMNS)
+
+
+def iter_expanded_meals(source, chunksize=None):
+    """
+    Yield expanded DataFrames for a daily CSV, chunk by chunk
     
-    # Ensure the directory exists
-    os.makedirs('../csv_reports', exist_ok=True)
+    :param source: DataFrame or path of a daily CSV file (e.g. aggregated_data.csv)
+    :param chunksize: Input rows per chunk; None expands everything at once
+    :return: Generator of DataFrames as returned by expand_daily_meals
+    """
+    if isinstance(source, pd.DataFrame):
+        if chunksize is None:
+            yield expand_daily_meals(source)
+            return
+        for start in range(0, len(source), chunksize):
+            yield expand_daily_meals(source.iloc[start:start + chunksize])
+        return
+
+    if chunksize is None:
+        yield expand_daily_meals(pd.read_csv(source))
+        return
+    with pd.read_csv(source, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield expand_daily_meals(chunk)
+
+
+def write_expanded_report(source, output_path, chunksize=None, columnar=True):
+    """
+    Expand a daily CSV and write it to output_path, holding one chunk in memory at a time
     
-    weekly_least_path = '../csv_reports/least_expanded_expanded_report.csv'
-    expanded_df.to_csv(weekly_least_path, index=False)
-    return weekly_least_path
+    :param source: DataFrame or path of a daily CSV file
+    :param output_path: CSV file to write
+    :param chunksize: Input rows per chunk; None expands everything at once
+    :param columnar: Also write the typed Parquet artifact next to the CSV (needs pyarrow)
+    :return: output_path
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    artifact = ColumnarArtifactWriter(output_path) if columnar and report_dataset.pq is not None else None
+    try:
+        header = True
+        for expanded_df in iter_expanded_meals(source, chunksize):
+            expanded_df.to_csv(output_path, index=False, mode='w' if header else 'a', header=header)
+            header = False
+            if artifact is not None:
+                artifact.write(expanded_df)
+        if header:
+            pd.DataFrame(columns=EXPANDED_COLUMNS).to_csv(output_path, index=False)
+    except Exception:
+        if artifact is not None:
+            artifact.abort()
+        raise
+    # Closed after the CSV so the artifact counts as fresh
+    if artifact is not None:
+        artifact.close()
+    return output_path
+
+
+# Function to expand and aggregate the most consumed weekly report
+def expand_and_sum_most_consumed_weekly(df, chunksize=None):
+    return write_expanded_report(df, MOST_EXPANDED_REPORT_FILE, chunksize)
+
+# Function to expand and aggregate the least consumed weekly report
+def expand_and_sum_least_consumed_weekly(df, chunksize=None):
+    return write_expanded_report(df, LEAST_EXPANDED_REPORT_FILE, chunksize)
 
 def main():
     # Define the paths to the input CSV files
@@ -0,0 +1,16 @@
+# Gunicorn settings for the ML server, loaded by the Dockerfile's
+# `gunicorn -c /app/scripts/gunicorn.conf.py ... server:app`.
+# Command-line flags still override anything set here.
+import os
+import importlib
+
+# GUNICORN_PRELOAD=true imports the app, and then the heavy modules it loads
+# lazily, in the master; forked workers share those pages copy-on-write and
+# start serving immediately. Leave it off to keep code reloads per worker.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def when_ready(arbiter):
+    # Runs in the master after the app was loaded and before workers are forked
+    if preload_app:
+        importlib.import_module('server').preload_modules()
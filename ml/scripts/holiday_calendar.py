@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+
+class HolidayCalendar:
+    """
+    Day-level holiday lookup built once from the holiday DataFrame
+
+    Every holiday is expanded into the days it covers and stored as a sorted
+    array of day numbers, so any batch of dates is resolved with a single
+    searchsorted call instead of scanning the holiday rows per date.
+    Overlapping holidays resolve to the one listed first, same as a linear scan.
+    """
+
+    def __init__(self, holiday_data, holiday_factor=0.7):
+        self.holiday_factor = holiday_factor
+
+        if holiday_data is None or holiday_data.empty:
+            self.names = np.array([], dtype=object)
+            self._days = np.array([], dtype=np.int64)
+            self._owner = np.array([], dtype=np.int64)
+            return
+
+        starts = pd.to_datetime(holiday_data['Start Date']).values.astype('datetime64[D]').astype(np.int64)
+        ends = pd.to_datetime(holiday_data['End Date']).values.astype('datetime64[D]').astype(np.int64)
+        if 'Holiday' in holiday_data.columns:
+            self.names = holiday_data['Holiday'].to_numpy(dtype=object)
+        else:
+            self.names = np.full(len(holiday_data), None, dtype=object)
+
+        # One entry per (holiday, covered day); reversed intervals cover nothing
+        lengths = np.clip(ends - starts + 1, 0, None)
+        owner = np.repeat(np.arange(len(starts)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        days = np.repeat(starts, lengths) + offsets
+
+        # Sort by day, keeping the earliest-listed holiday for shared days
+        order = np.lexsort((owner, days))
+        days, owner = days[order], owner[order]
+        first = np.ones(len(days), dtype=bool)
+        first[1:] = days[1:] != days[:-1]
+        self._days = days[first]
+        self._owner = owner[first]
+
+    @classmethod
+    def coerce(cls, holiday_data, **kwargs):
+        """
+        Return holiday_data unchanged if it is already a calendar, otherwise build one
+        """
+        if isinstance(holiday_data, cls):
+            return holiday_data
+        return cls(holiday_data, **kwargs)
+
+    def covered_days(self):
+        """
+        Sorted day numbers (days since 1970-01-01) covered by any holiday
+        """
+        return self._days
+
+    @staticmethod
+    def _to_days(dates):
+        return pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(dates))).values.astype('datetime64[D]').astype(np.int64)
+
+    def holiday_index(self, dates):
+        """
+        Position of the holiday covering each date in the source frame, -1 if none
+        """
+        days = self._to_days(dates)
+        if len(self._days) == 0:
+            return np.full(len(days), -1, dtype=np.int64)
+        pos = np.searchsorted(self._days, days)
+        pos_clipped = np.minimum(pos, len(self._days) - 1)
+        hit = self._days[pos_clipped] == days
+        return np.where(hit, self._owner[pos_clipped], -1)
+
+    def is_holiday(self, dates):
+        """
+        Boolean array, True where the date falls inside any holiday
+        """
+        return self.holiday_index(dates) >= 0
+
+    def holiday_names(self, dates):
+        """
+        Object array with the holiday name for each date, None outside holidays
+        """
+        index = self.holiday_index(dates)
+        names = np.full(len(index), None, dtype=object)
+        hit = index >= 0
+        names[hit] = self.names[index[hit]]
+        return names
+
+    def days_to_next_holiday(self, dates, limit=365):
+        """
+        Days from each date to the next holiday day, 0 inside a holiday, capped at limit
+        """
+        days = self._to_days(dates)
+        if len(self._days) == 0:
+            return np.full(len(days), limit, dtype=np.int64)
+        pos = np.searchsorted(self._days, days)
+        ahead = np.full(len(days), limit, dtype=np.int64)
+        found = pos < len(self._days)
+        ahead[found] = np.minimum(self._days[pos[found]] - days[found], limit)
+        return ahead
+
+    def adjustment_factors(self, dates, holiday_factor=None):
+        """
+        Quantity multiplier per date: holiday_factor on holidays, 1.0 otherwise
+        """
+        factor = self.holiday_factor if holiday_factor is None else holiday_factor
+        return np.where(self.is_holiday(dates), factor, 1.0)
+
+    def contains(self, date):
+        """
+        Scalar convenience wrapper around is_holiday
+        """
+        return bool(self.is_holiday([date])[0])
+
+    def name_of(self, date):
+        """
+        Scalar convenience wrapper around holiday_names
+        """
+        return self.holiday_names([date])[0]
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+GENERATION_FILE = 'GENERATION'
+
+
+class MenuCache:
+    """
+    Content-addressed cache of generated menu JSON
+
+    Entries live in a per-worker LRU and, when MENU_CACHE_DIR is set, in a
+    directory shared by all gunicorn workers. Keys hash everything the menu
+    depends on, so new consumption data produces a new key on its own; TTL
+    and invalidate() cover anything the key cannot see.
+
+    Since new data means new keys, the disk tier never overwrites stale
+    entries; instead a lookup deletes the file it finds expired or older
+    than the last invalidation, and the directory is kept under
+    MENU_CACHE_DISK_MAX_ENTRIES files, dropping stale ones and then the oldest.
+    Each worker adds its own stores to the count from its last scan and only
+    scans again once that passes the cap, or every disk_rescan_every stores
+    to pick up what other workers wrote. A scan over the cap trims to 90% of
+    it, so the next one is not due on the very next store.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, cache_dir=None, disk_max_entries=None, disk_rescan_every=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_rescan_every = disk_rescan_every
+        self._configured = False
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = None
+        # Disk entries as of the last scan plus this worker's stores since; None until scanned
+        self._disk_count = None
+        self._stores_since_scan = 0
+        self._pruning = False
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'expired': 0,
+            'invalidations': 0,
+        }
+
+    def _configure(self):
+        """
+        Resolve settings from the environment (read after load_dotenv ran)
+        """
+        if self._configured:
+            return
+        if self.max_entries is None:
+            self.max_entries = int(os.getenv('MENU_CACHE_MAX_ENTRIES', 128))
+        if self.ttl is None:
+            self.ttl = float(os.getenv('MENU_CACHE_TTL', 6 * 60 * 60))
+        if self.cache_dir is None:
+            self.cache_dir = os.getenv('MENU_CACHE_DIR') or None
+        if self.disk_max_entries is None:
+            self.disk_max_entries = int(os.getenv('MENU_CACHE_DISK_MAX_ENTRIES', 1024))
+        if self.disk_rescan_every is None:
+            self.disk_rescan_every = int(os.getenv('MENU_CACHE_DISK_RESCAN_EVERY', 64))
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._configured = True
+
+    @staticmethod
+    def make_key(start_date, end_date, n_dishes, consumption_rows, holiday_file, extra=None):
+        """
+        Build the cache key for a menu request
+
+        :param start_date: Start date as string (dd/mm/yyyy)
+        :param end_date: End date as string (dd/mm/yyyy)
+        :param n_dishes: Number of dishes per meal
+        :param consumption_rows: Ranked consumption rows the menu is generated from
+        :param holiday_file: Path to the holiday CSV file (its mtime is part of the key)
+        :param extra: Any other JSON-serializable input the menu depends on
+        :return: Hex digest
+        """
+        try:
+            holiday_mtime = os.path.getmtime(holiday_file)
+        except OSError:
+            holiday_mtime = None
+
+        rows_digest = hashlib.sha256(
+            json.dumps(consumption_rows, default=str, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+        material = [start_date, end_date, n_dishes, rows_digest, holiday_mtime]
+        if extra is not None:
+            material.append(extra)
+        material = json.dumps(material)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _stale(self, stored_at, now, generation):
+        """
+        Whether a disk entry written at stored_at has expired or predates the invalidation at generation
+        """
+        if now - stored_at > self.ttl:
+            return True
+        return generation is not None and stored_at < generation
+
+    def _sync_generation(self):
+        """
+        Drop the memory tier if another worker invalidated the shared cache
+        """
+        if not self.cache_dir:
+            return
+        try:
+            generation = os.path.getmtime(os.path.join(self.cache_dir, GENERATION_FILE))
+        except OSError:
+            generation = None
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key):
+        """
+        Cached menu JSON for key, or None
+        """
+        self._configure()
+        now = time.time()
+        with self._lock:
+            self._sync_generation()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, menu_json = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return menu_json
+                del self._entries[key]
+                self.counters['expired'] += 1
+
+            if self.cache_dir:
+                path = self._path(key)
+                try:
+                    stored_at = os.path.getmtime(path)
+                    if not self._stale(stored_at, now, self._generation):
+                        with open(path, 'r', encoding='utf-8') as f:
+                            menu_json = f.read()
+                        self._remember(key, stored_at, menu_json)
+                        self.counters['disk_hits'] += 1
+                        return menu_json
+                    os.remove(path)
+                    self.counters['expired'] += 1
+                except OSError:
+                    pass
+
+            self.counters['misses'] += 1
+            return None
+
+    def _remember(self, key, stored_at, menu_json):
+        self._entries[key] = (stored_at, menu_json)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def set(self, key, menu_json):
+        """
+        Store menu JSON under key in both tiers
+        """
+        self._configure()
+        now = time.time()
+        with self._lock:
+            self._sync_generation()
+            self._remember(key, now, menu_json)
+            self.counters['stores'] += 1
+            prune = False
+            if self.cache_dir:
+                # Overwriting an existing key counts too; the next scan corrects it
+                if self._disk_count is not None:
+                    self._disk_count += 1
+                self._stores_since_scan += 1
+                prune = not self._pruning and (
+                    self._disk_count is None
+                    or self._disk_count > self.disk_max_entries
+                    or self._stores_since_scan >= self.disk_rescan_every
+                )
+                if prune:
+                    self._pruning = True
+                    self._stores_since_scan = 0
+
+        if self.cache_dir:
+            # Write to a temp file first so other workers never read a partial entry
+            tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(menu_json)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.warning(f"Could not write menu cache entry: {e}")
+            if prune:
+                try:
+                    self._prune_disk(now)
+                finally:
+                    with self._lock:
+                        self._pruning = False
+
+    def _prune_disk(self, now):
+        """
+        Delete stale disk entries, then the oldest down to 90% of disk_max_entries
+        if more than disk_max_entries are left
+
+        The directory is listed and stat'ed without holding the lock, so
+        lookups in this worker are not held up by the scan.
+        """
+        with self._lock:
+            self._sync_generation()
+            generation = self._generation
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        entries = []
+        expired = 0
+        for name in names:
+            is_entry = name.endswith('.json')
+            # Temp files outlive a write only when the writer died mid-write
+            if not is_entry and not name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stored_at = os.path.getmtime(path)
+                if is_entry and not self._stale(stored_at, now, generation):
+                    entries.append((stored_at, path))
+                    continue
+                if not is_entry and now - stored_at <= self.ttl:
+                    continue
+                os.remove(path)
+                if is_entry:
+                    expired += 1
+            except OSError:
+                # Another worker pruned it first
+                pass
+        entries.sort()
+        evicted = 0
+        if len(entries) > self.disk_max_entries:
+            keep = self.disk_max_entries - self.disk_max_entries // 10
+            for _, path in entries[:len(entries) - keep]:
+                try:
+                    os.remove(path)
+                    evicted += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self.counters['expired'] += expired
+            self.counters['disk_evictions'] += evicted
+            self._disk_count = len(entries) - evicted
+
+    def invalidate(self):
+        """
+        Drop every cached menu in this worker and in the shared directory
+        """
+        self._configure()
+        with self._lock:
+            self._entries.clear()
+            self.counters['invalidations'] += 1
+            if not self.cache_dir:
+                return
+            self._disk_count = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+            # Bump the generation marker so other workers clear their memory tier
+            with open(os.path.join(self.cache_dir, GENERATION_FILE), 'w') as f:
+                f.write(str(time.time()))
+            self._generation = os.path.getmtime(os.path.join(self.cache_dir, GENERATION_FILE))
+
+    def stats(self):
+        """
+        Hit/miss counters and tier sizes for this worker
+        """
+        self._configure()
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._entries)
+        if self.cache_dir:
+            try:
+                stats['disk_entries'] = sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+            except OSError:
+                stats['disk_entries'] = 0
+        return stats
+
+
+menu_cache = MenuCache()
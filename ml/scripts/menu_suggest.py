@@ -1,7 +1,13 @@
+import os
+import json
+import numpy as np
 import pandas as pd
 import random
+from collections import namedtuple
 from datetime import datetime
 
+from holiday_calendar import HolidayCalendar
+
 def are_dishes_similar(dish1, dish2):
     """
     Check if two dishes have similar base ingredients
@@ -65,15 +71,109 @@ def select_dishes_for_meal(meal_data, meal_type, n_dishes=3):
     
     return selected_dishes
 
-def generate_menu_for_date_range(start_date, end_date, meal_data, holiday_data, n_dishes=3):
+MEAL_TYPES = ('Breakfast', 'Lunch', 'Dinner')
+
+# Define default dishes for each meal type if no data is available
+# TODO: Load this from a configuration file or database
+DEFAULT_DISHES = {
+    'Breakfast': [
+        {'Dish Name': 'Idli', 'Category': 'South Indian', 'Quantity (kg)': 50},
+        {'Dish Name': 'Dosa', 'Category': 'South Indian', 'Quantity (kg)': 45},
+        {'Dish Name': 'Upma', 'Category': 'South Indian', 'Quantity (kg)': 40},
+        {'Dish Name': 'Poha', 'Category': 'North Indian', 'Quantity (kg)': 35},
+        {'Dish Name': 'Paratha', 'Category': 'North Indian', 'Quantity (kg)': 30},
+    ],
+    'Lunch': [
+        {'Dish Name': 'Roti', 'Category': 'Indian Bread', 'Quantity (kg)': 100},
+        {'Dish Name': 'Rice', 'Category': 'Staple', 'Quantity (kg)': 90},
+        {'Dish Name': 'Dal', 'Category': 'Lentils', 'Quantity (kg)': 60},
+        {'Dish Name': 'Chicken Curry', 'Category': 'Non-Veg', 'Quantity (kg)': 50},
+        {'Dish Name': 'Vegetable Sabzi', 'Category': 'Vegetarian', 'Quantity (kg)': 45},
+    ],
+    'Dinner': [
+        {'Dish Name': 'Roti', 'Category': 'Indian Bread', 'Quantity (kg)': 80},
+        {'Dish Name': 'Rice', 'Category': 'Staple', 'Quantity (kg)': 70},
+        {'Dish Name': 'Vegetable Pulao', 'Category': 'Rice Dish', 'Quantity (kg)': 50},
+        {'Dish Name': 'Paneer Curry', 'Category': 'Vegetarian', 'Quantity (kg)': 40},
+        {'Dish Name': 'Fruit Salad', 'Category': 'Dessert', 'Quantity (kg)': 30},
+    ]
+}
+
+def add_default_dishes(meal_df):
+    """
+    Fill meal types without any consumption data with DEFAULT_DISHES
+    """
+    for meal_type, dishes in DEFAULT_DISHES.items():
+        if meal_df[meal_df['Meal'] == meal_type].empty:
+            # Add default dishes if no data exists
+            default_df = pd.DataFrame([
+                {
+                    'Meal': meal_type, 
+                    'Dish Name': dish['Dish Name'], 
+                    'Quantity (kg)': dish['Quantity (kg)'], 
+                    'Category': dish['Category']
+                } for dish in dishes
+            ])
+            meal_df = pd.concat([meal_df, default_df], ignore_index=True)
+    return meal_df
+
+
+MenuSelection = namedtuple('MenuSelection', ['meal_type', 'dish_name', 'base_quantity'])
+
+def build_meal_selection_table(meal_data, n_dishes=3):
+    """
+    Select dishes and their base quantities for every meal type once
+    
+    The selection only depends on the meal DataFrame, so it is computed a
+    single time per request and reused for every day of the range.
+    
+    :param meal_data: Meal DataFrame from prepare_meal_dataframe
+    :param n_dishes: Number of dishes per meal
+    :return: Tuple of MenuSelection in meal order
+    """
+    selections = []
+    for meal_type in MEAL_TYPES:
+        meal_subset = meal_data[meal_data['Meal'] == meal_type]
+        for dish in select_dishes_for_meal(meal_subset, meal_type, n_dishes):
+            # Get base quantity (could be based on historical consumption)
+            base_quantity = meal_subset[meal_subset['Dish Name'] == dish]['Quantity (kg)'].mean()
+            selections.append(MenuSelection(meal_type, dish, base_quantity))
+    return tuple(selections)
+
+def predict_selection_quantities(dates, selection_table, quantity_predictor):
+    """
+    Predicted quantity of every selection on every date, in one batch
+    
+    :param dates: DatetimeIndex of menu days
+    :param selection_table: Tuple of MenuSelection
+    :param quantity_predictor: Callable taking a (dish, meal, date) DataFrame
+                               and returning one quantity per row, e.g.
+                               random_forest.make_quantity_predictor(...); the
+                               model scores each day as if it were part of a
+                               training-length report period
+    :return: Array of shape (len(dates), len(selection_table)), date-major
+    """
+    n_dates, n_selections = len(dates), len(selection_table)
+    if n_dates == 0 or n_selections == 0:
+        return np.empty((n_dates, n_selections))
+    batch = pd.DataFrame({
+        'dish': np.tile([selection.dish_name for selection in selection_table], n_dates),
+        'meal': np.tile([selection.meal_type for selection in selection_table], n_dates),
+        'date': np.repeat(dates.to_numpy(), n_selections)
+    })
+    return np.asarray(quantity_predictor(batch), dtype=float).reshape(n_dates, n_selections)
+
+def generate_menu_for_date_range(start_date, end_date, meal_data, holiday_data, n_dishes=3, quantity_predictor=None):
     """
     Generate a comprehensive menu for a given date range
     
     :param start_date: Start date as string (dd/mm/yyyy)
     :param end_date: End date as string (dd/mm/yyyy)
     :param meal_data: Dictionary of meal data
-    :param holiday_data: DataFrame of holiday information
+    :param holiday_data: DataFrame of holiday information or a HolidayCalendar
     :param n_dishes: Number of dishes per meal
+    :param quantity_predictor: Optional batch predictor (see predict_selection_quantities);
+                               replaces base quantity x holiday factor when given
     :return: List of menu suggestions
     """
     # Prepare meal DataFrame
@@ -83,90 +183,142 @@ def generate_menu_for_date_range(start_date, end_date, meal_data, holiday_data,
     start = datetime.strptime(start_date, '%d/%m/%Y')
     end = datetime.strptime(end_date, '%d/%m/%Y')
     
-    # Define default dishes for each meal type if no data is available
-    # TODO: Load this from a configuration file or database
-    default_dishes = {
-        'Breakfast': [
-            {'Dish Name': 'Idli', 'Category': 'South Indian', 'Quantity (kg)': 50},
-            {'Dish Name': 'Dosa', 'Category': 'South Indian', 'Quantity (kg)': 45},
-            {'Dish Name': 'Upma', 'Category': 'South Indian', 'Quantity (kg)': 40},
-            {'Dish Name': 'Poha', 'Category': 'North Indian', 'Quantity (kg)': 35},
-            {'Dish Name': 'Paratha', 'Category': 'North Indian', 'Quantity (kg)': 30},
-        ],
-        'Lunch': [
-            {'Dish Name': 'Roti', 'Category': 'Indian Bread', 'Quantity (kg)': 100},
-            {'Dish Name': 'Rice', 'Category': 'Staple', 'Quantity (kg)': 90},
-            {'Dish Name': 'Dal', 'Category': 'Lentils', 'Quantity (kg)': 60},
-            {'Dish Name': 'Chicken Curry', 'Category': 'Non-Veg', 'Quantity (kg)': 50},
-            {'Dish Name': 'Vegetable Sabzi', 'Category': 'Vegetarian', 'Quantity (kg)': 45},
-        ],
-        'Dinner': [
-            {'Dish Name': 'Roti', 'Category': 'Indian Bread', 'Quantity (kg)': 80},
-            {'Dish Name': 'Rice', 'Category': 'Staple', 'Quantity (kg)': 70},
-            {'Dish Name': 'Vegetable Pulao', 'Category': 'Rice Dish', 'Quantity (kg)': 50},
-            {'Dish Name': 'Paneer Curry', 'Category': 'Vegetarian', 'Quantity (kg)': 40},
-            {'Dish Name': 'Fruit Salad', 'Category': 'Dessert', 'Quantity (kg)': 30},
-        ]
-    }
-
     # Enhance meal DataFrame with default dishes if needed
-    for meal_type, dishes in default_dishes.items():
-        if meal_df[meal_df['Meal'] == meal_type].empty:
-            # Add default dishes if no data exists
-            default_df = pd.DataFrame([
-                {
-                    'Meal': meal_type, 
-                    'Dish Name': dish['Dish Name'], 
-                    'Quantity (kg)': dish['Quantity (kg)'], 
-                    'Category': dish['Category']
-                } for dish in dishes
-            ])
-            meal_df = pd.concat([meal_df, default_df], ignore_index=True)
+    meal_df = add_default_dishes(meal_df)
     
+    # Resolve holidays and their adjustment factors for the whole range at once
+    calendar = HolidayCalendar.coerce(holiday_data)
+    dates = pd.date_range(start, end, freq='D')
+    holiday_flags = calendar.is_holiday(dates)
+    adjustment_factors = calendar.adjustment_factors(dates)
+
+    # Dish selection does not change between days, so build it once
+    selection_table = build_meal_selection_table(meal_df, n_dishes)
+
+    # Model quantities for every (date, dish) come from a single predictor call
+    predicted = None
+    if quantity_predictor is not None:
+        predicted = predict_selection_quantities(dates, selection_table, quantity_predictor)
+
     # Generate menu for the entire date range
     complete_menu = []
     
-    current_date = start
-    while current_date <= end:
-        # Check if it's a holiday
-        is_holiday_period = any(
-            row['Start Date'] <= current_date <= row['End Date'] 
-            for _, row in holiday_data.iterrows()
-        )
+    for date_idx, (current_date, is_holiday_period, adjustment_factor) in enumerate(zip(dates, holiday_flags, adjustment_factors)):
+        is_holiday_period = bool(is_holiday_period)
+        adjustment_factor = float(adjustment_factor)
+        date_str = current_date.strftime('%d/%m/%Y')
         
-        # Adjustment factor for holidays
-        adjustment_factor = 0.7 if is_holiday_period else 1.0
-        
-        # Generate menu for each meal type
-        daily_menu = []
-        for meal_type in ['Breakfast', 'Lunch', 'Dinner']:
-            # Select dishes for the meal
-            selected_dishes = select_dishes_for_meal(meal_df, meal_type, n_dishes)
-            
-            # Generate menu items for selected dishes
-            for dish in selected_dishes:
-                # Get base quantity (could be based on historical consumption)
-                base_quantity = meal_df[(meal_df['Meal'] == meal_type) & (meal_df['Dish Name'] == dish)]['Quantity (kg)'].mean()
-                
+        for selection_idx, selection in enumerate(selection_table):
+            if predicted is not None:
+                quantity = float(predicted[date_idx, selection_idx])
+            else:
                 # Adjust quantity based on holiday
-                quantity = base_quantity * adjustment_factor
-                
-                daily_menu.append({
-                    'date': current_date.strftime('%d/%m/%Y'),
-                    'meal_type': meal_type,
-                    'dish_name': dish,
-                    'planned_quantity': round(max(0.5, quantity), 2),
-                    'is_holiday': is_holiday_period
-                })
-        
-        complete_menu.extend(daily_menu)
-        
-        # Move to next date
-        current_date = current_date + pd.Timedelta(days=1)
+                quantity = selection.base_quantity * adjustment_factor
+            
+            complete_menu.append({
+                'date': date_str,
+                'meal_type': selection.meal_type,
+                'dish_name': selection.dish_name,
+                'planned_quantity': round(max(0.5, quantity), 2),
+                'is_holiday': is_holiday_period
+            })
     
     return complete_menu
 
 
+MENU_COLUMNS = ['date', 'meal_type', 'dish_name', 'planned_quantity', 'is_holiday']
+
+def generate_menu_frame(start_date, end_date, meal_data, holiday_data, n_dishes=3, quantity_predictor=None):
+    """
+    Columnar variant of generate_menu_for_date_range
+    
+    The menu is the cross join of every date with the meal selection table,
+    built with array operations instead of one dict per item. Row order and
+    values match the list-of-dicts engine exactly.
+    
+    :param start_date: Start date as string (dd/mm/yyyy)
+    :param end_date: End date as string (dd/mm/yyyy)
+    :param meal_data: Dictionary of meal data
+    :param holiday_data: DataFrame of holiday information or a HolidayCalendar
+    :param n_dishes: Number of dishes per meal
+    :param quantity_predictor: Optional batch predictor, as for generate_menu_for_date_range
+    :return: DataFrame with MENU_COLUMNS
+    """
+    meal_df = add_default_dishes(prepare_meal_dataframe(meal_data))
+
+    start = datetime.strptime(start_date, '%d/%m/%Y')
+    end = datetime.strptime(end_date, '%d/%m/%Y')
+
+    calendar = HolidayCalendar.coerce(holiday_data)
+    dates = pd.date_range(start, end, freq='D')
+    holiday_flags = calendar.is_holiday(dates)
+    adjustment_factors = calendar.adjustment_factors(dates)
+
+    selection_table = build_meal_selection_table(meal_df, n_dishes)
+    n_dates, n_selections = len(dates), len(selection_table)
+    if n_dates == 0 or n_selections == 0:
+        return pd.DataFrame(columns=MENU_COLUMNS)
+
+    meal_types = np.array([selection.meal_type for selection in selection_table], dtype=object)
+    dish_names = np.array([selection.dish_name for selection in selection_table], dtype=object)
+    base_quantities = np.array([selection.base_quantity for selection in selection_table], dtype=float)
+
+    # Date-major cross join: every selection repeated for each day
+    date_idx = np.repeat(np.arange(n_dates), n_selections)
+    selection_idx = np.tile(np.arange(n_selections), n_dates)
+
+    if quantity_predictor is not None:
+        quantities = np.maximum(0.5, predict_selection_quantities(dates, selection_table, quantity_predictor).ravel())
+    else:
+        quantities = np.maximum(0.5, base_quantities[selection_idx] * adjustment_factors[date_idx])
+    # Only a handful of distinct values exist, so round them with Python's
+    # round() to stay identical to the list-of-dicts engine
+    unique_quantities, inverse = np.unique(quantities, return_inverse=True)
+    rounded = np.array([round(float(q), 2) for q in unique_quantities])[inverse]
+
+    return pd.DataFrame({
+        'date': dates.strftime('%d/%m/%Y').to_numpy(dtype=object)[date_idx],
+        'meal_type': meal_types[selection_idx],
+        'dish_name': dish_names[selection_idx],
+        'planned_quantity': rounded,
+        'is_holiday': holiday_flags[date_idx],
+    }, columns=MENU_COLUMNS)
+
+
+def menu_frame_to_json(menu_frame):
+    """
+    Serialize a menu frame to the same JSON text json.dumps gives for the list of dicts
+    
+    Each column is encoded once per distinct value and the row strings are
+    assembled with array concatenation.
+    
+    :param menu_frame: DataFrame from generate_menu_frame
+    :return: JSON string
+    """
+    if menu_frame.empty:
+        return '[]'
+
+    converters = {
+        'planned_quantity': float,
+        'is_holiday': bool,
+    }
+    rows = None
+    for position, column in enumerate(MENU_COLUMNS):
+        codes, uniques = pd.factorize(menu_frame[column])
+        convert = converters.get(column, str)
+        encoded = np.array([json.dumps(convert(value)) for value in uniques], dtype=object)[codes]
+        prefix = ('{' if position == 0 else ', ') + json.dumps(column) + ': '
+        rows = prefix + encoded if rows is None else rows + prefix + encoded
+    return '[' + ', '.join(rows + '}') + ']'
+
+
+def menu_frame_to_records(menu_frame):
+    """
+    Convert a menu frame back to the list-of-dicts format
+    """
+    return json.loads(menu_frame_to_json(menu_frame))
+
+
 def load_holiday_data(holiday_file):
     """
     Load holiday data from a CSV file
@@ -196,6 +348,29 @@ def load_holiday_data(holiday_file):
         return pd.DataFrame(columns=['Holiday', 'Start Date', 'End Date'])
 
 
+_holiday_calendars = {}
+
+def load_holiday_calendar(holiday_file):
+    """
+    Load holiday data as a HolidayCalendar, rebuilt only when the file changes
+    
+    :param holiday_file: Path to the holiday CSV file
+    :return: HolidayCalendar for the file's current contents
+    """
+    try:
+        mtime = os.path.getmtime(holiday_file)
+    except OSError:
+        mtime = None
+
+    cached = _holiday_calendars.get(holiday_file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    calendar = HolidayCalendar(load_holiday_data(holiday_file))
+    _holiday_calendars[holiday_file] = (mtime, calendar)
+    return calendar
+
+
 def save_menu_to_csv(menu_suggestions, start_date, end_date):
     """
     Save menu suggestions to CSV
@@ -0,0 +1,267 @@
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import ParameterSampler
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = [
+    'candidate', 'params', 'rounds', 'resource', 'mean_score', 'std_score',
+    'fits', 'cached_fits', 'fit_seconds'
+]
+
+
+class WeeklyTimeSeriesSplit:
+    """
+    Forward-chaining cross-validation over whole weeks
+
+    Each fold tests on a block of consecutive weeks and trains only on the
+    weeks before it, so no future week leaks into training. Rows of the same
+    week always stay on the same side of a split. Pass each row's week (any
+    sortable key, e.g. its start date) as groups.
+    """
+
+    def __init__(self, n_splits=4, test_weeks=None):
+        self.n_splits = n_splits
+        self.test_weeks = test_weeks
+
+    def __repr__(self):
+        return f'WeeklyTimeSeriesSplit(n_splits={self.n_splits}, test_weeks={self.test_weeks})'
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        return self.n_splits
+
+    def split(self, X, y=None, groups=None):
+        if groups is None:
+            raise ValueError("WeeklyTimeSeriesSplit needs the week of every row as groups")
+        weeks, week_codes = np.unique(np.asarray(groups), return_inverse=True)
+        test_weeks = self.test_weeks or len(weeks) // (self.n_splits + 1)
+        first_test_week = len(weeks) - self.n_splits * test_weeks
+        if test_weeks < 1 or first_test_week < 1:
+            raise ValueError(f"{len(weeks)} weeks are too few for {self.n_splits} weekly splits")
+
+        for fold in range(self.n_splits):
+            test_start = first_test_week + fold * test_weeks
+            train = np.flatnonzero(week_codes < test_start)
+            test = np.flatnonzero((week_codes >= test_start) & (week_codes < test_start + test_weeks))
+            yield train, test
+
+
+class FoldResultCache:
+    """
+    Append-only JSON-lines file of finished fold fits
+
+    Every fit is written as soon as it ends, so a search that is interrupted
+    (or runs out of budget) resumes from the fits already on disk. A torn last
+    line from a killed process is ignored.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._results = {}
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._results[record['key']] = record
+
+    def __len__(self):
+        return len(self._results)
+
+    @staticmethod
+    def key(data_key, params, fold):
+        material = json.dumps([data_key, params, fold], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        return self._results.get(key)
+
+    def put(self, key, record):
+        record = {'key': key, **record}
+        self._results[key] = record
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+        return record
+
+
+@dataclass
+class SearchResult:
+    """
+    Outcome of a budgeted search; report has one row per candidate (REPORT_COLUMNS)
+    """
+    best_params: dict
+    best_score: float
+    report: pd.DataFrame
+    fits: int
+    cached_fits: int
+    seconds: float
+    budget_exhausted: bool
+
+
+def data_fingerprint(X, y, groups, cv):
+    """
+    Hash of the search inputs; cached fits are only reused for identical data and folds
+    """
+    digest = hashlib.sha256(repr(cv).encode('utf-8'))
+    for part in (pd.DataFrame(np.asarray(X)), pd.Series(np.asarray(y)), pd.Series(np.asarray(groups))):
+        digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _resource_schedule(min_resources, max_resources, factor):
+    """
+    Resource per successive-halving round, ending exactly at max_resources
+    """
+    n_rounds = max(1, int(math.floor(math.log(max_resources / min_resources, factor))) + 1)
+    schedule = [int(min_resources * factor ** i) for i in range(n_rounds - 1)]
+    return schedule + [int(max_resources)]
+
+
+def budgeted_search(estimator, param_distributions, X, y, groups, cv=None, resource='n_estimators',
+                    min_resources=20, max_resources=None, factor=3, n_candidates=None,
+                    max_fits=None, max_seconds=None, cache_path=None, random_state=0):
+    """
+    Successive-halving random search with a fit and wall-clock budget
+
+    Candidates are sampled from param_distributions and scored with weekly
+    forward-chaining CV (negative MSE, higher is better). Each round fits the
+    surviving candidates with more of the resource (trees by default) and
+    keeps the best 1/factor of them. When the budget runs out, no new fits
+    start and the best candidate of the furthest round that any candidate
+    completed wins. Fits found in the cache cost nothing against the budget.
+
+    :param estimator: Unfitted regressor; cloned for every fit
+    :param param_distributions: Lists or scipy distributions per parameter
+    :param groups: Week of every row, for WeeklyTimeSeriesSplit
+    :param resource: Parameter raised round by round; dropped from param_distributions
+    :param max_resources: Resource of the last round (default: largest listed value, else 500)
+    :param n_candidates: Candidates sampled (default: enough for one to reach the last round)
+    :param max_fits: Most fold fits to run (cached fits excluded)
+    :param max_seconds: Wall-clock budget for fitting
+    :param cache_path: JSON-lines file of finished fits, for resuming
+    :return: SearchResult
+    """
+    started = time.perf_counter()
+    cv = cv or WeeklyTimeSeriesSplit()
+    X = np.asarray(X)
+    y = np.asarray(y)
+    folds = list(cv.split(X, y, groups))
+
+    distributions = dict(param_distributions)
+    listed_resources = distributions.pop(resource, None)
+    if max_resources is None:
+        max_resources = max(listed_resources) if isinstance(listed_resources, (list, tuple)) else 500
+    schedule = _resource_schedule(min_resources, max_resources, factor)
+    if n_candidates is None:
+        n_candidates = factor ** (len(schedule) - 1)
+    candidates = list(ParameterSampler(distributions, n_candidates, random_state=random_state))
+
+    cache = FoldResultCache(cache_path)
+    data_key = data_fingerprint(X, y, groups, cv)
+    stats = [{'rounds': 0, 'resource': None, 'scores': None, 'fits': 0, 'cached_fits': 0, 'fit_seconds': 0.0}
+             for _ in candidates]
+    fits = cached_fits = 0
+    budget_exhausted = False
+
+    def over_budget():
+        return ((max_fits is not None and fits >= max_fits)
+                or (max_seconds is not None and time.perf_counter() - started >= max_seconds))
+
+    alive = list(range(len(candidates)))
+    for round_index, round_resource in enumerate(schedule):
+        round_scores = {}
+        for candidate in alive:
+            params = {**candidates[candidate], resource: round_resource}
+            scores = []
+            for fold, (train, test) in enumerate(folds):
+                key = FoldResultCache.key(data_key, params, fold)
+                record = cache.get(key)
+                if record is not None:
+                    stats[candidate]['cached_fits'] += 1
+                    cached_fits += 1
+                else:
+                    if over_budget():
+                        budget_exhausted = True
+                        break
+                    fit_started = time.perf_counter()
+                    model = clone(estimator).set_params(**params)
+                    model.fit(X[train], y[train])
+                    score = -mean_squared_error(y[test], model.predict(X[test]))
+                    record = cache.put(key, {
+                        'params': params, 'fold': fold, 'score': float(score),
+                        'seconds': time.perf_counter() - fit_started
+                    })
+                    stats[candidate]['fits'] += 1
+                    stats[candidate]['fit_seconds'] += record['seconds']
+                    fits += 1
+                scores.append(record['score'])
+            if budget_exhausted:
+                break
+            stats[candidate].update(rounds=round_index + 1, resource=round_resource, scores=scores)
+            round_scores[candidate] = float(np.mean(scores))
+            logger.info(f"round {round_index + 1} candidate {candidate} {params}: {round_scores[candidate]:.3f}")
+
+        if round_scores:
+            ranked = sorted(round_scores, key=lambda candidate: -round_scores[candidate])
+            alive = ranked[:max(1, math.ceil(len(alive) / factor))]
+        if budget_exhausted or not round_scores:
+            break
+
+    rows = []
+    for candidate, params in enumerate(candidates):
+        candidate_stats = stats[candidate]
+        scores = candidate_stats['scores']
+        rows.append({
+            'candidate': candidate,
+            'params': json.dumps(params, sort_keys=True, default=str),
+            'rounds': candidate_stats['rounds'],
+            'resource': candidate_stats['resource'],
+            'mean_score': float(np.mean(scores)) if scores else np.nan,
+            'std_score': float(np.std(scores)) if scores else np.nan,
+            'fits': candidate_stats['fits'],
+            'cached_fits': candidate_stats['cached_fits'],
+            'fit_seconds': round(candidate_stats['fit_seconds'], 4),
+        })
+    report = pd.DataFrame(rows, columns=REPORT_COLUMNS).astype({'resource': 'Int64'})
+    report = report.sort_values(['rounds', 'mean_score'], ascending=False, kind='stable').reset_index(drop=True)
+
+    scored = report.dropna(subset=['mean_score'])
+    if scored.empty:
+        raise RuntimeError("The search budget ran out before any candidate finished its first round")
+    best = scored.iloc[0]
+    best_params = {**json.loads(best['params']), resource: int(best['resource'])}
+
+    return SearchResult(
+        best_params=best_params,
+        best_score=float(best['mean_score']),
+        report=report,
+        fits=fits,
+        cached_fits=cached_fits,
+        seconds=time.perf_counter() - started,
+        budget_exhausted=budget_exhausted
+    )
+
+
+def write_search_report(result, path):
+    """
+    Write the per-candidate report as CSV, atomically
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    result.report.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from report_dataset import MOST_EXPANDED_REPORT_FILE, LEAST_EXPANDED_REPORT_FILE
+
+logger = logging.getLogger(__name__)
+
+HOLIDAY_FILE = '../data/original_holidays.csv'
+
+MODEL_FILE = 'quantity_model.joblib'
+METADATA_FILE = 'quantity_model.json'
+SEARCH_CACHE_FILE = 'search_folds.jsonl'
+SEARCH_REPORT_FILE = 'search_report.csv'
+FEATURE_CACHE_DIR = 'features'
+
+# Bump whenever features or encoders change, so existing artifacts are retrained
+FEATURE_VERSION = 3
+
+
+def model_dir():
+    """
+    Directory holding the model artifact (QUANTITY_MODEL_DIR)
+    """
+    return os.getenv('QUANTITY_MODEL_DIR', '../models')
+
+
+@dataclass
+class QuantityModelArtifact:
+    """
+    Trained quantity model with everything needed to use and extend it
+    """
+    model: object
+    features: object
+    fingerprint: str
+    trained_weeks: list = field(default_factory=list)
+    trained_at: float = 0.0
+    feature_version: int = FEATURE_VERSION
+    metrics: dict = field(default_factory=dict)
+
+    def metadata(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'feature_version': self.feature_version,
+            'trained_at': self.trained_at,
+            'trained_weeks': len(self.trained_weeks),
+            'n_estimators': len(getattr(self.model, 'estimators_', [])),
+            'params': {key: value for key, value in self.model.get_params().items()
+                       if isinstance(value, (int, float, str, type(None)))},
+            'metrics': self.metrics,
+        }
+
+
+def load_training_data():
+    """
+    Expanded weekly reports and the training holiday calendar
+    """
+    from report_dataset import load_expanded_report
+    from random_forest import load_training_holidays
+
+    most_df = load_expanded_report(MOST_EXPANDED_REPORT_FILE)
+    least_df = load_expanded_report(LEAST_EXPANDED_REPORT_FILE)
+    return most_df, least_df, load_training_holidays(HOLIDAY_FILE)
+
+
+def training_fingerprint(most_df, least_df, holiday_calendar):
+    """
+    Content hash of everything the model is trained on
+
+    Row order and file timestamps do not matter; any change to a week's
+    dishes, quantities or the holiday calendar does.
+    """
+    digest = hashlib.sha256(f'features-v{FEATURE_VERSION}'.encode('utf-8'))
+    for df in (most_df, least_df):
+        rows = df[['start_date', 'end_date', 'Meal', 'Dish Name', 'Quantity (kg)']].astype(
+            {'Meal': str, 'Dish Name': str}
+        )
+        row_hashes = np.sort(pd.util.hash_pandas_object(rows, index=False).to_numpy())
+        digest.update(row_hashes.tobytes())
+    digest.update(holiday_calendar.covered_days().tobytes())
+    return digest.hexdigest()
+
+
+def week_keys(*frames):
+    """
+    Sorted ISO start dates of the weeks present in the frames
+    """
+    weeks = set()
+    for df in frames:
+        weeks.update(df['start_date'].dt.strftime('%Y-%m-%d').unique())
+    return sorted(weeks)
+
+
+def read_metadata(directory=None):
+    """
+    Metadata of the saved artifact, or None; cheap, does not load the model
+    """
+    try:
+        with open(os.path.join(directory or model_dir(), METADATA_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_artifact(artifact, directory=None):
+    """
+    Persist the artifact uncompressed (so it can be memory-mapped) plus its metadata
+    """
+    import joblib
+
+    directory = directory or model_dir()
+    os.makedirs(directory, exist_ok=True)
+    model_path = os.path.join(directory, MODEL_FILE)
+    tmp_path = f'{model_path}.{os.getpid()}.tmp'
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, model_path)
+
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    with open(f'{metadata_path}.{os.getpid()}.tmp', 'w') as f:
+        json.dump(artifact.metadata(), f, indent=2)
+    os.replace(f'{metadata_path}.{os.getpid()}.tmp', metadata_path)
+    logger.info(f"Saved quantity model to {model_path}")
+    return model_path
+
+
+def load_artifact(directory=None, mmap_mode='r'):
+    """
+    Load the saved artifact; large arrays are memory-mapped when mmap_mode is set
+    """
+    import joblib
+    return joblib.load(os.path.join(directory or model_dir(), MODEL_FILE), mmap_mode=mmap_mode)
+
+
+def ensure_model(force=False, warm_start=False, extra_trees=50, search=False, search_options=None, directory=None):
+    """
+    Train the quantity model only if its training data changed
+
+    :param force: Retrain even when the fingerprint matches
+    :param warm_start: Grow extra trees on weeks the saved model has not seen
+                       instead of training from scratch
+    :param extra_trees: Trees added per warm start
+    :param search: Run the hyperparameter search on full retrains
+    :param search_options: Budget and schedule for model_search.budgeted_search;
+                           fold results are cached in the model directory so an
+                           interrupted search resumes, and a per-candidate
+                           report is written next to the model
+    :return: (artifact, action) with action one of 'unchanged', 'warm_start', 'trained'
+    """
+    from feature_pipeline import FeatureMatrixCache
+    from random_forest import train_random_forest_model, warm_start_random_forest_model
+
+    most_df, least_df, holiday_calendar = load_training_data()
+    fingerprint = training_fingerprint(most_df, least_df, holiday_calendar)
+
+    metadata = read_metadata(directory)
+    if not force and metadata and metadata.get('fingerprint') == fingerprint:
+        logger.info("Training data unchanged; keeping the saved quantity model")
+        return None, 'unchanged'
+
+    if warm_start and metadata and metadata.get('feature_version') == FEATURE_VERSION:
+        artifact = load_artifact(directory, mmap_mode=None)
+        known_weeks = set(artifact.trained_weeks)
+        if set(week_keys(most_df, least_df)) - known_weeks:
+            started = time.perf_counter()
+            warm_start_random_forest_model(
+                artifact.model, artifact.features, most_df, least_df, holiday_calendar, extra_trees, known_weeks
+            )
+            artifact.fingerprint = fingerprint
+            artifact.trained_weeks = week_keys(most_df, least_df)
+            artifact.trained_at = time.time()
+            artifact.metrics['warm_start_seconds'] = round(time.perf_counter() - started, 3)
+            save_artifact(artifact, directory)
+            return artifact, 'warm_start'
+        logger.info("No new weeks to warm start on; retraining from scratch")
+
+    directory = directory or model_dir()
+    feature_cache = FeatureMatrixCache(os.path.join(directory, FEATURE_CACHE_DIR))
+    if search:
+        search_options = {'cache_path': os.path.join(directory, SEARCH_CACHE_FILE), **(search_options or {})}
+
+    started = time.perf_counter()
+    model, features, mse, search_result = train_random_forest_model(
+        most_df, least_df, holiday_calendar, search=search, search_options=search_options,
+        feature_cache=feature_cache, data_version=fingerprint
+    )
+    metrics = {'test_mse': float(mse), 'train_seconds': round(time.perf_counter() - started, 3)}
+    if search_result is not None:
+        from model_search import write_search_report
+        report_path = write_search_report(search_result, os.path.join(directory, SEARCH_REPORT_FILE))
+        logger.info(f"Search report written to {report_path}")
+        metrics['search'] = {
+            'best_cv_mse': -search_result.best_score,
+            'fits': search_result.fits,
+            'cached_fits': search_result.cached_fits,
+            'seconds': round(search_result.seconds, 3),
+            'budget_exhausted': search_result.budget_exhausted,
+        }
+
+    artifact = QuantityModelArtifact(
+        model=model,
+        features=features,
+        fingerprint=fingerprint,
+        trained_weeks=week_keys(most_df, least_df),
+        trained_at=time.time(),
+        metrics=metrics
+    )
+    save_artifact(artifact, directory)
+    return artifact, 'trained'
+
+
+class QuantityModelStore:
+    """
+    Per-process handle on the saved quantity model
+
+    Nothing is loaded at import; the artifact is read on first use and
+    re-read when the file on disk is replaced by a newer training run.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._artifact = None
+        self._mtime = None
+
+    def _path(self):
+        return os.path.join(self.directory or model_dir(), MODEL_FILE)
+
+    def get(self):
+        """
+        The current artifact, or None if no model has been trained yet (or only
+        one built for an older FEATURE_VERSION)
+        """
+        try:
+            mtime = os.path.getmtime(self._path())
+        except OSError:
+            return None
+        if self._mtime != mtime:
+            with self._lock:
+                if self._mtime != mtime:
+                    started = time.perf_counter()
+                    artifact = load_artifact(self.directory)
+                    if getattr(artifact, 'feature_version', None) != FEATURE_VERSION:
+                        logger.warning(f"Quantity model at {self._path()} predates feature version "
+                                       f"{FEATURE_VERSION}; retrain it with `python quantity_model.py train`")
+                        artifact = None
+                    self._artifact = artifact
+                    self._mtime = mtime
+                    logger.info(f"Loaded quantity model in {time.perf_counter() - started:.3f}s")
+        return self._artifact
+
+    def require(self):
+        artifact = self.get()
+        if artifact is None:
+            raise RuntimeError(
+                f"No quantity model at {self._path()}; train one with `python quantity_model.py train`"
+            )
+        return artifact
+
+
+quantity_model_store = QuantityModelStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and inspect the quantity prediction model")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help="train if the training data changed")
+    train_parser.add_argument('--force', action='store_true', help="retrain even if the data is unchanged")
+    train_parser.add_argument('--warm-start', action='store_true', help="add trees for new weeks instead of retraining")
+    train_parser.add_argument('--extra-trees', type=int, default=50, help="trees added per warm start")
+    train_parser.add_argument('--search', action='store_true', help="run the hyperparameter search")
+    train_parser.add_argument('--search-fits', type=int, help="most fold fits the search may run")
+    train_parser.add_argument('--search-seconds', type=float, help="wall-clock budget of the search")
+    train_parser.add_argument('--search-candidates', type=int, help="parameter sets sampled by the search")
+
+    subparsers.add_parser('status', help="show the saved model and whether it is current")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'train':
+        artifact, action = ensure_model(
+            force=args.force,
+            warm_start=args.warm_start,
+            extra_trees=args.extra_trees,
+            search=args.search,
+            search_options={
+                'max_fits': args.search_fits,
+                'max_seconds': args.search_seconds,
+                'n_candidates': args.search_candidates,
+            }
+        )
+        print(f"{action}: {json.dumps(artifact.metadata() if artifact else read_metadata(), indent=2)}")
+    else:
+        metadata = read_metadata()
+        if metadata is None:
+            print("No quantity model has been trained")
+            return
+        current = training_fingerprint(*load_training_data())
+        print(json.dumps(metadata, indent=2))
+        print("up to date" if metadata['fingerprint'] == current else "training data changed; run `train`")
+
+
+if __name__ == "__main__":
+    # Run from the importable module so pickled artifacts reference
+    # quantity_model.QuantityModelArtifact rather than __main__
+    import quantity_model
+    quantity_model.main()
@@ -1,95 +1,240 @@
-def train_random_forest_model(most_df, least_df, holiday_data):
+import functools
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+
+from feature_pipeline import FeaturePipeline, training_matrix
+from holiday_calendar import HolidayCalendar
+from model_search import budgeted_search
+from report_dataset import add_parsed_dates
+
+# Used when training without a hyperparameter search
+DEFAULT_PARAMS = {
+    'n_estimators': 200,
+    'max_depth': None,
+    'min_samples_split': 2,
+    'min_samples_leaf': 1,
+    'max_features': 1.0
+}
+
+# Search space of the budgeted search ('auto' was removed from
+# RandomForestRegressor; 1.0 is what it meant for regressors)
+PARAM_GRID = {
+    'n_estimators': [100, 200, 500],
+    'max_depth': [None, 10, 20, 30],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': [1.0, 'sqrt', 'log2']
+}
+
+
+def is_holiday(date, holiday_data):
+    """
+    Check whether a date (or each date of an array) falls inside a holiday
+    """
+    calendar = HolidayCalendar.coerce(holiday_data)
+    if np.ndim(date) == 0:
+        return calendar.contains(date)
+    return calendar.is_holiday(date)
+
+
+def load_training_holidays(holiday_file):
+    """
+    Holiday calendar used for training: only breaks of at least a week
+    """
+    holiday_data = pd.read_csv(holiday_file)
+    holiday_data['Start Date'] = pd.to_datetime(holiday_data['Start Date'], format='%d/%m/%Y')
+    holiday_data['End Date'] = pd.to_datetime(holiday_data['End Date'], format='%d/%m/%Y')
+    holiday_data['Duration'] = (holiday_data['End Date'] - holiday_data['Start Date']).dt.days
+    holiday_data = holiday_data[holiday_data['Duration'] >= 7]
+    return HolidayCalendar(holiday_data)
+
+
+def build_training_frame(most_df, least_df, holiday_data):
+    """
+    Combined expanded rows with the model's raw features and target
+    """
     combined_df = pd.concat([most_df, least_df], ignore_index=True)
     # Feature Engineering
-    combined_df[['Start Date', 'End Date']] = combined_df['Date Range'].str.split('-', expand=True)
-    combined_df['Start Date'] = pd.to_datetime(combined_df['Start Date'], format='%d/%m/%Y')
-    combined_df['End Date'] = pd.to_datetime(combined_df['End Date'], format='%d/%m/%Y')
+    if not pd.api.types.is_datetime64_any_dtype(combined_df.get('start_date')):
+        add_parsed_dates(combined_df)
+    combined_df['Start Date'] = combined_df['start_date']
+    combined_df['End Date'] = combined_df['end_date']
     combined_df['Duration'] = (combined_df['End Date'] - combined_df['Start Date']).dt.days + 1
     combined_df['Daily Quantity'] = combined_df['Quantity (kg)'] / combined_df['Duration']
     # Check if the date range overlaps with any holiday period
-    combined_df['Holiday'] = combined_df.apply(lambda row: is_holiday(row['Start Date'], holiday_data), axis=1)
-    # Encode categorical features
-    label_encoder = LabelEncoder()
-    combined_df['Dish Code'] = label_encoder.fit_transform(combined_df['Dish Name'])
-    combined_df['Meal Code'] = label_encoder.fit_transform(combined_df['Meal'])
-    # Prepare features and target
-    X = combined_df[['Dish Code', 'Meal Code', 'Duration', 'Holiday']]
-    y = combined_df['Daily Quantity']
+    combined_df['Holiday'] = HolidayCalendar.coerce(holiday_data).is_holiday(combined_df['Start Date']).astype(int)
+    return combined_df
+
+
+def train_random_forest_model(most_df, least_df, holiday_data, search=True, params=None, search_options=None,
+                              feature_cache=None, data_version=None):
+    """
+    Train the quantity model
+
+    :param search: Pick hyperparameters with the budgeted search over PARAM_GRID
+    :param params: RandomForestRegressor parameters to use when not searching
+    :param search_options: Keyword arguments for model_search.budgeted_search
+                           (max_fits, max_seconds, cache_path, ...)
+    :param feature_cache: FeatureMatrixCache to reuse the feature matrix from
+    :param data_version: Key of the training data in feature_cache
+    :return: (model, FeaturePipeline, test MSE, SearchResult or None)
+    """
+    combined_df = build_training_frame(most_df, least_df, holiday_data)
+    # Fit encoders, lag table and calendar features, then build (or reuse) the matrix
+    features = FeaturePipeline(holiday_data).fit(combined_df)
+    X, y = training_matrix(combined_df, features, feature_cache, data_version)
     # Split data into training and testing sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    param_grid = {
-    'n_estimators': [100, 200, 500],
-    'max_depth': [None, 10, 20, 30],
-    'min_samples_split': [2, 5, 10],
-    'min_samples_leaf': [1, 2, 4],
-    'max_features': ['auto', 'sqrt', 'log2']
-    }
-    grid_search = GridSearchCV(estimator=RandomForestRegressor(), param_grid=param_grid, cv=5, scoring='neg_mean_squared_error', verbose=2, n_jobs=-1)
-    grid_search.fit(X_train, y_train)
-    print("Best parameters:", grid_search.best_params_)
-    best_rf_model = RandomForestRegressor(
-    n_estimators=grid_search.best_params_['n_estimators'],
-    max_depth=grid_search.best_params_['max_depth'],
-    min_samples_split=grid_search.best_params_['min_samples_split'],
-    min_samples_leaf=grid_search.best_params_['min_samples_leaf'],
-    max_features=grid_search.best_params_['max_features'],
-    random_state=42
-    )
+    train_rows, test_rows = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = X[train_rows], X[test_rows], y[train_rows], y[test_rows]
+
+    search_result = None
+    if search:
+        # Successive halving over weekly forward-chaining folds of the training rows
+        search_result = budgeted_search(
+            RandomForestRegressor(random_state=42, n_jobs=-1), PARAM_GRID, X_train, y_train,
+            groups=combined_df['Start Date'].to_numpy()[train_rows], **(search_options or {})
+        )
+        print("Best parameters:", search_result.best_params)
+        params = search_result.best_params
+
+    best_rf_model = RandomForestRegressor(**{**DEFAULT_PARAMS, **(params or {})}, random_state=42)
     best_rf_model.fit(X_train, y_train)
     # Evaluate the model
     y_pred = best_rf_model.predict(X_test)
     mse = mean_squared_error(y_test, y_pred)
     print(f"Random Forest Regressor MSE: {mse:.2f}")
 
-    return best_rf_model, label_encoder
+    return best_rf_model, features, mse, search_result
+
+
+def warm_start_random_forest_model(model, features, most_df, least_df, holiday_data, extra_trees=50, known_weeks=()):
+    """
+    Grow extra trees on new rows, keeping the trees already trained
+
+    :param most_df: Every expanded row; earlier weeks feed the lag features of new ones
+    :param known_weeks: ISO start dates of the weeks the model was trained on
+    :return: (model, features), both updated in place
+    """
+    combined_df = build_training_frame(most_df, least_df, holiday_data)
+    features.extend(combined_df)
+    new_rows = ~combined_df['Start Date'].dt.strftime('%Y-%m-%d').isin(set(known_weeks)).to_numpy()
+    X = features.transform_frame(combined_df[new_rows])
+
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + extra_trees)
+    model.fit(X, combined_df['Daily Quantity'].to_numpy()[new_rows])
+    model.set_params(warm_start=False)
+    return model, features
+
 
+def build_history_table(most_df, least_df):
+    """
+    Historical daily quantity per (dish, meal): total kg over total days served
+
+    Weighting by days keeps a partial week from counting as much as a full one.
+
+    :return: Series indexed by (Dish Name, Meal) as strings
+    """
+    combined_df = pd.concat([most_df, least_df], ignore_index=True)
+    if not pd.api.types.is_datetime64_any_dtype(combined_df.get('start_date')):
+        add_parsed_dates(combined_df)
+    days = (combined_df['end_date'] - combined_df['start_date']).dt.days + 1
+    totals = pd.DataFrame({
+        'Dish Name': combined_df['Dish Name'].astype(str),
+        'Meal': combined_df['Meal'].astype(str),
+        'quantity': combined_df['Quantity (kg)'],
+        'days': days
+    }).groupby(['Dish Name', 'Meal'], sort=True)[['quantity', 'days']].sum()
+    return totals['quantity'] / totals['days']
 
-#for execution of model
-start_date=pd.to_datetime("12/11/2024", format='%d/%m/%Y')
-end_date=pd.to_datetime("18/11/2024", format='%d/%m/%Y')
-most_df=pd.read_csv('most_expanded_weekly_report.csv')
-least_df=pd.read_csv('least_expanded_weekly_report.csv')
-holiday_data = pd.read_csv('original_holidays.csv')
 
-holiday_data['Start Date'] = pd.to_datetime(holiday_data['Start Date'], format='%d/%m/%Y')
-holiday_data['End Date'] = pd.to_datetime(holiday_data['End Date'], format='%d/%m/%Y')
-holiday_data['Duration'] = (holiday_data['End Date'] - holiday_data['Start Date']).dt.days
-holiday_data = holiday_data[holiday_data['Duration'] >= 7]
+def get_weighted_quantity_range(dish, meal, most_df, least_df):
+    """
+    Historical daily quantity of one dish at one meal, 0 if it was never served
+    """
+    history = build_history_table(most_df, least_df)
+    return float(history.get((dish, meal), 0.0))
 
-# generate_menu_pdf(start_date, end_date, most_df, least_df, holiday_data, n_dishes=3, adjustment_factor=0.75)
-model, label_encoder = train_random_forest_model(most_df, least_df,holiday_data)
 
+def predict_quantities(batch, model=None, features=None, history=None, holiday_data=None, adjustment_factor=0.75):
+    """
+    Predict daily quantities for a batch of (dish, meal, date[, duration]) rows
+
+    Rows whose (dish, meal) appears in history take the historical quantity;
+    only the remaining rows go to the model, in a single predict call.
+    Holiday rows are scaled by adjustment_factor, and every quantity is at
+    least 0.5 kg.
+
+    :param batch: DataFrame with columns dish, meal, date and optionally duration
+                  (report period length in days; defaults to the training one)
+    :param model: Fitted regressor; None uses the persisted model artifact
+    :param features: FeaturePipeline the model was trained with; None uses the persisted artifact's
+    :param history: Series from build_history_table, or None to always use the model
+    :param holiday_data: Holiday DataFrame or HolidayCalendar deciding which rows
+                         are adjusted, or None for no holidays; model features
+                         use the pipeline's own training calendar
+    :param adjustment_factor: Multiplier for rows that fall on a holiday
+    :return: NumPy array of quantities aligned with batch
+    """
+    n_rows = len(batch)
+    if n_rows == 0:
+        return np.empty(0)
+
+    dishes = batch['dish'].astype(str).to_numpy(dtype=object)
+    meals = batch['meal'].astype(str).to_numpy(dtype=object)
+    dates = pd.DatetimeIndex(pd.to_datetime(batch['date']))
+
+    if holiday_data is not None:
+        holiday_flags = HolidayCalendar.coerce(holiday_data).is_holiday(dates)
+    else:
+        holiday_flags = np.zeros(n_rows, dtype=bool)
+
+    if history is not None and len(history):
+        quantities = history.reindex(pd.MultiIndex.from_arrays([dishes, meals])).to_numpy(dtype=float, copy=True)
+        unseen = ~(quantities > 0)
+    else:
+        quantities = np.zeros(n_rows)
+        unseen = np.ones(n_rows, dtype=bool)
+
+    if unseen.any():
+        if model is None or features is None:
+            from quantity_model import quantity_model_store
+            artifact = quantity_model_store.require()
+            model, features = artifact.model, artifact.features
+        durations = batch['duration'].to_numpy()[unseen] if 'duration' in batch else None
+        X = features.transform(dishes[unseen], meals[unseen], dates[unseen], durations)
+        quantities[unseen] = model.predict(X)
+
+    quantities = np.where(holiday_flags, quantities * adjustment_factor, quantities)
+    return np.maximum(quantities, 0.5)
+
+
+def make_quantity_predictor(most_df, least_df, holiday_data=None, adjustment_factor=0.75, model=None, features=None):
+    """
+    predict_quantities with the history table computed once, for repeated batches
+    """
+    return functools.partial(
+        predict_quantities,
+        model=model,
+        features=features,
+        history=build_history_table(most_df, least_df),
+        holiday_data=holiday_data,
+        adjustment_factor=adjustment_factor
+    )
 
 
 #for predicting quantity(replace the base_quantity with this if possible)
-def predict_quantity(dish, meal, duration, model, label_encoder, most_df, least_df, holiday_data, date, adjustment_factor=0.75, use_old_data=True):
+def predict_quantity(dish, meal, duration, model, features, most_df, least_df, holiday_data, date, adjustment_factor=0.75, use_old_data=True):
     """
     Predicts the quantity for the given dish, considering whether it's old or new data
     and applies adjustments for holiday periods.
-    """
 
-    # Check if the date is a holiday
-    is_holiday_flag = is_holiday(date, holiday_data)
-    # Initialize variables
-    quantity = None
-    historical_data_found = False
-    # Check if the dish and meal combination exists in the old data (most_df and least_df)
-    if use_old_data:
-        # Use the weighted quantity range method to get the quantity based on most_df and least_df
-        quantity = get_weighted_quantity_range(dish, meal, most_df, least_df)
-        # If historical data exists, flag it
-        if quantity > 0:
-            historical_data_found = True
-    # If no historical data found or not using old data, use the model prediction
-    if not historical_data_found:
-        if dish not in label_encoder.classes_:
-            label_encoder.classes_ = np.append(label_encoder.classes_, dish)
-        dish_code = label_encoder.transform([dish])[0]
-        meal_code = label_encoder.transform([meal])[0]
-        features = np.array([[dish_code, meal_code, duration, int(is_holiday_flag)]])
-        quantity = model.predict(features)[0]
-    # Apply holiday adjustment if it's a holiday
-    if is_holiday_flag:
-        quantity *= adjustment_factor
-    # Ensure a minimum fallback quantity
-    return max(quantity, 0.5)
\ No newline at end of file
+    Single-row form of predict_quantities. Pass model=None and features=None
+    to use the persisted model artifact (see quantity_model.py).
+    """
+    batch = pd.DataFrame({'dish': [dish], 'meal': [meal], 'date': [date], 'duration': [duration]})
+    history = build_history_table(most_df, least_df) if use_old_data else None
+    return float(predict_quantities(batch, model, features, history, holiday_data, adjustment_factor)[0])
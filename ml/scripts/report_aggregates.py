@@ -0,0 +1,161 @@
+import logging
+from dataclasses import dataclass
+
+import pandas as pd
+
+from report_dataset import add_parsed_dates, slice_date_range
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['Date Range', 'Meal', 'Dish Name', 'Quantity (kg)']
+
+TOP_N_DISHES = 10
+
+
+@dataclass(frozen=True)
+class ReportStatistics:
+    """
+    Every figure the weekly summary and the PDF report show for one date range
+
+    Built by aggregate_report_statistics from a single grouped pass over each
+    expanded frame; all Series are indexed by label in sorted order.
+    """
+    total_kg: float
+    meal_totals: pd.Series
+    meal_mean_quantity: pd.Series
+    dish_totals: pd.Series
+    week_totals: pd.Series
+    least_dish_totals: pd.Series
+
+    @property
+    def is_empty(self):
+        return self.meal_totals.empty
+
+    @property
+    def top_dishes(self):
+        return self.dish_totals.nlargest(TOP_N_DISHES)
+
+    @property
+    def least_dishes(self):
+        return self.least_dish_totals.nsmallest(TOP_N_DISHES)
+
+    @property
+    def meal_distribution_percent(self):
+        return (self.meal_totals / self.meal_totals.sum()) * 100
+
+    @property
+    def growth_rate(self):
+        weekly_trend = self.week_totals
+        if len(weekly_trend) <= 1:
+            return 0
+        return (weekly_trend.iloc[-1] - weekly_trend.iloc[0]) / weekly_trend.iloc[0] * 100
+
+    def summary_frame(self):
+        """
+        One-row summary DataFrame as returned by generate_weekly_report
+        """
+        summary = {
+            'Total Quantity (kg)': self.total_kg,
+            'Most Consumed Dishes': self.top_dishes.to_dict(),
+            'Least Consumed Dishes': self.least_dishes.to_dict(),
+            'Meal Type Distribution': self.meal_totals.to_dict()
+        }
+        return pd.DataFrame.from_dict(summary, orient='index').T
+
+    def analysis_data(self):
+        """
+        Chart and metric inputs in the dict shape create_visualizations expects
+        """
+        if self.is_empty:
+            return {
+                'total_consumption': pd.Series(),
+                'top_dishes': pd.Series(),
+                'meal_distribution_percent': pd.Series(),
+                'weekly_trend': pd.Series(),
+                'daily_avg': pd.Series(),
+                'total_kg': 0,
+                'growth_rate': 0
+            }
+        return {
+            'total_consumption': self.meal_totals,
+            'top_dishes': self.top_dishes,
+            'meal_distribution_percent': self.meal_distribution_percent,
+            'weekly_trend': self.week_totals,
+            'daily_avg': self.meal_mean_quantity,
+            'total_kg': self.meal_totals.sum(),
+            'growth_rate': self.growth_rate
+        }
+
+
+def _rollup(grouped, level):
+    return grouped.groupby(level=level, observed=True, sort=False).sum().sort_index()
+
+
+def aggregate_report_statistics(most_expanded_df, least_expanded_df=None):
+    """
+    Aggregate already filtered expanded frames into a ReportStatistics
+
+    The most-consumed frame is grouped once by (Meal, Dish Name, Week) into
+    sums and row counts; per-meal, per-dish and per-week figures are rolled
+    up from that small result. The least-consumed frame is grouped once by
+    dish.
+
+    :param most_expanded_df: Expanded rows the totals, charts and top dishes come from
+    :param least_expanded_df: Expanded rows the least consumed dishes come from (optional)
+    :return: ReportStatistics
+    """
+    grouped = most_expanded_df.groupby(
+        ['Meal', 'Dish Name', 'Week'], observed=True, sort=False
+    )['Quantity (kg)'].agg(['sum', 'count'])
+
+    meal_grouped = _rollup(grouped, 'Meal')
+    meal_totals = meal_grouped['sum']
+    meal_mean_quantity = meal_totals / meal_grouped['count']
+
+    if least_expanded_df is not None:
+        least_dish_totals = least_expanded_df.groupby(
+            'Dish Name', observed=True, sort=False
+        )['Quantity (kg)'].sum().sort_index()
+    else:
+        least_dish_totals = pd.Series(dtype=float)
+
+    return ReportStatistics(
+        total_kg=float(meal_totals.sum()),
+        meal_totals=meal_totals,
+        meal_mean_quantity=meal_mean_quantity,
+        dish_totals=_rollup(grouped['sum'], 'Dish Name'),
+        week_totals=_rollup(grouped['sum'], 'Week'),
+        least_dish_totals=least_dish_totals
+    )
+
+
+def weekly_report_statistics(most_expanded_df, least_expanded_df, start_datetime, end_datetime):
+    """
+    Validate, filter to the date range and aggregate the expanded weekly reports
+
+    :return: (ReportStatistics, filtered most frame, filtered least frame)
+    """
+    # Ensure the required columns exist
+    for col in REQUIRED_COLUMNS:
+        if col not in most_expanded_df.columns:
+            raise ValueError(f"Missing required column: {col}")
+
+    # Extract start date from 'Date Range' unless the loader already parsed it
+    for expanded_df in (most_expanded_df, least_expanded_df):
+        if not pd.api.types.is_datetime64_any_dtype(expanded_df.get('start_date')):
+            add_parsed_dates(expanded_df)
+
+    # Check for NaT values after conversion
+    if most_expanded_df['start_date'].isnull().any():
+        logger.error("There are invalid date entries in most_expanded_df.")
+        raise ValueError("Invalid date entries found in most_expanded_df.")
+
+    if least_expanded_df['start_date'].isnull().any():
+        logger.error("There are invalid date entries in least_expanded_df.")
+        raise ValueError("Invalid date entries found in least_expanded_df.")
+
+    filtered_most_expanded = slice_date_range(most_expanded_df, start_datetime, end_datetime)
+    filtered_least_expanded = slice_date_range(least_expanded_df, start_datetime, end_datetime)
+
+    statistics = aggregate_report_statistics(filtered_most_expanded, filtered_least_expanded)
+    return statistics, filtered_most_expanded, filtered_least_expanded
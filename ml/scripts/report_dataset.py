@@ -0,0 +1,238 @@
+import os
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow every read falls back to the CSV files
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ('Meal', 'Dish Name')
+
+# Expanded reports written by generate_expanded_reports and read by the report, menu and model code
+MOST_EXPANDED_REPORT_FILE = '../csv_reports/most_expanded_weekly_report.csv'
+LEAST_EXPANDED_REPORT_FILE = '../csv_reports/least_expanded_weekly_report.csv'
+
+DATE_FORMAT = '%d/%m/%Y'
+
+
+def artifact_path(csv_path):
+    """
+    Path of the Parquet artifact kept next to an expanded report CSV
+    """
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def add_parsed_dates(df):
+    """
+    Add start_date/end_date columns parsed from 'Date Range' (weekly reports) or 'Date' (daily reports)
+
+    Unparseable dates become NaT, like the inline parsing this replaces.
+    """
+    if 'Date Range' in df.columns:
+        bounds = df['Date Range'].str.split('-')
+        start_dates, end_dates = bounds.str[0], bounds.str[1]
+    else:
+        start_dates = end_dates = df['Date']
+    df['start_date'] = pd.to_datetime(start_dates, format=DATE_FORMAT, errors='coerce')
+    df['end_date'] = pd.to_datetime(end_dates, format=DATE_FORMAT, errors='coerce')
+    return df
+
+
+def slice_date_range(df, start_datetime, end_datetime, include_end=True):
+    """
+    Rows with start_datetime <= start_date <= end_datetime (< end_datetime if not include_end)
+
+    Frames sorted by start_date (as handed out by dataset_manager) are cut
+    with two binary searches into a positional slice that shares memory with
+    the source; unsorted frames fall back to a boolean mask.
+    """
+    start, end = pd.Timestamp(start_datetime), pd.Timestamp(end_datetime)
+    start_dates = df['start_date']
+    if start_dates.is_monotonic_increasing:
+        lo = start_dates.searchsorted(start, side='left')
+        hi = start_dates.searchsorted(end, side='right' if include_end else 'left')
+        return df.iloc[lo:hi]
+    before_end = start_dates <= end if include_end else start_dates < end
+    return df[(start_dates >= start) & before_end]
+
+
+def _compact_categories(df):
+    """
+    Meal and Dish Name as categoricals holding only the values present, in sorted order
+
+    Sorted, observed-only categories keep groupby results identical to
+    grouping the plain string columns.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            values = df[column].astype(str) if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column]
+            df[column] = pd.Categorical(values, categories=sorted(values.dropna().unique()))
+    return df
+
+
+def _month_runs(start_dates):
+    """
+    (begin, stop) offsets of consecutive rows that share a start month
+    """
+    if len(start_dates) == 0:
+        return []
+    months = (start_dates.dt.year * 12 + start_dates.dt.month).to_numpy()
+    edges = np.concatenate(([0], np.flatnonzero(np.diff(months)) + 1, [len(months)]))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class ColumnarArtifactWriter:
+    """
+    Writes an expanded report as Parquet, one row group per month of start_date
+
+    Row group statistics on start_date let readers skip every month outside
+    the requested range. Frames can be written in chunks; the file appears
+    under its final name only on close().
+    """
+
+    def __init__(self, csv_path):
+        if pq is None:
+            raise ImportError("pyarrow is required to write columnar report artifacts")
+        self.path = artifact_path(csv_path)
+        self._tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        df = df.copy()
+        if 'start_date' not in df.columns:
+            add_parsed_dates(df)
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype(str)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        if self._schema is None:
+            # Fix the dictionary index width so every chunk shares one schema
+            self._schema = pa.schema([
+                pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                if field.name in CATEGORICAL_COLUMNS else field
+                for field in table.schema
+            ]).with_metadata(table.schema.metadata)
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+        table = table.cast(self._schema)
+
+        for begin, stop in _month_runs(df['start_date']):
+            self._writer.write_table(table.slice(begin, stop - begin))
+
+    def close(self):
+        if self._writer is None:
+            return None
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_artifact(df, csv_path):
+    """
+    Write the Parquet artifact for an expanded report held in memory
+
+    :return: Artifact path, or None when pyarrow is not installed
+    """
+    if pq is None:
+        return None
+    with ColumnarArtifactWriter(csv_path) as writer:
+        writer.write(df)
+    return writer.path
+
+
+def artifact_is_fresh(csv_path):
+    """
+    True if the artifact exists and was written after the CSV last changed
+    """
+    try:
+        artifact_mtime = os.stat(artifact_path(csv_path)).st_mtime_ns
+    except OSError:
+        return False
+    try:
+        return artifact_mtime >= os.stat(csv_path).st_mtime_ns
+    except OSError:
+        # Only the artifact is left, so it is the newest copy of the data
+        return True
+
+
+def load_expanded_report(csv_path, start_datetime=None, end_datetime=None, refresh=True):
+    """
+    Load an expanded report with parsed dates, optionally limited to a date range
+
+    Reads the Parquet artifact when it is fresh, pushing the start_date range
+    down so only matching row groups are decoded. Otherwise reads the CSV and,
+    if refresh, rewrites the artifact from it for the next caller.
+
+    :param csv_path: Expanded report CSV (e.g. most_expanded_weekly_report.csv)
+    :param start_datetime: Keep rows with start_date >= this (optional)
+    :param end_datetime: Keep rows with start_date <= this (optional)
+    :param refresh: Rebuild a missing or stale artifact from the CSV
+    :return: DataFrame with start_date/end_date columns and categorical Meal/Dish Name
+    """
+    filters = []
+    if start_datetime is not None:
+        filters.append(('start_date', '>=', pd.Timestamp(start_datetime)))
+    if end_datetime is not None:
+        filters.append(('start_date', '<=', pd.Timestamp(end_datetime)))
+
+    if pq is not None and artifact_is_fresh(csv_path):
+        try:
+            table = pq.read_table(artifact_path(csv_path), filters=filters or None)
+            return _compact_categories(table.to_pandas())
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"Could not read report artifact for {csv_path}, using the CSV: {e}")
+
+    df = add_parsed_dates(pd.read_csv(csv_path))
+    if df['start_date'].isnull().any():
+        logger.error(f"Invalid date entries detected in {csv_path}")
+        raise ValueError(f"Invalid date entries found in {csv_path}")
+
+    if refresh and pq is not None:
+        try:
+            write_artifact(df, csv_path)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"Could not write report artifact for {csv_path}: {e}")
+
+    if start_datetime is not None:
+        df = df[df['start_date'] >= pd.Timestamp(start_datetime)]
+    if end_datetime is not None:
+        df = df[df['start_date'] <= pd.Timestamp(end_datetime)]
+    return _compact_categories(df.reset_index(drop=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Parquet artifacts for expanded report CSVs")
+    parser.add_argument('csv_paths', nargs='*', default=[MOST_EXPANDED_REPORT_FILE, LEAST_EXPANDED_REPORT_FILE])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for csv_path in args.csv_paths:
+        path = write_artifact(add_parsed_dates(pd.read_csv(csv_path)), csv_path)
+        print(f"{csv_path} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+import io
+import os
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import psycopg2
+import psycopg2.extras
+
+from report_store import (
+    data_version,
+    report_fingerprint,
+    lock_fingerprint,
+    find_report
+)
+from db_pool import InstrumentedCursor
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# report_dataset's paths, repeated so importing this module does not load pandas
+MOST_EXPANDED_REPORT_FILE = '../csv_reports/most_expanded_weekly_report.csv'
+LEAST_EXPANDED_REPORT_FILE = '../csv_reports/least_expanded_weekly_report.csv'
+
+ACTIVE_STATUSES = ('QUEUED', 'RUNNING')
+
+# Session advisory lock held by the one dispatcher that builds reports
+DISPATCHER_LOCK_NAME = 'se_report_jobs.dispatcher'
+
+
+def job_concurrency():
+    """
+    Report builds running at once per dispatcher (REPORT_JOB_WORKERS)
+    """
+    return max(1, int(os.getenv('REPORT_JOB_WORKERS', 1)))
+
+
+def job_timeout():
+    """
+    Seconds after which a RUNNING job is considered abandoned and re-queued (REPORT_JOB_TIMEOUT)
+    """
+    return int(os.getenv('REPORT_JOB_TIMEOUT', 15 * 60))
+
+
+def report_inputs_fingerprint(start_datetime, end_datetime):
+    return report_fingerprint(
+        data_version([MOST_EXPANDED_REPORT_FILE, LEAST_EXPANDED_REPORT_FILE]),
+        start_datetime,
+        end_datetime
+    )
+
+
+def enqueue_report_job(conn, start_datetime, end_datetime):
+    """
+    Queue a report build, reusing a stored report or an identical in-flight job
+
+    :param conn: psycopg2 connection; committed before returning
+    :return: Dict with job_id (None on a stored-report hit), status and report_id
+    """
+    fingerprint = report_inputs_fingerprint(start_datetime, end_datetime)
+    cursor = conn.cursor()
+    lock_fingerprint(cursor, fingerprint)
+
+    report_id = find_report(cursor, fingerprint)
+    if report_id is not None:
+        conn.commit()
+        return {'job_id': None, 'status': 'DONE', 'report_id': report_id}
+
+    cursor.execute("""
+        SELECT id, status
+        FROM se_report_jobs
+        WHERE fingerprint = %s AND status IN %s
+        ORDER BY id DESC
+        LIMIT 1
+    """, (fingerprint, ACTIVE_STATUSES))
+    existing_job = cursor.fetchone()
+    if existing_job:
+        conn.commit()
+        return {'job_id': existing_job[0], 'status': existing_job[1], 'report_id': None}
+
+    cursor.execute("""
+        INSERT INTO se_report_jobs (fingerprint, start_date, end_date, status, progress)
+        VALUES (%s, %s, %s, 'QUEUED', 0)
+        RETURNING id
+    """, (fingerprint, start_datetime, end_datetime))
+    job_id = cursor.fetchone()[0]
+    conn.commit()
+    return {'job_id': job_id, 'status': 'QUEUED', 'report_id': None}
+
+
+def get_report_job(conn, job_id):
+    """
+    Job row as a dict, or None
+    """
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cursor.execute("""
+        SELECT id, status, progress, report_id, error, start_date, end_date,
+               created_at, started_at, finished_at
+        FROM se_report_jobs
+        WHERE id = %s
+    """, (job_id,))
+    row = cursor.fetchone()
+    conn.rollback()
+    return dict(row) if row else None
+
+
+def claim_report_jobs(conn, limit):
+    """
+    Mark up to limit queued (or abandoned) jobs RUNNING and return their ids
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE se_report_jobs
+        SET status = 'RUNNING', progress = 5, started_at = CURRENT_TIMESTAMP, error = NULL
+        WHERE id IN (
+            SELECT id
+            FROM se_report_jobs
+            WHERE status = 'QUEUED'
+            OR (status = 'RUNNING' AND started_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    """, (job_timeout(), limit))
+    job_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    return job_ids
+
+
+def release_report_jobs(conn, job_ids, error=None):
+    """
+    Hand back RUNNING jobs whose builds did not finish: queued again, or FAILED with error
+
+    :return: Ids of the jobs that were changed
+    """
+    if not job_ids:
+        return []
+    cursor = conn.cursor()
+    if error is None:
+        cursor.execute("""
+            UPDATE se_report_jobs
+            SET status = 'QUEUED', progress = 0, started_at = NULL
+            WHERE id IN %s AND status = 'RUNNING'
+            RETURNING id
+        """, (tuple(job_ids),))
+    else:
+        cursor.execute("""
+            UPDATE se_report_jobs
+            SET status = 'FAILED', error = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE id IN %s AND status = 'RUNNING'
+            RETURNING id
+        """, (error, tuple(job_ids)))
+    released = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    return released
+
+
+def _set_progress(conn, job_id, progress):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE se_report_jobs SET progress = %s WHERE id = %s
+        """, (progress, job_id))
+    conn.commit()
+
+
+def build_report_pdf(start_datetime, end_datetime, progress=None):
+    """
+    Build the consumption report PDF for a date range in memory
+
+    :param progress: Optional callback receiving a 0-100 progress value
+    :return: PDF bytes
+    """
+    from dataset_manager import report_datasets
+    from report_aggregates import weekly_report_statistics
+    from generate_admin_report import create_pdf
+
+    report_progress = progress or (lambda value: None)
+
+    # Only the requested months are decoded, unless this process holds the whole report
+    with tracer.span('dataset_load'):
+        most_expanded_df = report_datasets.view(MOST_EXPANDED_REPORT_FILE, start_datetime, end_datetime)
+        least_expanded_df = report_datasets.view(LEAST_EXPANDED_REPORT_FILE, start_datetime, end_datetime)
+    report_progress(20)
+
+    # Aggregate every statistic of the report in one pass per frame
+    with tracer.span('report_statistics'):
+        statistics, most_expanded_df, least_expanded_df = weekly_report_statistics(most_expanded_df, least_expanded_df, start_datetime, end_datetime)
+    report_progress(40)
+
+    # Create PDF in memory (chart rendering is a nested span)
+    with tracer.span('pdf_build'):
+        pdf_buffer = create_pdf(statistics.summary_frame(), most_expanded_df, start_datetime, end_datetime, output=io.BytesIO(), statistics=statistics)
+    report_progress(90)
+    return pdf_buffer.getvalue()
+
+
+def run_report_job(job_id):
+    """
+    Build and store the report for one claimed job (runs in a worker process)
+    """
+    # Instrumented like pooled connections, so the job's trace shows each query
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'), cursor_factory=InstrumentedCursor)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT fingerprint, start_date, end_date FROM se_report_jobs WHERE id = %s
+        """, (job_id,))
+        fingerprint, start_date, end_date = cursor.fetchone()
+        conn.commit()
+
+        start_datetime = datetime.combine(start_date, datetime.min.time())
+        end_datetime = datetime.combine(end_date, datetime.min.time())
+
+        try:
+            # A re-claimed or racing job may find its report already stored
+            report_id = find_report(cursor, fingerprint)
+            conn.commit()
+            if report_id is None:
+                pdf_data = build_report_pdf(
+                    start_datetime,
+                    end_datetime,
+                    progress=lambda value: _set_progress(conn, job_id, value)
+                )
+
+                # Same lock as enqueue_report_job, so one report is stored per fingerprint
+                lock_fingerprint(cursor, fingerprint)
+                report_id = find_report(cursor, fingerprint)
+                if report_id is None:
+                    report_name = f"consumption_report_{start_datetime.strftime('%d_%m_%Y')}_to_{end_datetime.strftime('%d_%m_%Y')}.pdf"
+                    cursor.execute("""
+                        INSERT INTO se_reports (report_name, report_data, start_date, end_date, fingerprint)
+                        VALUES (%s, %s, %s, %s, %s) RETURNING id
+                    """, (
+                        report_name,
+                        psycopg2.Binary(pdf_data),
+                        start_datetime,
+                        end_datetime,
+                        fingerprint
+                    ))
+                    report_id = cursor.fetchone()[0]
+            cursor.execute("""
+                UPDATE se_report_jobs
+                SET status = 'DONE', progress = 100, report_id = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (report_id, job_id))
+            conn.commit()
+            logger.info(f"Report job {job_id} finished as report {report_id}")
+            return report_id
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Report job {job_id} failed: {e}", exc_info=True)
+            cursor.execute("""
+                UPDATE se_report_jobs
+                SET status = 'FAILED', error = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (str(e), job_id))
+            conn.commit()
+            return None
+    finally:
+        conn.close()
+
+
+def traced_report_job(job_id):
+    """
+    run_report_job under a 'report_job' trace (runs in a worker process)
+
+    :return: Trace summary for the dispatcher's histograms, or None with tracing off
+    """
+    with tracer.trace('report_job') as trace:
+        run_report_job(job_id)
+    return trace.get('summary')
+
+
+def _record_job_trace(future):
+    """
+    Fold a finished job's trace into this process's histograms (served on /metrics)
+    """
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        tracer.record(future.result())
+
+
+class ReportJobDispatcher:
+    """
+    Claims queued report jobs and builds them in a process pool
+
+    Runs in the foreground via this module's CLI, or with
+    REPORT_JOB_DISPATCH=inline as a daemon thread inside a web worker. Either
+    way only one dispatcher per database builds: each holds the
+    DISPATCHER_LOCK_NAME advisory lock while it is the leader and the others
+    wait on standby, so builder processes and their preloaded datasets
+    scale with REPORT_JOB_WORKERS rather than with the number of web workers.
+
+    A builder that dies (crash, OOM kill) breaks the whole pool: the jobs it
+    was running are marked FAILED, jobs claimed but not yet started are
+    queued again, and a fresh pool is created.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=1.0, standby_interval=10.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.standby_interval = standby_interval
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the dispatcher thread once per process
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self.run, name='report-job-dispatcher', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def notify(self):
+        """
+        Wake the dispatcher early, e.g. right after a job was queued
+        """
+        self._wakeup.set()
+
+    @staticmethod
+    def _executor(concurrency):
+        # spawn keeps the children free of the web worker's threads and sockets
+        return ProcessPoolExecutor(
+            max_workers=concurrency,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    @staticmethod
+    def _try_lead(conn):
+        """
+        Take the dispatcher lock for this connection's session, if no one else holds it
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (DISPATCHER_LOCK_NAME,))
+        leading = cursor.fetchone()[0]
+        conn.commit()
+        return leading
+
+    def run(self):
+        concurrency = self.concurrency or job_concurrency()
+        executor = None
+        # future -> job id of the builds in flight
+        running = {}
+        conn = None
+        leading = False
+        try:
+            while True:
+                wait = self.poll_interval
+                try:
+                    if conn is None or conn.closed:
+                        # The lock went with the old session
+                        leading = False
+                        conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+                    if not leading:
+                        leading = self._try_lead(conn)
+                        if not leading:
+                            self._wakeup.wait(self.standby_interval)
+                            self._wakeup.clear()
+                            continue
+                        logger.info(f"Report job dispatcher leading with {concurrency} workers (pid {os.getpid()})")
+
+                    crashed = []
+                    for future in [future for future in running if future.done()]:
+                        job_id = running.pop(future)
+                        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                            crashed.append(job_id)
+                    if crashed:
+                        failed = release_report_jobs(conn, crashed, error="Report builder process died")
+                        logger.error(f"Report builder pool broke; failed jobs {failed}")
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        executor = None
+
+                    if executor is None:
+                        executor = self._executor(concurrency)
+                    free_slots = concurrency - len(running)
+                    if free_slots > 0:
+                        claimed = claim_report_jobs(conn, free_slots)
+                        for position, job_id in enumerate(claimed):
+                            try:
+                                future = executor.submit(traced_report_job, job_id)
+                            except BrokenProcessPool:
+                                # Never started, so these go back to the queue
+                                requeued = release_report_jobs(conn, claimed[position:])
+                                logger.error(f"Report builder pool broke; requeued jobs {requeued}")
+                                executor.shutdown(wait=False, cancel_futures=True)
+                                executor = None
+                                wait = 0
+                                break
+                            future.add_done_callback(_record_job_trace)
+                            running[future] = job_id
+                except psycopg2.Error as db_err:
+                    logger.error(f"Report job dispatcher lost its database connection: {db_err}")
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                except Exception:
+                    # Keep the thread alive; the next pass retries with whatever state is left
+                    logger.exception("Report job dispatcher pass failed")
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            if conn is not None:
+                conn.close()
+
+
+report_job_dispatcher = ReportJobDispatcher()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the report job dispatcher in the foreground")
+    parser.add_argument('--workers', type=int, default=None, help="concurrent report builds (default REPORT_JOB_WORKERS)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    ReportJobDispatcher(concurrency=args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever create_pdf's layout or content changes, so cached reports are rebuilt
+REPORT_TEMPLATE_VERSION = 1
+
+
+def data_version(paths):
+    """
+    Cheap version stamp of the report inputs: name, size and mtime of every file
+
+    :param paths: Input file paths
+    :return: List that changes whenever any input file is rewritten
+    """
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            version.append([os.path.basename(path), None, None])
+    return version
+
+
+def report_fingerprint(input_version, start_datetime, end_datetime, template_version=REPORT_TEMPLATE_VERSION):
+    """
+    Content address of a report: identical inputs always map to the same fingerprint
+
+    :param input_version: Value from data_version (anything JSON serializable)
+    :param start_datetime: Report start
+    :param end_datetime: Report end
+    :param template_version: Report layout version
+    :return: Hex digest
+    """
+    material = json.dumps([
+        input_version,
+        start_datetime.strftime('%Y-%m-%d'),
+        end_datetime.strftime('%Y-%m-%d'),
+        template_version
+    ], default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def lock_fingerprint(cursor, fingerprint):
+    """
+    Serialize builds of the same report until the current transaction ends
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (fingerprint,))
+
+
+def find_report(cursor, fingerprint):
+    """
+    Id of the newest stored report with this fingerprint, or None
+    """
+    cursor.execute("""
+        SELECT id
+        FROM se_reports
+        WHERE fingerprint = %s
+        ORDER BY id DESC
+        LIMIT 1
+    """, (fingerprint,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def collect_duplicate_reports(conn):
+    """
+    Delete reports that duplicate a newer one
+
+    Rows with a fingerprint keep only the newest row per fingerprint. Legacy
+    rows stored before fingerprints existed keep only the newest row per
+    (report_name, start_date, end_date).
+
+    :param conn: psycopg2 connection; committed on success
+    :return: Number of deleted rows
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            DELETE FROM se_reports r
+            USING se_reports newer
+            WHERE r.fingerprint IS NOT NULL
+            AND newer.fingerprint = r.fingerprint
+            AND newer.id > r.id
+        """)
+        deleted = cursor.rowcount
+        cursor.execute("""
+            DELETE FROM se_reports r
+            USING se_reports newer
+            WHERE r.fingerprint IS NULL
+            AND newer.fingerprint IS NULL
+            AND newer.report_name IS NOT DISTINCT FROM r.report_name
+            AND newer.start_date IS NOT DISTINCT FROM r.start_date
+            AND newer.end_date IS NOT DISTINCT FROM r.end_date
+            AND newer.id > r.id
+        """)
+        deleted += cursor.rowcount
+        conn.commit()
+        logger.info(f"Removed {deleted} duplicate reports")
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate rows from se_reports")
+    parser.parse_args()
+
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        print(f"Deleted {collect_duplicate_reports(conn)} duplicate reports")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
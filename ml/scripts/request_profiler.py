@@ -0,0 +1,265 @@
+import io
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import glob
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Request ids from X-Request-ID are used as file names; anything else gets a fresh id
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Orders accepted for text reports
+SORT_KEYS = tuple(key.value for key in pstats.SortKey)
+
+FORMATS = {
+    'pstats': '.pstats',
+    'collapsed': '.collapsed',
+    'meta': '.json',
+}
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack at a fixed interval into collapsed-stack counts
+
+    The output ('outer;inner;leaf count' per line) is what flamegraph.pl,
+    speedscope and inferno read. Runs next to cProfile, whose per-call
+    overhead slows every function alike, so the proportions still hold.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+    @staticmethod
+    def collapsed(stacks):
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class ProfileSession:
+    """
+    cProfile and the stack sampler running for one request on the current thread
+    """
+
+    def __init__(self, request_id, interval):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.seconds = time.perf_counter() - self.started
+        self.stacks = self.sampler.stop()
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single live requests, stored on disk by request id
+
+    Disabled unless PROFILING_TOKEN is set; a request is profiled only when
+    it carries that token (X-Profile-Token header or profile_token query
+    parameter). Each profile is saved as <id>.pstats (cProfile), <id>.collapsed
+    (sampled stacks for flame graphs) and <id>.json (route, status, timing)
+    in PROFILE_DIR, which all gunicorn workers share; beyond PROFILE_MAX_ENTRIES
+    the oldest profiles are deleted. One request per process is profiled at
+    a time, since cProfile can only run once per thread and the lock keeps
+    concurrent admin requests from piling up overhead.
+    """
+
+    def __init__(self, token=None, directory=None, max_entries=None, interval=None):
+        self.token = token
+        self.directory = directory
+        self.max_entries = max_entries
+        self.interval = interval
+        self._configured = False
+        self._busy = threading.Lock()
+        self._local = threading.local()
+
+    def _configure(self):
+        """
+        Resolve settings from the environment (read after load_dotenv ran)
+        """
+        if self._configured:
+            return
+        if self.token is None:
+            self.token = os.getenv('PROFILING_TOKEN') or None
+        if self.directory is None:
+            self.directory = os.getenv('PROFILE_DIR', '../profiles')
+        if self.max_entries is None:
+            self.max_entries = int(os.getenv('PROFILE_MAX_ENTRIES', 50))
+        if self.interval is None:
+            self.interval = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+        self._configured = True
+
+    @property
+    def enabled(self):
+        self._configure()
+        return self.token is not None
+
+    def authorized(self, supplied):
+        """
+        Whether supplied matches PROFILING_TOKEN (always False while profiling is disabled)
+        """
+        if not self.enabled or not supplied:
+            return False
+        return hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8'))
+
+    def start(self, request_id=None):
+        """
+        Profile the rest of this thread's request
+
+        :return: Profile id, or None when another request is being profiled
+        """
+        self._configure()
+        if not self._busy.acquire(blocking=False):
+            return None
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        # Never overwrite a stored profile of a repeated request id
+        if os.path.exists(self._path(request_id, 'meta')):
+            request_id = f'{request_id}-{uuid.uuid4().hex[:8]}'
+        try:
+            self._local.session = ProfileSession(request_id, self.interval)
+        except Exception:
+            self._busy.release()
+            raise
+        return request_id
+
+    def active(self):
+        return getattr(self._local, 'session', None) is not None
+
+    def finish(self, **meta):
+        """
+        Stop this thread's profile and store it
+
+        :param meta: Details saved next to it (route, method, status, ...)
+        :return: Stored metadata, or None without an active profile
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            return None
+        self._local.session = None
+        try:
+            session.stop()
+            os.makedirs(self.directory, exist_ok=True)
+            record = {
+                'id': session.request_id,
+                'created_at': datetime.now().isoformat(timespec='milliseconds'),
+                'seconds': round(session.seconds, 6),
+                'samples': sum(session.stacks.values()),
+                'pid': os.getpid(),
+                **meta,
+            }
+            self._write(session.request_id, 'pstats', lambda path: session.profile.dump_stats(path))
+            self._write(session.request_id, 'collapsed', lambda path: self._write_text(path, StackSampler.collapsed(session.stacks)))
+            # Metadata last: listings only show profiles whose files are complete
+            self._write(session.request_id, 'meta', lambda path: self._write_text(path, json.dumps(record)))
+            logger.info(f"Stored profile {session.request_id} ({record['seconds'] * 1000:.1f} ms, {record['samples']} samples)")
+            self._prune()
+            return record
+        finally:
+            self._busy.release()
+
+    def _path(self, profile_id, fmt):
+        return os.path.join(self.directory, f'{profile_id}{FORMATS[fmt]}')
+
+    @staticmethod
+    def _write_text(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _write(self, profile_id, fmt, writer):
+        path = self._path(profile_id, fmt)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    def _prune(self):
+        metas = sorted(glob.glob(os.path.join(self.directory, '*.json')), key=self._mtime)
+        for meta_path in metas[:-self.max_entries]:
+            profile_id = os.path.basename(meta_path)[:-len('.json')]
+            for fmt in FORMATS:
+                try:
+                    os.remove(self._path(profile_id, fmt))
+                except OSError:
+                    # Another worker pruned it first
+                    pass
+
+    def list(self):
+        """
+        Metadata of the stored profiles, newest first
+        """
+        self._configure()
+        records = []
+        for meta_path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(meta_path, 'r') as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(records, key=lambda record: record['created_at'], reverse=True)
+
+    def path(self, profile_id, fmt):
+        """
+        File of a stored profile in one of FORMATS, or None
+        """
+        self._configure()
+        if fmt not in FORMATS or not REQUEST_ID_PATTERN.match(profile_id):
+            return None
+        path = self._path(profile_id, fmt)
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id, sort='cumulative', limit=50):
+        """
+        pstats text report of a stored profile, or None
+        """
+        path = self.path(profile_id, 'pstats')
+        if path is None:
+            return None
+        buffer = io.StringIO()
+        pstats.Stats(path, stream=buffer).sort_stats(sort).print_stats(limit)
+        return buffer.getvalue()
+
+
+request_profiler = RequestProfiler()
@@ -1,30 +1,37 @@
-import io
 import os
+import hmac
 import json
+import time
 import logging
+import functools
+import threading
 import psycopg2
 import psycopg2.extras
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_file
+from datetime import datetime, timedelta, timezone
+from flask import Flask, request, jsonify, g, send_file
 from flask_cors import CORS
+from werkzeug.datastructures import ContentRange
 from dotenv import load_dotenv
-import pandas as pd
 import sys
+import gc
+import importlib
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Import custom modules
-from menu_suggest import (
-    generate_menu_for_date_range,
-    save_menu_to_csv,
-    load_holiday_data
-)
-from generate_aggregated_reports import (
-    generate_weekly_report
-)
-from generate_admin_report import (
-    create_pdf
+# Import custom modules (only light ones; see HEAVY_MODULES)
+from db_pool import db_pool, PoolTimeoutError, InstrumentedCursor
+from menu_cache import menu_cache
+from consumption_rollup import refresh_consumption_rollup, fetch_top_dishes
+from report_store import collect_duplicate_reports
+from report_jobs import (
+    enqueue_report_job,
+    get_report_job,
+    report_job_dispatcher,
+    MOST_EXPANDED_REPORT_FILE,
+    LEAST_EXPANDED_REPORT_FILE
 )
+from tracing import tracer
+from request_profiler import request_profiler, SORT_KEYS
 
 # Configure logging
 if __name__ != '__main__':
@@ -80,20 +87,103 @@ else:
         PERMANENT_SESSION_LIFETIME=timedelta(minutes=60)
     )
 
-# Database Connection Utility
-class DatabaseConnection:
-    @staticmethod
-    def get_connection():
-        try:
-            conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-            logging.info("Database connection established successfully")
-            return conn
-        except psycopg2.Error as db_err:
-            logging.error(f"Database connection failed: {db_err}")
-            raise Exception(f"Database connection failed: {db_err}")
+@app.before_request
+def begin_request_trace():
+    # Route rule rather than path, so histogram labels stay bounded
+    tracer.begin(request.url_rule.rule if request.url_rule is not None else 'unmatched')
+
+@app.after_request
+def end_request_trace(response):
+    tracer.end(response.status_code)
+    return response
+
+@app.teardown_request
+def abandon_request_trace(exc):
+    # Only still open when a handler raised past after_request
+    tracer.end(500)
+
+# Routes that read stored profiles are never profiled themselves
+PROFILE_ROUTES = ('list_profiles', 'get_profile')
+
+def profile_token():
+    """
+    Profiling token sent with the request (X-Profile-Token header or profile_token query parameter)
+    """
+    return request.headers.get('X-Profile-Token') or request.args.get('profile_token')
+
+def admin_denied():
+    """
+    Error response unless the request carries ADMIN_TOKEN in X-Admin-Token, else None
+
+    Guards the maintenance routes that delete data, rebuild tables or load
+    datasets; with ADMIN_TOKEN unset they are disabled.
+    """
+    token = os.getenv('ADMIN_TOKEN')
+    if not token:
+        return jsonify({"error": "Admin endpoints are disabled"}), 404
+    supplied = request.headers.get('X-Admin-Token') or ''
+    if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        return jsonify({"error": "Invalid admin token"}), 403
+    return None
+
+@app.before_request
+def begin_request_profile():
+    if not request_profiler.enabled or request.endpoint in PROFILE_ROUTES:
+        return
+    if request_profiler.authorized(profile_token()):
+        g.profile_id = request_profiler.start(request.headers.get('X-Request-ID'))
+        g.profile_requested = True
+
+@app.after_request
+def end_request_profile(response):
+    if request_profiler.active():
+        record = request_profiler.finish(
+            route=request.url_rule.rule if request.url_rule is not None else 'unmatched',
+            # Path only: the query string may hold the token
+            method=request.method,
+            path=request.path,
+            status=response.status_code
+        )
+        response.headers['X-Profile-Id'] = record['id']
+    elif g.get('profile_requested'):
+        response.headers['X-Profile-Skipped'] = 'another request is being profiled'
+    return response
+
+@app.teardown_request
+def abandon_request_profile(exc):
+    if request_profiler.active():
+        request_profiler.finish(method=request.method, path=request.path, status=500, error=str(exc))
+
+HOLIDAY_FILE = '../data/original_holidays.csv'
+MENU_N_DISHES = 3
+
+# Pulled in by the routes that need them on first use, so a worker is up and
+# answering /healthz before pandas, numpy and pyarrow are loaded
+HEAVY_MODULES = ('pandas', 'menu_suggest', 'dataset_manager', 'quantity_model')
+
+def preload_modules():
+    """
+    Import HEAVY_MODULES now instead of on first use
+
+    Called in the gunicorn master when GUNICORN_PRELOAD is on (see
+    gunicorn.conf.py): workers forked afterwards share these pages
+    copy-on-write. gc.freeze keeps the collector from touching (and so
+    copying) the preloaded objects in every worker.
+
+    :return: Seconds spent importing per module
+    """
+    modules = HEAVY_MODULES + (('random_forest',) if menu_quantity_source() == 'model' else ())
+    seconds = {}
+    for module in modules:
+        started = time.perf_counter()
+        importlib.import_module(module)
+        seconds[module] = round(time.perf_counter() - started, 4)
+    gc.freeze()
+    logging.info(f"Preloaded {', '.join(modules)} in {sum(seconds.values()):.2f}s")
+    return seconds
 
 # Utility Functions
-def generate_menu_suggestion_route(start_date, end_date, consumption_data, holiday_data):
+def generate_menu_suggestion_route(start_date, end_date, consumption_data, holiday_data, quantity_predictor=None):
     """
     Prepare meal data and generate menu suggestions
     """
@@ -119,17 +209,114 @@ def generate_menu_suggestion_route(start_date, end_date, consumption_data, holid
             'total_consumed': record.get('total_consumed', 0)
         })
 
-    # Generate menu
-    menu_items = generate_menu_for_date_range(
+    from menu_suggest import generate_menu_for_date_range, generate_menu_frame
+
+    # Generate menu (MENU_ENGINE=columnar returns a DataFrame instead of a list)
+    generate = generate_menu_frame if menu_engine() == 'columnar' else generate_menu_for_date_range
+    menu_items = generate(
         start_date, 
         end_date, 
         meal_data, 
         holiday_data,
-        n_dishes=3
+        n_dishes=MENU_N_DISHES,
+        quantity_predictor=quantity_predictor
     )
     
     return menu_items
 
+def menu_engine():
+    """
+    Menu generator selected by the MENU_ENGINE env var: 'records' (default) or 'columnar'
+    """
+    return os.getenv('MENU_ENGINE', 'records').strip().lower()
+
+def menu_quantity_source():
+    """
+    Where planned quantities come from (MENU_QUANTITY_SOURCE): 'history' uses
+    the mean of the ranked consumption rows, 'model' the batch quantity predictor
+    """
+    return os.getenv('MENU_QUANTITY_SOURCE', 'history').strip().lower()
+
+# History table of the loaded expanded reports as one (versions, table, tag)
+# tuple, rebuilt under the lock when either report's size or mtime changes
+_menu_history = None
+_menu_history_lock = threading.Lock()
+
+def menu_quantity_predictor(holiday_calendar):
+    """
+    Batch quantity predictor for menu generation and a tag for the menu cache key
+
+    The tag names the model and the history table, so cached menus are not
+    reused once either changes.
+
+    :param holiday_calendar: HolidayCalendar the menu is generated with
+    :return: (predictor, tag), or (None, None) to keep the historical base quantities
+    """
+    global _menu_history
+    if menu_quantity_source() != 'model':
+        return None, None
+
+    from quantity_model import quantity_model_store
+    artifact = quantity_model_store.get()
+    if artifact is None:
+        logging.warning("MENU_QUANTITY_SOURCE=model but no quantity model is trained; using history")
+        return None, None
+
+    from dataset_manager import report_datasets
+    from random_forest import build_history_table, predict_quantities
+    with _menu_history_lock:
+        most_df, most_version = report_datasets.versioned(MOST_EXPANDED_REPORT_FILE)
+        least_df, least_version = report_datasets.versioned(LEAST_EXPANDED_REPORT_FILE)
+        versions = (most_version, least_version)
+        history = _menu_history
+        if history is None or history[0] != versions:
+            table = build_history_table(most_df, least_df)
+            tag = '-'.join('none' if version is None else f'{version[0]}.{version[1]}' for version in versions)
+            history = (versions, table, tag)
+            _menu_history = history
+
+    predictor = functools.partial(
+        predict_quantities,
+        model=artifact.model,
+        features=artifact.features,
+        history=history[1],
+        holiday_data=holiday_calendar,
+        adjustment_factor=holiday_calendar.holiday_factor
+    )
+    return predictor, f'model:{artifact.fingerprint}:{history[2]}'
+
+def rollup_refresh_on_read():
+    """
+    Whether menu requests fold new consumption records in before ranking (ROLLUP_REFRESH_ON_READ)
+    """
+    return os.getenv('ROLLUP_REFRESH_ON_READ', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def report_job_dispatch():
+    """
+    Where queued reports are built (REPORT_JOB_DISPATCH): 'external' leaves
+    it to one `python report_jobs.py` process, 'inline' also starts a
+    dispatcher in this worker (only the one holding the dispatcher lock builds)
+    """
+    return os.getenv('REPORT_JOB_DISPATCH', 'external').strip().lower()
+
+def serialize_menu(menu_items):
+    """
+    JSON text for a menu from either engine; both produce identical output
+    """
+    # Only the columnar engine returns something other than a list
+    if not isinstance(menu_items, list):
+        from menu_suggest import menu_frame_to_json
+        return menu_frame_to_json(menu_items)
+    return json.dumps(menu_items)
+
+def json_response_with_menu(payload, menu_json, status=200):
+    """
+    JSON response with pre-serialized menu items spliced in, so a columnar
+    menu is never converted back to Python objects
+    """
+    body = json.dumps(payload)[:-1] + ', "menu_items": ' + menu_json + '}'
+    return app.response_class(body, status=status, mimetype='application/json')
+
 #health
 @app.route('/healthz', methods=['GET'])
 def health():
@@ -160,9 +347,8 @@ def generate_menu_suggestion():
             return jsonify({"error": "Invalid date format. Use dd/mm/yyyy"}), 400
 
         # Establish database connection
-        conn = DatabaseConnection.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2
-        .extras.DictCursor)
+        conn = db_pool.getconn()
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
 
         # Check for existing valid menu suggestion
         cursor.execute("""
@@ -188,43 +374,16 @@ def generate_menu_suggestion():
             }), 200
 
         # Load holiday data
-        holiday_data = load_holiday_data('../data/original_holidays.csv')
+        from menu_suggest import load_holiday_calendar
+        with tracer.span('holiday_load'):
+            holiday_data = load_holiday_calendar(HOLIDAY_FILE)
 
-        # Fetch consumption records for menu suggestion
-        cursor.execute("""
-            WITH ranked_dishes AS (
-                SELECT 
-                    f.id AS food_item_id, 
-                    f.name AS dish_name, 
-                    f.category,
-                    UPPER(TRIM(cr.meal_type)) AS meal_type,
-                    SUM(cr.quantity) AS total_consumed,
-                    RANK() OVER (
-                        PARTITION BY UPPER(TRIM(cr.meal_type)) 
-                        ORDER BY SUM(cr.quantity) DESC
-                    ) as consumption_rank
-                FROM 
-                    se_food_items f
-                    LEFT JOIN se_consumption_records cr ON f.id = cr.food_item_id
-                WHERE 
-                    UPPER(TRIM(cr.meal_type)) IN ('BREAKFAST', 'LUNCH', 'DINNER')
-                GROUP BY 
-                    f.id, f.name, f.category, cr.meal_type
-            )
-            SELECT 
-                food_item_id, 
-                dish_name, 
-                category, 
-                meal_type, 
-                total_consumed
-            FROM 
-                ranked_dishes
-            WHERE 
-                consumption_rank <= 5
-            ORDER BY 
-                meal_type, total_consumed DESC
-        """)
-        consumption_data = cursor.fetchall()
+        # Fold new consumption records into the rollup (skipped if another
+        # worker is already refreshing), then rank dishes from it
+        if rollup_refresh_on_read():
+            with tracer.span('rollup_refresh'):
+                refresh_consumption_rollup(conn, wait=False)
+        consumption_data = fetch_top_dishes(cursor, n_dishes=5)
 
         # Use default dishes if no consumption data
         if not consumption_data:
@@ -256,13 +415,28 @@ def generate_menu_suggestion():
             } for row in consumption_data
         ]
 
-        # Generate menu suggestions
-        menu_items = generate_menu_suggestion_route(
-            start_date, 
-            end_date, 
-            normalized_consumption_data, 
-            holiday_data
+        quantity_predictor, quantity_source = menu_quantity_predictor(holiday_data)
+
+        # Reuse a menu generated from the same inputs by any admin
+        cache_key = menu_cache.make_key(
+            start_date, end_date, MENU_N_DISHES, normalized_consumption_data, HOLIDAY_FILE,
+            extra=quantity_source
         )
+        menu_json = menu_cache.get(cache_key)
+
+        if menu_json is None:
+            # Generate menu suggestions
+            with tracer.span('menu_generation'):
+                menu_items = generate_menu_suggestion_route(
+                    start_date, 
+                    end_date, 
+                    normalized_consumption_data, 
+                    holiday_data,
+                    quantity_predictor=quantity_predictor
+                )
+            with tracer.span('json_serialization'):
+                menu_json = serialize_menu(menu_items)
+            menu_cache.set(cache_key, menu_json)
 
         # Save menu suggestion to database
         cursor.execute("""
@@ -275,21 +449,23 @@ def generate_menu_suggestion():
             end_date_pg, 
             'PENDING', 
             user_id, 
-            json.dumps(menu_items)
+            menu_json
         ))
         suggestion_id = cursor.fetchone()['id']
-        
+            
         # Commit the transaction
         conn.commit()
 
-        return jsonify({
+        return json_response_with_menu({
             "message": "Menu suggestion generated successfully",
             "suggestion_id": suggestion_id,
             "start_date": start_date,
-            "end_date": end_date,
-            "menu_items": menu_items
-        }), 200
+            "end_date": end_date
+        }, menu_json)
 
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         # Rollback the transaction in case of error
         if conn:
@@ -299,7 +475,7 @@ def generate_menu_suggestion():
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
-            conn.close()
+            db_pool.putconn(conn)
 
 @app.route('/get_menu_suggestions', methods=['GET'])
 def get_menu_suggestions():
@@ -313,8 +489,8 @@ def get_menu_suggestions():
         status = request.args.get('status', 'PENDING')
 
         # Establish database connection
-        conn = DatabaseConnection.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        conn = db_pool.getconn()
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
 
         # Fetch menu suggestions
         query = """
@@ -344,22 +520,29 @@ def get_menu_suggestions():
             "suggestions": menu_suggestions
         }), 200
 
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logging.error(f"Error retrieving menu suggestions: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
-            conn.close()
+            db_pool.putconn(conn)
 
 # Define allowed statuses
 ALLOWED_STATUSES = ['ACCEPTED', 'REJECTED']
 
+# Rows per INSERT statement when writing an accepted menu into se_menu_plan
+MENU_PLAN_PAGE_SIZE = 1000
+
 @app.route('/update_menu_suggestion_status', methods=['PATCH'])
 def update_menu_suggestion_status():
     """
     Update the status of a menu suggestion
     """
     conn = None
+    started = time.perf_counter()
     try:
         # Parse request data
         req_data = request.json
@@ -378,8 +561,8 @@ def update_menu_suggestion_status():
             }), 400
 
         # Establish database connection
-        conn = DatabaseConnection.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        conn = db_pool.getconn()
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
 
         # First, retrieve the full suggestion details
         cursor.execute("""
@@ -431,35 +614,50 @@ def update_menu_suggestion_status():
                 WHERE date BETWEEN %s AND %s
             """, (suggestion['start_date'], suggestion['end_date']))
 
+            # Resolve every distinct dish name to its food item ID in one query
+            dish_names = sorted({item['dish_name'] for item in menu_data})
+            cursor.execute("""
+                SELECT DISTINCT ON (name) name, id 
+                FROM se_food_items 
+                WHERE name = ANY(%s)
+                ORDER BY name, id
+            """, (dish_names,))
+            food_item_ids = {row['name']: row['id'] for row in cursor.fetchall()}
+
             # Prepare batch insert for menu plan
+            parsed_dates = {}
             for item in menu_data:
-                # Find the food item ID based on the dish name
-                cursor.execute("""
-                    SELECT id FROM se_food_items 
-                    WHERE name = %s
-                """, (item['dish_name'],))
-                food_item = cursor.fetchone()
+                food_item_id = food_item_ids.get(item['dish_name'])
                 
-                if food_item:
+                if food_item_id is not None:
+                    if item['date'] not in parsed_dates:
+                        parsed_dates[item['date']] = datetime.strptime(item['date'], '%d/%m/%Y').date()
                     menu_items_to_insert.append((
-                        datetime.strptime(item['date'], '%d/%m/%Y').date(),
+                        parsed_dates[item['date']],
                         item['meal_type'],
-                        food_item[0],
+                        food_item_id,
                         item.get('planned_quantity', 0),  # Default to 0 if not specified
                         user_id
                     ))
 
-            # Batch insert new menu items
+            # Bulk insert new menu items, MENU_PLAN_PAGE_SIZE rows per statement
             if menu_items_to_insert:
-                cursor.executemany("""
+                psycopg2.extras.execute_values(cursor, """
                     INSERT INTO se_menu_plan 
                     (date, meal_type, food_item_id, planned_quantity, created_by)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, menu_items_to_insert)
+                    VALUES %s
+                """, menu_items_to_insert, page_size=MENU_PLAN_PAGE_SIZE)
 
         # Commit the transaction
         conn.commit()
 
+        logging.info(
+            f"Menu suggestion {suggestion_id} set to {new_status}: "
+            f"{len(menu_items_to_insert)} plan rows, {cursor.round_trips} round trips, "
+            f"{cursor.query_seconds * 1000:.1f} ms in queries, "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms total"
+        )
+
         return jsonify({
             "message": "Menu suggestion status updated successfully",
             "suggestion": {
@@ -469,6 +667,9 @@ def update_menu_suggestion_status():
             }
         }), 200
 
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         if conn:
             conn.rollback()
@@ -476,15 +677,15 @@ def update_menu_suggestion_status():
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
-            conn.close()
+            db_pool.putconn(conn)
 
 @app.route('/generate_report', methods=['POST'])
 def generate_report():
+    """
+    Queue a report build and return its job id; poll /report_jobs/<id> for the result
+    """
     conn = None
     try:
-        # Establish database connection at the start
-        conn = DatabaseConnection.get_connection()
-
         req_data = request.json
         start_date = req_data.get('start_date')
         end_date = req_data.get('end_date')
@@ -496,38 +697,32 @@ def generate_report():
         except ValueError:
             return jsonify({"error": "Invalid date format. Use dd/mm/yyyy"}), 400
 
-        # Read the CSV files into DataFrames
-        most_expanded_df = pd.read_csv('../csv_reports/most_expanded_weekly_report.csv')
-        least_expanded_df = pd.read_csv('../csv_reports/least_expanded_weekly_report.csv')
+        conn = db_pool.getconn()
+        with tracer.span('enqueue_report_job'):
+            job = enqueue_report_job(conn, start_datetime, end_datetime)
 
-        # Generate the report
-        summary_df, most_expanded_df, least_expanded_df = generate_weekly_report(most_expanded_df, least_expanded_df, start_datetime, end_datetime)
+        # Already built from the same inputs: hand out the stored report
+        if job['report_id'] is not None:
+            return jsonify({
+                "message": "Existing report retrieved",
+                "report_id": job['report_id'],
+                "download_link": f"/download_report/{job['report_id']}"
+            }), 200
 
-        # Create PDF
-        pdf_filename = create_pdf(summary_df, most_expanded_df, start_datetime, end_datetime)
-
-        # Store PDF in the database
-        with open(pdf_filename, 'rb') as f:
-            pdf_data = f.read()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO se_reports (report_name, report_data, start_date, end_date) 
-                VALUES (%s, %s, %s, %s) RETURNING id
-            """, (
-                f"consumption_report_{start_datetime.strftime('%d_%m_%Y')}_to_{end_datetime.strftime('%d_%m_%Y')}.pdf", 
-                psycopg2.Binary(pdf_data), 
-                start_datetime, 
-                end_datetime
-            ))
-            report_id = cursor.fetchone()[0]
-            conn.commit()
+        if report_job_dispatch() == 'inline':
+            report_job_dispatcher.start()
+            report_job_dispatcher.notify()
 
         return jsonify({
-            "message": "Report generated successfully",
-            "report_id": report_id,
-            "download_link": f"/download_report/{report_id}"
-        }), 200
+            "message": "Report generation queued",
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "status_link": f"/report_jobs/{job['job_id']}"
+        }), 202
 
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         if conn:
             conn.rollback()
@@ -535,17 +730,96 @@ def generate_report():
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
-            conn.close()
+            db_pool.putconn(conn)
+
+@app.route('/report_jobs/<int:job_id>', methods=['GET'])
+def report_job_status(job_id):
+    """
+    Status and progress of a queued report build
+    """
+    conn = None
+    try:
+        conn = db_pool.getconn()
+        job = get_report_job(conn, job_id)
+
+        if not job:
+            return jsonify({"error": "Report job not found"}), 404
+
+        response = {
+            "job_id": job['id'],
+            "status": job['status'],
+            "progress": job['progress'],
+            "start_date": job['start_date'].strftime('%d/%m/%Y'),
+            "end_date": job['end_date'].strftime('%d/%m/%Y'),
+            "created_at": job['created_at'].isoformat() if job['created_at'] else None,
+            "started_at": job['started_at'].isoformat() if job['started_at'] else None,
+            "finished_at": job['finished_at'].isoformat() if job['finished_at'] else None
+        }
+        if job['status'] == 'DONE' and job['report_id'] is not None:
+            response['report_id'] = job['report_id']
+            response['download_link'] = f"/download_report/{job['report_id']}"
+        if job['status'] == 'FAILED':
+            response['error'] = job['error']
+
+        return jsonify(response), 200
+
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error retrieving report job: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            db_pool.putconn(conn)
+
+def report_chunk_size():
+    """
+    Bytes read from se_reports.report_data per query while streaming (REPORT_STREAM_CHUNK_SIZE)
+    """
+    return int(os.getenv('REPORT_STREAM_CHUNK_SIZE', 256 * 1024))
+
+def stream_report_chunks(report_id, start, stop, chunk_size):
+    """
+    Yield report_data[start:stop] slice by slice
+
+    Borrows its own pooled connection, since the response body is produced
+    after the route has returned its connection to the pool.
+    """
+    conn = db_pool.getconn()
+    try:
+        # Runs while the body streams, after the request's trace has ended,
+        # so these queries are counted by the cursor but not traced
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
+        offset = start
+        while offset < stop:
+            length = min(chunk_size, stop - offset)
+            # substring() on bytea is 1-based
+            cursor.execute("""
+                SELECT substring(report_data FROM %s FOR %s) 
+                FROM se_reports 
+                WHERE id = %s
+            """, (offset + 1, length, report_id))
+            row = cursor.fetchone()
+            if not row or not row[0]:
+                break
+            chunk = bytes(row[0])
+            yield chunk
+            offset += len(chunk)
+        conn.rollback()
+    finally:
+        db_pool.putconn(conn)
 
 @app.route('/download_report/<int:report_id>', methods=['GET'])
 def download_report(report_id):
     conn = None
     try:
-        conn = DatabaseConnection.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        conn = db_pool.getconn()
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
 
+        # Only metadata here; the PDF itself is streamed in slices below
         cursor.execute("""
-            SELECT report_name, report_data 
+            SELECT report_name, created_at, octet_length(report_data) AS report_size 
             FROM se_reports 
             WHERE id = %s
         """, (report_id,))
@@ -555,23 +829,286 @@ def download_report(report_id):
             return jsonify({"error": "Report not found"}), 404
 
         report_name = report['report_name']
-        report_data = report['report_data']
+        report_size = report['report_size'] or 0
+        created_at = report['created_at']
+
+        # Reports are never modified in place, so id + created_at identifies the content
+        created_timestamp = created_at.timestamp() if created_at else 0
+        etag = f"report-{report_id}-{created_timestamp}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
 
-        # Create a response with the PDF data
-        response = send_file(
-            io.BytesIO(report_data),
+        # Serve a range only for one byte range of the copy the client holds;
+        # anything else (other units, several ranges, a stale If-Range) gets
+        # the whole report, as RFC 9110 allows a server to ignore Range
+        start, stop, status = 0, report_size, 200
+        byte_ranges = request.range
+        if_range = request.if_range
+        if if_range.etag is not None:
+            range_valid = if_range.etag == etag
+        elif if_range.date is not None:
+            # HTTP dates have whole-second precision
+            range_valid = if_range.date.timestamp() >= int(created_timestamp)
+        else:
+            range_valid = True
+        if byte_ranges is not None and byte_ranges.units == 'bytes' and len(byte_ranges.ranges) == 1 and range_valid:
+            byte_range = byte_ranges.range_for_length(report_size)
+            if byte_range is None:
+                response = app.response_class(status=416)
+                response.headers['Content-Range'] = f'bytes */{report_size}'
+                return response
+            start, stop = byte_range
+            status = 206
+
+        response = app.response_class(
+            stream_report_chunks(report_id, start, stop, report_chunk_size()),
+            status=status,
             mimetype='application/pdf',
-            as_attachment=True,
-            download_name=report_name
+            direct_passthrough=True
         )
+        response.content_length = stop - start
+        response.accept_ranges = 'bytes'
+        if status == 206:
+            response.content_range = ContentRange('bytes', start, stop, report_size)
+        response.set_etag(etag)
+        if created_at:
+            response.last_modified = datetime.fromtimestamp(created_timestamp, timezone.utc)
+        response.cache_control.private = True
+        response.headers['Content-Disposition'] = f'attachment; filename="{report_name}"'
         return response
 
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logging.error(f"Error downloading report: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
-            conn.close()
+            db_pool.putconn(conn)
+
+@app.route('/collect_report_garbage', methods=['POST'])
+def collect_report_garbage():
+    """
+    Delete stored reports that duplicate a newer one (admin token required)
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    conn = None
+    try:
+        conn = db_pool.getconn()
+        deleted = collect_duplicate_reports(conn)
+        return jsonify({
+            "message": "Duplicate reports removed",
+            "deleted": deleted
+        }), 200
+
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error removing duplicate reports: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            db_pool.putconn(conn)
+
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    """
+    Connection pool usage for the worker serving this request
+    """
+    return jsonify(db_pool.stats()), 200
+
+@app.route('/consumption_totals', methods=['GET'])
+def consumption_totals():
+    """
+    Consumption total, per-meal split and top dishes for any date range
+
+    Answered from the prefix-sum cube of the most expanded report, so the
+    cost does not depend on the length of the range.
+    """
+    try:
+        start_datetime = datetime.strptime(request.args.get('start_date', ''), '%d/%m/%Y')
+        end_datetime = datetime.strptime(request.args.get('end_date', ''), '%d/%m/%Y')
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use dd/mm/yyyy"}), 400
+    try:
+        top_n = int(request.args.get('top_n', 10))
+    except ValueError:
+        return jsonify({"error": "top_n must be an integer"}), 400
+
+    try:
+        from dataset_manager import report_datasets
+        cube = report_datasets.cube(MOST_EXPANDED_REPORT_FILE)
+        return jsonify({
+            "start_date": start_datetime.strftime('%d/%m/%Y'),
+            "end_date": end_datetime.strftime('%d/%m/%Y'),
+            "total_kg": round(cube.total(start_datetime, end_datetime), 2),
+            "meal_totals": {meal: round(value, 2) for meal, value in cube.meal_totals(start_datetime, end_datetime).items()},
+            "top_dishes": [
+                {"dish_name": dish, "quantity": round(value, 2)}
+                for dish, value in cube.top_dishes(start_datetime, end_datetime, top_n).items()
+            ]
+        }), 200
+    except Exception as e:
+        logging.error(f"Error computing consumption totals: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/report_charts/<chart>', methods=['GET'])
+def report_chart(chart):
+    """
+    One of the report charts for a date range as SVG, for the admin UI
+
+    Rendered from the same analysis as the PDF report at the 'web' chart
+    target; repeated ranges are served from the render cache.
+    """
+    from generate_admin_report import CHART_NAMES
+    if chart not in CHART_NAMES:
+        return jsonify({"error": f"Unknown chart. Use one of: {', '.join(CHART_NAMES)}"}), 404
+    try:
+        start_datetime = datetime.strptime(request.args.get('start_date', ''), '%d/%m/%Y')
+        end_datetime = datetime.strptime(request.args.get('end_date', ''), '%d/%m/%Y')
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use dd/mm/yyyy"}), 400
+
+    try:
+        from dataset_manager import report_datasets
+        from generate_admin_report import analyze_consumption_data, create_visualizations
+        most_df = report_datasets.view(MOST_EXPANDED_REPORT_FILE, start_datetime, end_datetime)
+        analysis_data = analyze_consumption_data(most_df, start_datetime, end_datetime)
+        images = create_visualizations(analysis_data, target='web')
+        return app.response_class(images[CHART_NAMES.index(chart)].getvalue(), mimetype='image/svg+xml')
+    except Exception as e:
+        logging.error(f"Error rendering report chart: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/debug/datasets', methods=['GET'])
+def debug_datasets():
+    """
+    Expanded reports held in memory by this worker and their footprint
+
+    ?load=true loads the reports into this worker first. Admin token required.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    from dataset_manager import report_datasets
+    if request.args.get('load', '').lower() in ('1', 'true', 'yes'):
+        report_datasets.preload([MOST_EXPANDED_REPORT_FILE, LEAST_EXPANDED_REPORT_FILE])
+    return jsonify(report_datasets.stats()), 200
+
+@app.route('/refresh_consumption_rollup', methods=['POST'])
+def refresh_rollup():
+    """
+    Fold consumption records not yet counted into the rollup tables (admin token required)
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    conn = None
+    try:
+        rebuild = bool((request.get_json(silent=True) or {}).get('rebuild', False))
+        conn = db_pool.getconn()
+        folded = refresh_consumption_rollup(conn, rebuild=rebuild)
+        return jsonify({
+            "message": "Consumption rollup refreshed",
+            "records_folded": folded
+        }), 200
+
+    except PoolTimeoutError as e:
+        logging.error(f"Database pool exhausted: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error refreshing consumption rollup: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            db_pool.putconn(conn)
+
+@app.route('/invalidate_menu_cache', methods=['POST'])
+def invalidate_menu_cache():
+    """
+    Drop cached menus, e.g. after new consumption records were recorded (admin token required)
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    menu_cache.invalidate()
+    return jsonify({"message": "Menu cache invalidated"}), 200
+
+def profiles_denied():
+    """
+    Error response when the request may not read profiles, else None
+    """
+    if not request_profiler.enabled:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not request_profiler.authorized(profile_token()):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    return None
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """
+    Stored request profiles, newest first
+    """
+    denied = profiles_denied()
+    if denied:
+        return denied
+    profiles = request_profiler.list()
+    for profile in profiles:
+        profile['links'] = {fmt: f"/profiles/{profile['id']}?format={fmt}" for fmt in ('text', 'pstats', 'collapsed')}
+    return jsonify({"profiles": profiles, "max_entries": request_profiler.max_entries}), 200
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    One stored profile: ?format=text (pstats report, default), pstats (file for
+    pstats/snakeviz) or collapsed (stacks for flamegraph.pl/speedscope)
+    """
+    denied = profiles_denied()
+    if denied:
+        return denied
+    fmt = request.args.get('format', 'text')
+    if fmt == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            return jsonify({"error": f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400
+        report = request_profiler.report(profile_id, sort=sort)
+        if report is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return app.response_class(report, mimetype='text/plain')
+    if fmt not in ('pstats', 'collapsed'):
+        return jsonify({"error": "format must be text, pstats or collapsed"}), 400
+    path = request_profiler.path(profile_id, fmt)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='application/octet-stream' if fmt == 'pstats' else 'text/plain')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of this worker's counters and trace histograms
+    """
+    lines = [
+        '# HELP menu_cache_requests_total Menu cache lookups by result.',
+        '# TYPE menu_cache_requests_total counter',
+    ]
+    cache_stats = menu_cache.stats()
+    for result, counter in (('memory_hit', 'memory_hits'), ('disk_hit', 'disk_hits'), ('miss', 'misses')):
+        lines.append(f'menu_cache_requests_total{{result="{result}"}} {cache_stats[counter]}')
+    for counter in ('stores', 'evictions', 'disk_evictions', 'expired', 'invalidations'):
+        lines.append(f'# TYPE menu_cache_{counter}_total counter')
+        lines.append(f'menu_cache_{counter}_total {cache_stats[counter]}')
+    lines.append('# TYPE menu_cache_memory_entries gauge')
+    lines.append(f"menu_cache_memory_entries {cache_stats['memory_entries']}")
+    # Request and span histograms, present once TRACING_ENABLED traced something
+    lines.extend(tracer.prometheus_lines())
+    return app.response_class('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 # Main Application Runner
 if __name__ == '__main__':
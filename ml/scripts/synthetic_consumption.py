@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow only the packed CSV format is available
+    pa = None
+    pq = None
+
+from holiday_calendar import HolidayCalendar
+
+logger = logging.getLogger(__name__)
+
+MEALS = ('breakfast', 'lunch', 'dinner')
+
+DEFAULT_CATALOG = {
+    'breakfast': [
+        # South Indian
+        'Masala Dosa', 'Plain Dosa', 'Rava Dosa', 'Onion Dosa',
+        'Idli', 'Rava Idli', 'Medu Vada', 'Uttapam',
+        # North Indian
+        'Aloo Paratha', 'Gobi Paratha', 'Paneer Paratha', 'Methi Paratha', 'Mixed Paratha',
+        'Puri Bhaji', 'Chole Puri',
+        # Light Options
+        'Poha', 'Upma', 'Vermicelli Upma', 'Semiya Upma',
+        'Sabudana Khichdi', 'Daliya',
+        # Snacks/Others
+        'Chole Bhature', 'Samosa', 'Vada Pav', 'Pav Bhaji',
+        'Bread Pakora', 'Besan Chilla'
+    ],
+    'lunch': [
+        # Rice Varieties
+        'Steamed Rice', 'Jeera Rice', 'Veg Pulao', 'Lemon Rice',
+        'Tomato Rice', 'Curd Rice', 'Coconut Rice', 'Biryani',
+        # Dals
+        'Dal Tadka', 'Dal Fry', 'Dal Makhani', 'Moong Dal',
+        'Masoor Dal', 'Toor Dal', 'Chana Dal', 'Panchmel Dal',
+        # Main Course
+        'Rajma', 'Chole', 'Kadhi Pakora', 'Aloo Matar',
+        'Mix Veg Curry', 'Bhindi Masala', 'Lauki Kofta',
+        # Accompaniments
+        'Palak Paneer', 'Matar Paneer', 'Shahi Paneer',
+        'Aloo Gobi', 'Baingan Bharta', 'Veg Kofta Curry'
+    ],
+    'dinner': [
+        # Breads
+        'Tawa Roti', 'Tandoori Roti', 'Butter Naan', 'Garlic Naan',
+        'Missi Roti', 'Laccha Paratha', 'Rumali Roti',
+        # Main Course
+        'Paneer Tikka Masala', 'Kadai Paneer', 'Paneer Butter Masala',
+        'Malai Kofta', 'Veg Kolhapuri', 'Mushroom Masala',
+        'Bhindi Fry', 'Aloo Jeera', 'Gobi Manchurian',
+        'Dal Makhani', 'Chana Masala', 'Mixed Veg Curry',
+        'Paneer Lababdar', 'Veg Jalfrezi', 'Paneer Do Pyaza',
+        # Dry Items
+        'Jeera Aloo', 'Aloo Methi', 'Bhindi Do Pyaza',
+        'Gobhi Masala', 'Tawa Vegetables'
+    ]
+}
+
+# Base kg of the first, second and third dish of each meal
+BASE_QUANTITIES = {
+    'breakfast': (70, 65, 75),
+    'lunch': (270, 260, 210),
+    'dinner': (300, 290, 300),
+}
+
+WEEKEND_FACTOR = 1.15
+HOLIDAY_FACTOR = 1.3
+# Winter (Dec-Feb) up, summer (May-Jul) down, by month number
+SEASON_FACTORS = np.array([1.0, 1.1, 1.1, 1.0, 1.0, 0.9, 0.9, 0.9, 1.0, 1.0, 1.0, 1.0, 1.1])
+
+DEFAULT_CHUNK_DAYS = 365
+
+
+def _pick_dishes(rng, n_draws, n_dishes, dishes_per_meal):
+    """
+    dishes_per_meal distinct catalog positions per draw, without replacement
+    """
+    if dishes_per_meal > n_dishes:
+        raise ValueError(f"Cannot pick {dishes_per_meal} distinct dishes from a catalog of {n_dishes}")
+    keys = rng.random((n_draws, n_dishes))
+    picked = np.argpartition(keys, dishes_per_meal - 1, axis=1)[:, :dishes_per_meal]
+    # argpartition leaves the picked positions unordered; order them by their key
+    order = np.argsort(np.take_along_axis(keys, picked, axis=1), axis=1)
+    return np.take_along_axis(picked, order, axis=1)
+
+
+def generate_chunk(dates, messes, catalog, rng, holiday_calendar=None, dishes_per_meal=3):
+    """
+    Consumption of every mess, day, meal and dish slot for a block of days
+
+    Dishes are drawn without replacement per (mess, day, meal); quantities
+    follow the base amount of the slot with per-dish jitter, weekend, holiday
+    and season factors, all computed as whole arrays.
+
+    :param dates: DatetimeIndex of the days to generate
+    :param messes: Number of messes
+    :param catalog: Dict of meal -> list of dish names
+    :param rng: numpy Generator
+    :return: Dict of meal -> (dish codes, quantities), both shaped (messes, days, dishes_per_meal)
+    """
+    n_days = len(dates)
+    weekday = dates.weekday.to_numpy()
+    holiday = (holiday_calendar.is_holiday(dates) if holiday_calendar is not None
+               else np.zeros(n_days, dtype=bool))
+    day_factor = (np.where(weekday >= 5, WEEKEND_FACTOR, 1.0)
+                  * np.where(holiday, HOLIDAY_FACTOR, 1.0)
+                  * SEASON_FACTORS[dates.month.to_numpy()])
+
+    meals = {}
+    for meal in MEALS:
+        dishes = _pick_dishes(rng, messes * n_days, len(catalog[meal]), dishes_per_meal)
+        base = np.resize(np.asarray(BASE_QUANTITIES[meal], dtype=float), dishes_per_meal)
+        quantities = (base
+                      * rng.uniform(0.95, 1.05, (messes, n_days, dishes_per_meal))
+                      * rng.normal(1, 0.08, (messes, n_days, dishes_per_meal))
+                      * day_factor[None, :, None])
+        meals[meal] = (dishes.reshape(messes, n_days, dishes_per_meal), quantities)
+    return meals
+
+
+def _pack(strings):
+    """
+    Join the last axis of a (rows, k) string array with ';'
+    """
+    packed = pd.Series(strings[:, 0], dtype=object)
+    for position in range(1, strings.shape[1]):
+        packed = packed + ';' + strings[:, position]
+    return packed.to_numpy()
+
+
+def _format_kg(quantities):
+    """
+    '%.2f' strings for an array of non-negative quantities, without a Python loop
+    """
+    cents = np.rint(np.maximum(quantities, 0) * 100).astype(np.int64)
+    whole = (cents // 100).astype(str).astype(object)
+    fraction = np.char.zfill((cents % 100).astype(str), 2).astype(object)
+    return whole + '.' + fraction
+
+
+def packed_frame(dates, meals, catalog, mess_offset=0, include_mess=False):
+    """
+    Daily packed CSV rows (the aggregated_data.csv format) for a generated chunk
+
+    Rows are ordered by mess, then day.
+    """
+    n_messes, n_days = next(iter(meals.values()))[0].shape[:2]
+    day_index = np.tile(np.arange(n_days), n_messes)
+
+    frame = {}
+    if include_mess:
+        frame['mess_id'] = np.repeat(np.arange(n_messes) + mess_offset, n_days)
+    frame['month_year'] = dates.strftime('%b%Y').to_numpy(dtype=object)[day_index]
+    frame['week'] = np.char.add('week', ((dates.day.to_numpy() - 1) // 7 + 1).astype(str)).astype(object)[day_index]
+    frame['date'] = dates.strftime('%d/%m/%Y').to_numpy(dtype=object)[day_index]
+    for meal in MEALS:
+        dish_codes, quantities = meals[meal]
+        names = np.asarray(catalog[meal], dtype=object)
+        frame[f'{meal}_items'] = _pack(names[dish_codes.reshape(-1, dish_codes.shape[-1])])
+        frame[f'{meal}_kg'] = _pack(_format_kg(quantities.reshape(-1, quantities.shape[-1])))
+    return pd.DataFrame(frame)
+
+
+def long_table(dates, meals, catalog, mess_offset=0):
+    """
+    Long-format Arrow table, one row per (mess, day, meal, dish), for a generated chunk
+    """
+    columns = {'mess_id': [], 'date': [], 'meal': [], 'slot': [], 'dish': [], 'quantity_kg': []}
+    dish_names = sorted({dish for meal in MEALS for dish in catalog[meal]})
+    dish_lookup = {dish: code for code, dish in enumerate(dish_names)}
+    day_numbers = dates.values.astype('datetime64[D]').astype(np.int32)
+
+    for meal_code, meal in enumerate(MEALS):
+        dish_codes, quantities = meals[meal]
+        n_messes, n_days, slots = dish_codes.shape
+        catalog_codes = np.array([dish_lookup[dish] for dish in catalog[meal]], dtype=np.int32)
+        columns['mess_id'].append(np.repeat(np.arange(n_messes, dtype=np.int32) + mess_offset, n_days * slots))
+        columns['date'].append(np.tile(np.repeat(day_numbers, slots), n_messes))
+        columns['meal'].append(np.full(n_messes * n_days * slots, meal_code, dtype=np.int32))
+        columns['slot'].append(np.tile(np.arange(slots, dtype=np.int8), n_messes * n_days))
+        columns['dish'].append(catalog_codes[dish_codes.ravel()])
+        columns['quantity_kg'].append(np.round(quantities.ravel(), 2).astype(np.float32))
+
+    columns = {name: np.concatenate(parts) for name, parts in columns.items()}
+    meal_labels = pa.array([meal.title() for meal in MEALS])
+    return pa.table({
+        'mess_id': columns['mess_id'],
+        'date': pa.array(columns['date'], type=pa.date32()),
+        'meal': pa.DictionaryArray.from_arrays(pa.array(columns['meal']), meal_labels),
+        'slot': columns['slot'],
+        'dish': pa.DictionaryArray.from_arrays(pa.array(columns['dish']), pa.array(dish_names)),
+        'quantity_kg': columns['quantity_kg'],
+    })
+
+
+def write_synthetic_data(output_path, start_date='2015-01-01', years=10, messes=1, catalog=None,
+                         seed=0, fmt='csv', holiday_data=None, dishes_per_meal=3,
+                         chunk_days=DEFAULT_CHUNK_DAYS, messes_per_chunk=None):
+    """
+    Generate years of consumption for several messes and write it chunk by chunk
+
+    Memory is bounded by one chunk (chunk_days x messes_per_chunk messes).
+    The same seed and chunk sizes always produce the same file.
+
+    :param output_path: Destination .csv (packed daily format) or .parquet (long format)
+    :param catalog: Dict of meal -> dish names (default DEFAULT_CATALOG)
+    :param fmt: 'csv' or 'parquet'
+    :param holiday_data: Holiday DataFrame or HolidayCalendar raising quantities on holidays
+    :return: Number of rows written
+    """
+    catalog = catalog or DEFAULT_CATALOG
+    missing = [meal for meal in MEALS if meal not in catalog]
+    if missing:
+        raise ValueError(f"Catalog has no dishes for {', '.join(missing)}")
+    if fmt == 'parquet' and pq is None:
+        raise RuntimeError("Writing Parquet needs pyarrow")
+
+    start = pd.Timestamp(start_date)
+    all_dates = pd.date_range(start, start + pd.DateOffset(years=years) - pd.Timedelta(days=1), freq='D')
+    holiday_calendar = HolidayCalendar.coerce(holiday_data) if holiday_data is not None else None
+    messes_per_chunk = messes_per_chunk or messes
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    rows = 0
+    writer = None
+    try:
+        for mess_offset in range(0, messes, messes_per_chunk):
+            chunk_messes = min(messes_per_chunk, messes - mess_offset)
+            for chunk_start in range(0, len(all_dates), chunk_days):
+                dates = all_dates[chunk_start:chunk_start + chunk_days]
+                meals = generate_chunk(dates, chunk_messes, catalog, rng, holiday_calendar, dishes_per_meal)
+                if fmt == 'parquet':
+                    table = long_table(dates, meals, catalog, mess_offset)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table)
+                    rows += table.num_rows
+                else:
+                    frame = packed_frame(dates, meals, catalog, mess_offset, include_mess=messes > 1)
+                    frame.to_csv(tmp_path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+                    rows += len(frame)
+        if writer is not None:
+            writer.close()
+            writer = None
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic mess consumption data for scale testing")
+    parser.add_argument('output_path', help="destination .csv (packed daily rows) or .parquet (long format)")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--messes', type=int, default=1)
+    parser.add_argument('--start', default='2015-01-01', help="first day, YYYY-MM-DD")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--catalog', help="JSON file of {meal: [dish, ...]} for breakfast, lunch and dinner")
+    parser.add_argument('--holidays', default='../data/original_holidays.csv', help="holiday CSV ('' for none)")
+    parser.add_argument('--dishes-per-meal', type=int, default=3)
+    parser.add_argument('--chunk-days', type=int, default=DEFAULT_CHUNK_DAYS)
+    parser.add_argument('--messes-per-chunk', type=int)
+    args = parser.parse_args()
+
+    catalog = None
+    if args.catalog:
+        with open(args.catalog, 'r') as f:
+            catalog = json.load(f)
+
+    holiday_data = None
+    if args.holidays:
+        from menu_suggest import load_holiday_calendar
+        holiday_data = load_holiday_calendar(args.holidays)
+
+    fmt = 'parquet' if args.output_path.endswith('.parquet') else 'csv'
+    started = time.perf_counter()
+    rows = write_synthetic_data(
+        args.output_path,
+        start_date=args.start,
+        years=args.years,
+        messes=args.messes,
+        catalog=catalog,
+        seed=args.seed,
+        fmt=fmt,
+        holiday_data=holiday_data,
+        dishes_per_meal=args.dishes_per_meal,
+        chunk_days=args.chunk_days,
+        messes_per_chunk=args.messes_per_chunk
+    )
+    print(f"Wrote {rows} {fmt} rows to {args.output_path} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (le) of the Prometheus histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MEMORY_BUCKETS = tuple(float(2 ** 20 * size) for size in (1, 4, 16, 64, 256, 1024))
+
+# What span() hands out while no trace is active on the thread
+_NOOP = nullcontext()
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """
+    Histogram with cumulative buckets in the Prometheus layout
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, metric, labels):
+        """
+        Exposition lines for this histogram
+
+        :param labels: Formatted label pairs, e.g. 'route="/x",span="y"'
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            cumulative += count
+            le = '+Inf' if bound is None else repr(bound)
+            lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{labels}}} {self.sum!r}')
+        lines.append(f'{metric}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class _Span:
+    """
+    Timed section of a trace, recorded in start order when it exits
+    """
+
+    __slots__ = ('trace', 'name', 'index', 'depth', 'started', 'seconds', 'memory_start', 'memory_peak')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace
+        self.depth = len(trace.stack)
+        self.index = len(trace.spans)
+        trace.spans.append(None)
+        if trace.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Hand the peak reached so far to the enclosing span before resetting it
+            if trace.stack:
+                parent = trace.stack[-1]
+                parent.memory_peak = max(parent.memory_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = self.memory_peak = current
+        trace.stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.started
+        trace = self.trace
+        trace.stack.pop()
+        memory = None
+        if trace.track_memory:
+            self.memory_peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+            memory = self.memory_peak - self.memory_start
+            if trace.stack:
+                parent = trace.stack[-1]
+                parent.memory_peak = max(parent.memory_peak, self.memory_peak)
+        trace.spans[self.index] = {
+            'name': self.name,
+            'depth': self.depth,
+            'seconds': round(self.seconds, 6),
+            'memory_peak_bytes': memory,
+        }
+        return False
+
+
+class _TraceSlot(threading.local):
+    # Class default, so threads that never traced read None without an AttributeError
+    trace = None
+
+
+class _Trace:
+    """
+    Spans of one request or background job, kept on the thread running it
+    """
+
+    def __init__(self, route, track_memory):
+        self.route = route
+        self.track_memory = track_memory
+        self.stack = []
+        self.spans = []
+
+    def finish(self, status):
+        # Close spans an exception skipped, then the root span
+        while self.stack:
+            self.stack[-1].__exit__(None, None, None)
+        root = self.spans.pop(0)
+        return {
+            'event': 'trace',
+            'route': self.route,
+            'status': status,
+            'seconds': root['seconds'],
+            'memory_peak_bytes': root['memory_peak_bytes'],
+            'spans': [{**span, 'depth': span['depth'] - 1} for span in self.spans],
+        }
+
+
+class Tracer:
+    """
+    Per-process request tracing: named spans, structured logs and histograms
+
+    A trace covers one request (see begin/end) or background job (trace());
+    span() and @traced time sections of it. Finished traces are logged as one
+    JSON line each and fold into duration histograms per route and per
+    (route, span), exported by prometheus_lines. With TRACING_MEMORY on,
+    every span also records its tracemalloc peak over its starting usage;
+    tracemalloc is process-wide, so with several threads per worker the
+    peaks include whatever the other threads allocated meanwhile.
+
+    Off by default (TRACING_ENABLED). While off, or outside a trace, span()
+    is a thread-local lookup returning a shared no-op context.
+    """
+
+    def __init__(self, enabled=None, track_memory=None, slow_ms=None):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.slow_ms = slow_ms
+        self._configured = False
+        self._local = _TraceSlot()
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._spans = {}
+        self._memory = {}
+
+    def _configure(self):
+        """
+        Resolve settings from the environment (read after load_dotenv ran)
+        """
+        if self.enabled is None:
+            self.enabled = _env_flag('TRACING_ENABLED', False)
+        if self.track_memory is None:
+            self.track_memory = _env_flag('TRACING_MEMORY', False)
+        if self.slow_ms is None:
+            self.slow_ms = float(os.getenv('TRACING_LOG_SLOW_MS', 0))
+        if self.enabled and self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._configured = True
+
+    def begin(self, route):
+        """
+        Start a trace on this thread; ignored while tracing is off or a trace is active
+
+        :return: True when a trace was started
+        """
+        if not self._configured:
+            self._configure()
+        if not self.enabled or self._local.trace is not None:
+            return False
+        trace = _Trace(route, self.track_memory)
+        _Span(trace, None).__enter__()
+        self._local.trace = trace
+        return True
+
+    def end(self, status=None):
+        """
+        Finish this thread's trace, log it and add it to the histograms
+
+        :return: Trace summary dict, or None without an active trace
+        """
+        trace = self._local.trace
+        if trace is None:
+            return None
+        self._local.trace = None
+        summary = trace.finish(status)
+        self.record(summary)
+        if summary['seconds'] * 1000 >= self.slow_ms:
+            logger.info(json.dumps(summary, separators=(',', ':')))
+        return summary
+
+    @contextmanager
+    def trace(self, route):
+        """
+        Trace a block outside a request, e.g. a background job
+
+        Yields a dict that holds the summary (key 'summary') once the block has finished.
+        """
+        started = self.begin(route)
+        result = {}
+        status = 'error'
+        try:
+            yield result
+            status = 'ok'
+        finally:
+            if started:
+                result['summary'] = self.end(status)
+
+    def span(self, name):
+        """
+        Context manager timing a named section of the active trace
+        """
+        trace = self._local.trace
+        if trace is None:
+            return _NOOP
+        return _Span(trace, name)
+
+    def record(self, summary):
+        """
+        Add a finished trace to the histograms, also one from another process
+        """
+        route = summary['route']
+        with self._lock:
+            if route not in self._requests:
+                self._requests[route] = Histogram(DURATION_BUCKETS)
+            self._requests[route].observe(summary['seconds'])
+            for span in summary['spans']:
+                key = (route, span['name'])
+                if key not in self._spans:
+                    self._spans[key] = Histogram(DURATION_BUCKETS)
+                self._spans[key].observe(span['seconds'])
+                if span['memory_peak_bytes'] is not None:
+                    if key not in self._memory:
+                        self._memory[key] = Histogram(MEMORY_BUCKETS)
+                    self._memory[key].observe(span['memory_peak_bytes'])
+
+    def prometheus_lines(self):
+        """
+        Histograms in the Prometheus text format, as a list of lines
+        """
+        with self._lock:
+            families = (
+                ('ml_request_duration_seconds', 'Traced request duration by route.',
+                 {(route,): histogram for route, histogram in self._requests.items()}),
+                ('ml_span_duration_seconds', 'Traced span duration by route and span.', self._spans),
+                ('ml_span_memory_peak_bytes', 'Traced allocation peak of a span over its starting usage.', self._memory),
+            )
+            lines = []
+            for metric, description, histograms in families:
+                if not histograms:
+                    continue
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} histogram')
+                for key, histogram in sorted(histograms.items()):
+                    labels = f'route="{_label(key[0])}"'
+                    if len(key) > 1:
+                        labels += f',span="{_label(key[1])}"'
+                    lines.extend(histogram.lines(metric, labels))
+            return lines
+
+
+def traced(name=None):
+    """
+    Decorator running the function inside a span (named after the function by default)
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+tracer = Tracer()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules, like gunicorn's --chdir scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
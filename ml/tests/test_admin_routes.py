@@ -0,0 +1,28 @@
+import pytest
+
+import server
+
+ADMIN_ROUTES = [
+    ('POST', '/collect_report_garbage'),
+    ('POST', '/refresh_consumption_rollup'),
+    ('POST', '/invalidate_menu_cache'),
+    ('GET', '/debug/datasets?load=true'),
+]
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize('method,path', ADMIN_ROUTES)
+def test_admin_routes_are_disabled_without_a_token(client, monkeypatch, method, path):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.open(path, method=method, headers={'X-Admin-Token': ''}).status_code == 404
+
+
+@pytest.mark.parametrize('method,path', ADMIN_ROUTES)
+def test_admin_routes_reject_a_wrong_token(client, monkeypatch, method, path):
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    assert client.open(path, method=method).status_code == 403
+    assert client.open(path, method=method, headers={'X-Admin-Token': 'guess'}).status_code == 403
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from consumption_cube import ConsumptionCube, ZERO_TOLERANCE
+from report_dataset import slice_date_range
+
+FIRST_DAY = pd.Timestamp('2024-01-01')
+DAYS = 120
+
+
+def synthetic_report(seed):
+    """
+    Expanded rows over DAYS days with whole-kg quantities, so dish totals tie often
+    """
+    rng = np.random.default_rng(seed)
+    rows = 4000
+    days = np.sort(rng.integers(0, DAYS, size=rows))
+    dishes = np.array(['Upma', 'Rice', 'Poha', 'Dal', 'Roti', 'Khichdi', 'Idli', 'Chole'])
+    # Dishes late in the list first appear in the second half, after the split below
+    dish_codes = np.where(days < DAYS // 2, rng.integers(0, 4, size=rows), rng.integers(0, len(dishes), size=rows))
+    return pd.DataFrame({
+        'start_date': FIRST_DAY + pd.to_timedelta(days, unit='D'),
+        'Meal': rng.choice(['Breakfast', 'Lunch', 'Dinner'], size=rows),
+        'Dish Name': dishes[dish_codes],
+        'Quantity (kg)': rng.integers(1, 4, size=rows).astype(float),
+    })
+
+
+def expected_totals(df, start, end):
+    """
+    Meal totals, dish totals and top dishes of a range from a plain pandas groupby
+    """
+    window = slice_date_range(df, start, end)
+    meal_totals = window.groupby('Meal')['Quantity (kg)'].sum().sort_index()
+    dish_totals = window.groupby('Dish Name')['Quantity (kg)'].sum()
+    dish_totals = dish_totals[dish_totals.abs() > ZERO_TOLERANCE]
+    # Largest first, ties by dish name
+    ranked = sorted(dish_totals.items(), key=lambda item: (-item[1], item[0]))
+    return window['Quantity (kg)'].sum(), meal_totals, ranked
+
+
+def appended_cube(df):
+    split_day = FIRST_DAY + pd.Timedelta(days=DAYS // 2)
+    cube = ConsumptionCube.from_frame(df[df['start_date'] < split_day])
+    return cube.append(df[df['start_date'] >= split_day])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_random_ranges_match_pandas_groupby(seed):
+    df = synthetic_report(seed)
+    cube = appended_cube(df)
+    rng = np.random.default_rng(seed + 100)
+    for _ in range(100):
+        # Ranges may start before and end after the data
+        lo, hi = np.sort(rng.integers(-5, DAYS + 5, size=2))
+        start, end = FIRST_DAY + pd.Timedelta(days=int(lo)), FIRST_DAY + pd.Timedelta(days=int(hi))
+        total, meal_totals, ranked = expected_totals(df, start, end)
+
+        assert cube.total(start, end) == pytest.approx(total)
+        cube_meals = cube.meal_totals(start, end)
+        assert list(cube_meals.index) == list(meal_totals.index)
+        np.testing.assert_allclose(cube_meals.to_numpy(), meal_totals.to_numpy())
+        top_dishes = cube.top_dishes(start, end, n=5)
+        assert list(top_dishes.index) == [dish for dish, _ in ranked[:5]]
+        np.testing.assert_allclose(top_dishes.to_numpy(), [value for _, value in ranked[:5]])
+
+
+def test_appending_matches_building_in_one_go():
+    df = synthetic_report(3)
+    whole = ConsumptionCube.from_frame(df)
+    appended = appended_cube(df)
+    end = FIRST_DAY + pd.Timedelta(days=DAYS)
+    np.testing.assert_allclose(appended.dish_totals(FIRST_DAY, end).sort_index().to_numpy(),
+                               whole.dish_totals(FIRST_DAY, end).sort_index().to_numpy())
+
+
+def test_append_rejects_days_already_covered():
+    df = synthetic_report(4)
+    cube = ConsumptionCube.from_frame(df)
+    with pytest.raises(ValueError):
+        cube.append(df.tail(1))
+
+
+def test_tied_totals_come_out_by_name_after_append():
+    first = pd.DataFrame({'start_date': pd.to_datetime(['2024-01-01']), 'Meal': ['Lunch'],
+                          'Dish Name': ['Rice'], 'Quantity (kg)': [2.0]})
+    # Beans gets a higher dish code than Rice but sorts before it
+    later = first.assign(start_date=pd.to_datetime(['2024-01-02']), **{'Dish Name': ['Beans']})
+    cube = ConsumptionCube.from_frame(first).append(later)
+    top_dishes = cube.top_dishes(pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-02'))
+    assert list(top_dishes.index) == ['Beans', 'Rice']
@@ -0,0 +1,198 @@
+import threading
+
+import psycopg2
+import psycopg2.pool
+import pytest
+
+import db_pool as db_pool_module
+from db_pool import DatabasePool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, vars=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.queries.append(query)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeInfo:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @property
+    def transaction_status(self):
+        return self.conn.get_transaction_status()
+
+
+class FakeConnection:
+    """
+    Stand-in for a psycopg2 connection: just enough for the pool and the routes
+    """
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.info = FakeInfo(self)
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """
+    Every connection the pool opens, in order
+    """
+    opened = []
+
+    def connect(*args, **kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(psycopg2.pool.psycopg2, 'connect', connect)
+    return opened
+
+
+def make_pool(**settings):
+    options = dict(dsn='postgresql://stand-in', min_size=1, max_size=2,
+                   checkout_timeout=0.05, health_check=True, health_check_idle=30)
+    options.update(settings)
+    return DatabasePool(**options)
+
+
+def test_checkout_times_out_when_every_connection_is_borrowed(connections):
+    pool = make_pool(max_size=1)
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_route_answers_503_when_the_pool_is_exhausted(connections, monkeypatch):
+    import server
+    pool = make_pool(max_size=1)
+    monkeypatch.setattr(server, 'db_pool', pool)
+    held = pool.getconn()
+    try:
+        response = server.app.test_client().get('/get_menu_suggestions')
+    finally:
+        pool.putconn(held)
+    assert response.status_code == 503
+    assert 'No database connection available' in response.get_json()['error']
+
+
+def test_pool_is_rebuilt_after_a_fork(connections, monkeypatch):
+    pool = make_pool()
+    pool.putconn(pool.getconn())
+    parent_pool = pool._pool
+
+    monkeypatch.setattr(db_pool_module.os, 'getpid', lambda: -1)
+    conn = pool.getconn()
+    assert pool._pool is not parent_pool
+    assert pool.stats()['pid'] == -1
+    # The child's connection is a new one, never the parent's socket
+    assert conn is not connections[0]
+    pool.putconn(conn)
+
+
+def test_recently_used_connection_is_not_pinged(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert conn.queries == []
+
+
+def test_closed_connection_is_evicted_on_borrow(connections):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 2
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert pool.stats()['discarded'] == 1
+
+
+def test_idle_connection_is_pinged_and_evicted_when_dead(connections):
+    pool = make_pool(health_check_idle=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()['discarded'] == 1
+
+    # A live idle connection is pinged once and kept
+    pool.putconn(replacement)
+    assert pool.getconn() is replacement
+    assert replacement.queries == ['SELECT 1']
+
+
+def test_stats_track_idle_and_used_connections(connections):
+    pool = make_pool(min_size=1, max_size=3)
+    first, second = pool.getconn(), pool.getconn()
+    stats = pool.stats()
+    assert (stats['in_use'], stats['idle']) == (2, 0)
+
+    pool.putconn(first)
+    pool.putconn(second)
+    stats = pool.stats()
+    # Only min_size connections stay open once returned
+    assert (stats['in_use'], stats['idle']) == (0, 1)
+    assert second.closed
+
+
+def test_concurrent_borrowers_never_exceed_max_size(connections):
+    pool = make_pool(max_size=3, checkout_timeout=5)
+    peak = []
+    lock = threading.Lock()
+
+    def borrow():
+        for _ in range(20):
+            conn = pool.getconn()
+            with lock:
+                peak.append(pool.stats()['in_use'])
+            pool.putconn(conn)
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 3
+    assert pool.stats()['checkouts'] == 160
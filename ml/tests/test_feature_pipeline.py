@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FeaturePipeline, FEATURE_COLUMNS
+from menu_suggest import MenuSelection, predict_selection_quantities
+from random_forest import build_training_frame
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csv_reports')
+DURATION = FEATURE_COLUMNS.index('Duration')
+
+
+def fitted_pipeline():
+    most_df = pd.read_csv(os.path.join(REPORTS_DIR, 'most_expanded_weekly_report.csv'))
+    least_df = pd.read_csv(os.path.join(REPORTS_DIR, 'least_expanded_weekly_report.csv'))
+    return FeaturePipeline().fit(build_training_frame(most_df, least_df, None))
+
+
+def test_menu_days_are_scored_with_the_training_report_duration():
+    features = fitted_pipeline()
+    # The reports are weekly
+    assert features.report_duration == 7
+
+    batches = []
+
+    def predictor(batch):
+        batches.append(batch)
+        X = features.transform(batch['dish'], batch['meal'], batch['date'])
+        return X[:, DURATION]
+
+    dates = pd.date_range('2024-03-04', periods=3)
+    selections = (MenuSelection('Breakfast', 'Idli', 1.0), MenuSelection('Lunch', 'Rice', 2.0))
+    quantities = predict_selection_quantities(dates, selections, predictor)
+
+    assert 'duration' not in batches[0]
+    np.testing.assert_array_equal(quantities, np.full((3, 2), 7.0))
+
+
+def test_explicit_durations_are_kept():
+    features = fitted_pipeline()
+    X = features.transform(['Idli', 'Rice'], ['Breakfast', 'Lunch'], ['2024-03-04', '2024-03-05'], [3, 1])
+    np.testing.assert_array_equal(X[:, DURATION], [3, 1])
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from generate_expanded_reports import EXPANDED_COLUMNS, MEAL_COLUMN_PAIRS, expand_daily_meals
+
+DAILY_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'aggregated_data.csv')
+
+
+def reference_expand_daily_meals(df):
+    """
+    Row-by-row expansion (the original loop) that expand_daily_meals replaced
+    """
+    expanded_data = []
+    for _, row in df.iterrows():
+        for meal, items_column, kg_column in MEAL_COLUMN_PAIRS:
+            for dish, quantity in zip(row[items_column].split(';'), row[kg_column].split(';')):
+                expanded_data.append({
+                    'Month-Year': row['month_year'],
+                    'Week': row['week'],
+                    'Date': row['date'],
+                    'Meal': meal,
+                    'Dish Name': dish.strip(),
+                    'Quantity (kg)': float(quantity.strip())
+                })
+    return pd.DataFrame(expanded_data, columns=EXPANDED_COLUMNS)
+
+
+def assert_matches_reference(df):
+    actual = expand_daily_meals(df).astype({'Meal': str, 'Dish Name': str})
+    pd.testing.assert_frame_equal(actual, reference_expand_daily_meals(df), check_dtype=True)
+
+
+# Inputs the vectorized expansion got wrong at some point
+CASES = {
+    # The same dish with and without surrounding spaces; lists of unequal length
+    'padded dish names': pd.DataFrame({
+        'month_year': ['Jan2024', 'Jan2024'], 'week': ['week1', 'week1'], 'date': ['01/01/2024', '02/01/2024'],
+        'breakfast_items': ['Idli; Dosa', 'Dosa;Idli'], 'breakfast_kg': ['1.5;2', '3;4'],
+        'lunch_items': ['Rice', ' Rice '], 'lunch_kg': ['5', '6'],
+        'dinner_items': ['Roti;Dal', 'Roti'], 'dinner_kg': ['7;8;9', '10;11'],
+    }),
+    # Whole-number quantities only
+    'integer quantities': pd.DataFrame({
+        'month_year': ['Feb2024'], 'week': ['week1'], 'date': ['05/02/2024'],
+        'breakfast_items': ['Poha'], 'breakfast_kg': ['4'],
+        'lunch_items': ['Rice;Dal'], 'lunch_kg': ['12;6'],
+        'dinner_items': ['Roti'], 'dinner_kg': [' 9 '],
+    }),
+}
+
+
+@pytest.mark.parametrize('name', list(CASES))
+def test_expansion_matches_row_by_row_loop(name):
+    assert_matches_reference(CASES[name])
+
+
+def test_padded_names_share_one_category():
+    expanded = expand_daily_meals(CASES['padded dish names'])
+    assert list(expanded['Dish Name'].cat.categories) == ['Dal', 'Dosa', 'Idli', 'Rice', 'Roti']
+
+
+def test_expansion_matches_row_by_row_loop_on_the_daily_data():
+    if not os.path.exists(DAILY_CSV):
+        pytest.skip("daily consumption data not present")
+    assert_matches_reference(pd.read_csv(DAILY_CSV))
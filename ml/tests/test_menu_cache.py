@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from menu_cache import MenuCache
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    calls = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        calls.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(os, 'listdir', counting_listdir)
+    return calls
+
+
+def make_cache(tmp_path, **settings):
+    return MenuCache(max_entries=4, ttl=3600, cache_dir=str(tmp_path), **settings)
+
+
+def disk_entries(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if name.endswith('.json'))
+
+
+def test_disk_is_scanned_only_when_over_the_cap(tmp_path, scans):
+    cache = make_cache(tmp_path, disk_max_entries=10, disk_rescan_every=1000)
+    for i in range(10):
+        cache.set(f'key{i}', '{}')
+    # The first store learns the directory size; the next nine fit under the cap
+    assert len(scans) == 1
+
+    cache.set('key10', '{}')
+    assert len(scans) == 2
+    assert len(disk_entries(tmp_path)) == 9
+    assert cache.counters['disk_evictions'] == 2
+
+
+def test_disk_rescan_picks_up_other_workers_entries(tmp_path, scans):
+    cache = make_cache(tmp_path, disk_max_entries=10, disk_rescan_every=3)
+    other = make_cache(tmp_path, disk_max_entries=10, disk_rescan_every=1000)
+    cache.set('mine0', '{}')
+    for i in range(12):
+        other.set(f'other{i}', '{}')
+    scans.clear()
+
+    cache.set('mine1', '{}')
+    cache.set('mine2', '{}')
+    assert scans == []
+    cache.set('mine3', '{}')
+    assert len(scans) == 1
+    assert len(disk_entries(tmp_path)) <= 10
+
+
+def test_disk_prune_does_not_hold_the_lock_while_reading_the_directory(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, disk_max_entries=2, disk_rescan_every=1)
+    getmtime = os.path.getmtime
+    locked = []
+
+    def checking_getmtime(path):
+        if str(path).endswith('.json'):
+            locked.append(cache._lock.locked())
+        return getmtime(path)
+
+    monkeypatch.setattr(os.path, 'getmtime', checking_getmtime)
+    for i in range(4):
+        cache.set(f'key{i}', '{}')
+    assert locked and not any(locked)
+    assert len(disk_entries(tmp_path)) == 2
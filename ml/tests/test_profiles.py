@@ -0,0 +1,24 @@
+import pytest
+
+import server
+from request_profiler import RequestProfiler
+
+TOKEN = {'X-Profile-Token': 'secret'}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'request_profiler', RequestProfiler(token='secret', directory=str(tmp_path)))
+    return server.app.test_client()
+
+
+def test_profile_report_rejects_unknown_sort_keys(client):
+    profile_id = client.get('/healthz', headers=TOKEN).headers['X-Profile-Id']
+
+    response = client.get(f'/profiles/{profile_id}', query_string={'sort': 'time'}, headers=TOKEN)
+    assert response.status_code == 200
+    assert 'Ordered by: internal time' in response.get_data(as_text=True)
+
+    response = client.get(f'/profiles/{profile_id}', query_string={'sort': 'bogus'}, headers=TOKEN)
+    assert response.status_code == 400
+    assert 'cumulative' in response.get_json()['error']
@@ -0,0 +1,31 @@
+import os
+import shutil
+
+import pytest
+
+import server
+
+REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csv_reports', 'most_expanded_weekly_report.csv')
+RANGE = {'start_date': '01/08/2023', 'end_date': '01/06/2024'}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # A copy, so the Parquet artifact is written next to it rather than into csv_reports
+    report = tmp_path / 'most_expanded_weekly_report.csv'
+    shutil.copy(REPORT_FILE, report)
+    monkeypatch.setattr(server, 'MOST_EXPANDED_REPORT_FILE', str(report))
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize('chart', ['distribution', 'trend'])
+def test_report_chart_is_served_as_svg(client, chart):
+    response = client.get(f'/report_charts/{chart}', query_string=RANGE)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+    assert b'<svg' in response.data
+
+
+def test_report_chart_rejects_unknown_charts_and_dates(client):
+    assert client.get('/report_charts/pie', query_string=RANGE).status_code == 404
+    assert client.get('/report_charts/trend', query_string={'start_date': '2023-08-01'}).status_code == 400
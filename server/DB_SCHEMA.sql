@@ -30,7 +30,8 @@ CREATE TABLE se_consumption_records (
     date DATE NOT NULL,
     meal_type VARCHAR(50) NOT NULL,
     recorded_by INTEGER REFERENCES se_users(id), -- FK: picks up user info from the se_user table
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    rolled_up BOOLEAN NOT NULL DEFAULT FALSE -- set once the record is counted in the consumption rollups
 );
 
 -- Create se_feedback table
@@ -127,10 +128,13 @@ CREATE TABLE se_csv_data (
 CREATE TABLE se_reports (
     id SERIAL PRIMARY KEY,
     report_name VARCHAR(255),
-    report_data BYTEA,
+    report_data BYTEA, -- stored uncompressed out of line by server/migrations/ml_server.sql
     start_date DATE,
     end_date DATE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- content address (input data version + date range + template version), used by the
+    -- ml server to return an existing report instead of rebuilding it
+    fingerprint VARCHAR(64)
 );
 
 CREATE TABLE se_menu_suggestions (
@@ -144,4 +148,59 @@ CREATE TABLE se_menu_suggestions (
     updated_at TIMESTAMP,
     accepted_at TIMESTAMP,
     menu_data JSONB NOT NULL
-);
\ No newline at end of file
+);
+
+-- consumption rollups read by the ml server's menu ranking (kept up to date by ml/scripts/consumption_rollup.py):
+-- per (dish, normalized meal, day) totals
+CREATE TABLE se_consumption_daily_rollup (
+    food_item_id INTEGER REFERENCES se_food_items(id), -- FK: food item from se_food_items table
+    meal_type VARCHAR(50) NOT NULL, -- UPPER(TRIM(meal_type)) of the source records
+    date DATE NOT NULL,
+    total_quantity DECIMAL NOT NULL,
+    PRIMARY KEY (food_item_id, meal_type, date)
+);
+
+-- all-time per (dish, normalized meal) totals, so ranking cost doesn't grow with history
+CREATE TABLE se_consumption_dish_totals (
+    food_item_id INTEGER REFERENCES se_food_items(id), -- FK: food item from se_food_items table
+    meal_type VARCHAR(50) NOT NULL,
+    total_quantity DECIMAL NOT NULL,
+    PRIMARY KEY (food_item_id, meal_type)
+);
+
+CREATE INDEX idx_dish_totals_meal_quantity ON se_consumption_dish_totals(meal_type, total_quantity DESC);
+
+-- the consumption records not yet folded into the rollups
+CREATE INDEX idx_consumption_records_pending ON se_consumption_records(id) WHERE NOT rolled_up;
+
+-- one row per rollup, locked by a refresh so refreshes never overlap; last_record_id is the
+-- highest se_consumption_records.id folded so far (informational, progress is the rolled_up flag)
+CREATE TABLE se_rollup_watermarks (
+    name VARCHAR(100) PRIMARY KEY,
+    last_record_id INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO se_rollup_watermarks (name, last_record_id) VALUES ('consumption', 0);
+
+-- reports looked up by content address
+CREATE INDEX idx_reports_fingerprint ON se_reports(fingerprint);
+
+-- background report builds queued by the ml server's /generate_report
+CREATE TABLE se_report_jobs (
+    id SERIAL PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL, -- same content address as se_reports.fingerprint
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status VARCHAR(20) CHECK (status IN ('QUEUED', 'RUNNING', 'DONE', 'FAILED')),
+    progress INTEGER DEFAULT 0, -- 0-100
+    report_id INTEGER REFERENCES se_reports(id) ON DELETE SET NULL, -- FK: the built report once DONE
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- at most one queued/running job per report fingerprint
+CREATE UNIQUE INDEX uq_report_jobs_in_flight ON se_report_jobs(fingerprint) WHERE status IN ('QUEUED', 'RUNNING');
+CREATE INDEX idx_report_jobs_status ON se_report_jobs(status, id);
@@ -0,0 +1,73 @@
+-- Brings a database up to date with what the ml server expects. Run it after DB_SCHEMA.sql on a
+-- fresh database, and on every deploy of an existing one; every statement is idempotent.
+-- psql "$DATABASE_URL" -f server/migrations/ml_server.sql
+
+-- consumption rollups (ml/scripts/consumption_rollup.py)
+CREATE TABLE IF NOT EXISTS se_consumption_daily_rollup (
+    food_item_id INTEGER REFERENCES se_food_items(id),
+    meal_type VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    total_quantity DECIMAL NOT NULL,
+    PRIMARY KEY (food_item_id, meal_type, date)
+);
+
+CREATE TABLE IF NOT EXISTS se_consumption_dish_totals (
+    food_item_id INTEGER REFERENCES se_food_items(id),
+    meal_type VARCHAR(50) NOT NULL,
+    total_quantity DECIMAL NOT NULL,
+    PRIMARY KEY (food_item_id, meal_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_dish_totals_meal_quantity ON se_consumption_dish_totals(meal_type, total_quantity DESC);
+
+CREATE TABLE IF NOT EXISTS se_rollup_watermarks (
+    name VARCHAR(100) PRIMARY KEY,
+    last_record_id INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO se_rollup_watermarks (name, last_record_id) VALUES ('consumption', 0) ON CONFLICT (name) DO NOTHING;
+
+-- rollup progress moved from the id watermark to a per-record flag: records the watermark
+-- already covered are marked as folded, so they are not counted a second time
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'se_consumption_records' AND column_name = 'rolled_up'
+    ) THEN
+        ALTER TABLE se_consumption_records ADD COLUMN rolled_up BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE se_consumption_records
+        SET rolled_up = TRUE
+        WHERE id <= (SELECT last_record_id FROM se_rollup_watermarks WHERE name = 'consumption');
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_consumption_records_pending ON se_consumption_records(id) WHERE NOT rolled_up;
+
+-- store report pdfs uncompressed out of line, so the ml server can read byte ranges with
+-- substring() without detoasting the whole blob (pdfs are already compressed). Kept here rather
+-- than in CREATE TABLE, whose column STORAGE clause needs PostgreSQL 16; affects rows written later
+ALTER TABLE se_reports ALTER COLUMN report_data SET STORAGE EXTERNAL;
+
+-- content-addressed reports
+ALTER TABLE se_reports ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_reports_fingerprint ON se_reports(fingerprint);
+
+-- background report builds (ml/scripts/report_jobs.py)
+CREATE TABLE IF NOT EXISTS se_report_jobs (
+    id SERIAL PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status VARCHAR(20) CHECK (status IN ('QUEUED', 'RUNNING', 'DONE', 'FAILED')),
+    progress INTEGER DEFAULT 0,
+    report_id INTEGER REFERENCES se_reports(id) ON DELETE SET NULL,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_report_jobs_in_flight ON se_report_jobs(fingerprint) WHERE status IN ('QUEUED', 'RUNNING');
+CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON se_report_jobs(status, id);